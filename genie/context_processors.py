@@ -97,15 +97,16 @@ def currency_context(request):
     if not request.user.is_authenticated:
         return {}
 
-    from genie_core.models import MultipleCurrency
+    from genie_core.utils import get_currency_context
 
-    user_currency = MultipleCurrency.get_user_currency(request.user)
+    # Shared with the money cells rendered in the same request
+    currencies = get_currency_context(request.user)
     default_currency = None
 
     if hasattr(request.user, "company") and request.user.company:
-        default_currency = MultipleCurrency.get_default_currency(request.user.company)
+        default_currency = currencies.get_default_currency(request.user.company)
 
     return {
-        "user_currency": user_currency,
+        "user_currency": currencies.user_currency,
         "default_currency": default_currency,
     }
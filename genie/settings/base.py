@@ -192,6 +192,10 @@ else:
 DATABASES["default"]["CONN_MAX_AGE"] = env.int("DB_CONN_MAX_AGE", default=60)
 
 
+# Benchmarks are skipped unless run with ``manage.py test --tag benchmark``
+TEST_RUNNER = "genie.test_runner.HorillaTestRunner"
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -338,6 +342,7 @@ LANGUAGE_COOKIE_SAMESITE = "Lax"
 LOGIN_URL = "/login/"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 AUTH_USER_MODEL = "horilla_core.HorillaUser"
+AUTHENTICATION_BACKENDS = ["genie_core.backends.HorillaModelBackend"]
 
 # -----------------------------------------------------------------------------
 # Email
@@ -353,6 +358,10 @@ CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = "UTC"
 
+# The APScheduler jobs run from `manage.py run_scheduler`; enable this to also
+# start them from every process loading the apps (only the leader runs them)
+SCHEDULER_AUTOSTART = env.bool("SCHEDULER_AUTOSTART", default=False)
+
 
 STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
@@ -370,6 +379,7 @@ AUDITLOG_EXCLUDE_TRACKING_MODELS = (
     "genie_core.RecentlyViewed",
     "genie_core.ActiveTab",
     "genie_core.ListColumnVisibility",
+    "horilla_dashboard.DailyMetric",
 )
 
 
@@ -0,0 +1,15 @@
+"""Test runner of the Horilla project."""
+
+from django.test.runner import DiscoverRunner
+
+
+class HorillaTestRunner(DiscoverRunner):
+    """
+    Skip tests tagged ``benchmark`` unless they are asked for with
+    ``manage.py test --tag benchmark``, as they build large datasets.
+    """
+
+    def __init__(self, *args, tags=None, exclude_tags=None, **kwargs):
+        if not tags or "benchmark" not in tags:
+            exclude_tags = set(exclude_tags or ()) | {"benchmark"}
+        super().__init__(*args, tags=tags, exclude_tags=exclude_tags, **kwargs)
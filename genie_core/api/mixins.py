@@ -2,11 +2,42 @@
 API mixins for implementing advanced features like search, filtering, bulk update, and bulk delete
 """
 
-from django.db import transaction
-from django.db.models import Q
-from rest_framework import status
+import copy
+import hashlib
+from functools import partial
+
+from auditlog.context import auditlog_disabled
+from auditlog.diff import model_instance_diff
+from auditlog.models import LogEntry
+from auditlog.registry import auditlog
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import FieldDoesNotExist
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, Model
+from django.utils import timezone
+from django.utils.http import parse_etags
+from rest_framework import serializers, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.relations import (
+    ManyRelatedField,
+    PrimaryKeyRelatedField,
+    RelatedField,
+)
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils import model_meta
+
+from genie_core.api.search import get_search_backend
+from genie_core.signals import (
+    get_score_expression,
+    get_score_field,
+    records_bulk_written,
+)
+from genie_core.utils import get_updated_at_stamp
 
 
 class SearchFilterMixin:
@@ -16,6 +47,7 @@ class SearchFilterMixin:
 
     search_fields = []  # Fields to search in, should be overridden in the ViewSet
     filterset_fields = []  # Fields to filter by, should be overridden in the ViewSet
+    search_backend = None  # Backend class or dotted path, API_SEARCH_BACKEND if unset
 
     def get_queryset(self):
         """
@@ -26,10 +58,9 @@ class SearchFilterMixin:
         # Apply search if search parameter is provided
         search_term = self.request.query_params.get("search", None)
         if search_term and self.search_fields:
-            q_objects = Q()
-            for field in self.search_fields:
-                q_objects |= Q(**{f"{field}__icontains": search_term})
-            queryset = queryset.filter(q_objects)
+            queryset = get_search_backend(self.search_backend).filter_queryset(
+                queryset, self.search_fields, search_term
+            )
 
         # Apply filtering for each filter parameter
         for param, value in self.request.query_params.items():
@@ -39,12 +70,516 @@ class SearchFilterMixin:
         return queryset
 
 
+class SparseFieldsetMixin:
+    """
+    Mixin to serialize only the fields named in ``?fields=name,email`` and
+    to read only the columns and relations the serialized fields need
+    """
+
+    fields_query_param = "fields"
+
+    def get_requested_fields(self):
+        """
+        Return the set of field names requested with ``?fields=``, or None
+        to serialize every field. Only read requests can be narrowed.
+        """
+        request = getattr(self, "request", None)
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+        value = request.query_params.get(self.fields_query_param)
+        if not value:
+            return None
+        return {name.strip() for name in value.split(",") if name.strip()}
+
+    def get_serializer(self, *args, **kwargs):
+        """
+        Drop the fields that were not requested from the serializer
+        """
+        serializer = super().get_serializer(*args, **kwargs)
+        requested = self.get_requested_fields()
+        if requested:
+            fields = getattr(serializer, "child", serializer).fields
+            for name in set(fields) - requested:
+                fields.pop(name)
+        return serializer
+
+    def get_queryset(self):
+        """
+        Join or prefetch the relations read by the serialized fields and,
+        for a sparse fieldset, load only the columns it reads
+        """
+        queryset = super().get_queryset()
+        request = getattr(self, "request", None)
+        if request is None or request.method not in SAFE_METHODS:
+            return queryset
+
+        serializer = self.get_serializer_class()(context=self.get_serializer_context())
+        fields = serializer.fields
+        requested = self.get_requested_fields()
+        if requested:
+            fields = {name: fields[name] for name in fields if name in requested}
+
+        select_related, prefetch_related, columns = [], [], []
+        narrow = self._collect_lookups(
+            queryset.model,
+            fields.values(),
+            "",
+            select_related,
+            prefetch_related,
+            columns,
+        )
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        if requested and narrow:
+            ordering = getattr(self.paginator, "ordering", None) or ()
+            if isinstance(ordering, str):
+                ordering = (ordering,)
+            columns += [name.lstrip("-") for name in ordering]
+            queryset = queryset.only(*columns)
+        return queryset
+
+    def _collect_lookups(
+        self, model, fields, prefix, select_related, prefetch_related, columns
+    ):
+        """
+        Add the ``select_related`` and ``prefetch_related`` lookups, and the
+        columns, read by the serializer fields of a model. Returns False when
+        a field reads the instance in a way that cannot be narrowed, such as
+        a method field or a property.
+        """
+        narrow = True
+        for field in fields:
+            if field.write_only:
+                continue
+            if field.source == "*" or not field.source_attrs:
+                narrow = False
+                continue
+            name = field.source_attrs[0]
+            try:
+                model_field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                narrow = False
+                continue
+
+            if not model_field.is_relation or model_field.related_model is None:
+                columns.append(name)
+                continue
+            lookup = f"{prefix}{name}"
+            child = getattr(field, "child", None)
+            if model_field.many_to_many or model_field.one_to_many:
+                # Served from one query per relation, not one per row
+                if isinstance(field, ManyRelatedField) or child is not None:
+                    prefetch_related.append(lookup)
+                continue
+
+            columns.append(name)
+            if isinstance(field, RelatedField) and (
+                len(field.source_attrs) == 1 and field.use_pk_only_optimization()
+            ):
+                # The id is read from the row itself
+                continue
+            select_related.append(lookup)
+            if isinstance(field, serializers.BaseSerializer):
+                self._collect_lookups(
+                    model_field.related_model,
+                    field.fields.values(),
+                    f"{lookup}__",
+                    select_related,
+                    prefetch_related,
+                    [],
+                )
+        return narrow
+
+
+class ConditionalGetMixin:
+    """
+    Mixin answering ``If-None-Match`` on list and retrieve with 304 Not
+    Modified before any serialization, using weak ETags built from
+    ``(max(updated_at), count)`` of the filtered list or the ``updated_at``
+    of the object, each read with one query. Writes through the ViewSet
+    stamp ``updated_at`` so the ETags change with the data.
+    """
+
+    etag_field = "updated_at"
+
+    def get_etag(self, *parts):
+        """
+        Return a weak ETag for the given state, scoped to the user and the
+        full request path so pages, filters and fieldsets differ
+        """
+        key = ":".join(
+            str(part)
+            for part in (*parts, self.request.user.pk, self.request.get_full_path())
+        )
+        digest = hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+        return f'W/"{digest}"'
+
+    def get_list_etag(self, queryset):
+        """ETag of a filtered list, from one aggregate query"""
+        state = queryset.order_by().aggregate(
+            last_updated=Max(self.etag_field), count=Count("pk")
+        )
+        return self.get_etag(
+            queryset.model._meta.label, state["last_updated"], state["count"]
+        )
+
+    def get_detail_etag(self, queryset):
+        """ETag of the requested object, or None if it does not exist"""
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        updated = list(
+            queryset.filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            ).values_list("pk", self.etag_field)[:1]
+        )
+        if not updated:
+            return None
+        return self.get_etag(queryset.model._meta.label, *updated[0])
+
+    def is_not_modified(self, etag):
+        """Return True if the request's If-None-Match matches the ETag"""
+        header = self.request.headers.get("If-None-Match")
+        if not etag or not header:
+            return False
+        etags = parse_etags(header)
+        if "*" in etags:
+            return True
+        # Weak comparison, see RFC 9110 section 13.1.2
+        return etag.removeprefix("W/") in {tag.removeprefix("W/") for tag in etags}
+
+    def conditional_response(self, etag, handler, request, *args, **kwargs):
+        """Answer 304 for a matching ETag, or call the handler and tag it"""
+        if self.is_not_modified(etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        response = handler(request, *args, **kwargs)
+        if etag and response.status_code == status.HTTP_200_OK:
+            response["ETag"] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        etag = self.get_list_etag(self.filter_queryset(self.get_queryset()))
+        return self.conditional_response(etag, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        etag = self.get_detail_etag(self.filter_queryset(self.get_queryset()))
+        return self.conditional_response(
+            etag, super().retrieve, request, *args, **kwargs
+        )
+
+    def perform_update(self, serializer):
+        model_fields = {
+            field.name for field in serializer.Meta.model._meta.concrete_fields
+        }
+        if self.etag_field in model_fields:
+            serializer.save(**{self.etag_field: timezone.now()})
+        else:
+            serializer.save()
+
+
 class BulkOperationsMixin:
     """
-    Mixin to add bulk update and bulk delete capabilities to ViewSets
-    with support for filtering operations
+    Mixin to add bulk create, bulk update and bulk delete capabilities to
+    ViewSets with support for filtering operations.
+
+    Payloads of items are validated as a whole with a ``ListSerializer``,
+    their related ids resolved with one query per related model, and the
+    valid items written with ``bulk_create``/``bulk_update`` in one
+    transaction; the errors of the other items are reported by index.
+    Bulk writes send no model signals: score fields are recomputed in the
+    database with one UPDATE per batch, audit log entries are written in
+    bulk, and ``records_bulk_written`` is sent for the receivers maintaining
+    data derived from the rows.
+
+    Models overriding ``save()``, such as opportunities whose forecasts and
+    teams follow their saves, are saved item by item instead. So are the
+    items of a batch that breaks a database constraint, each in its own
+    savepoint, reporting the items the database rejects by index.
     """
 
+    bulk_batch_size = 1000
+
+    def _resolve_related_ids(self, serializer, items):
+        """
+        Look up the objects of each primary key related field of the
+        serializer for all items at once, and validate the field from them
+        """
+        for name, field in serializer.fields.items():
+            if field.read_only or not isinstance(field, PrimaryKeyRelatedField):
+                continue
+            queryset = field.get_queryset()
+            pk_field = queryset.model._meta.pk
+            ids = set()
+            for item in items:
+                value = item.get(name) if isinstance(item, dict) else None
+                if value in (None, "") or isinstance(value, bool):
+                    continue
+                try:
+                    ids.add(pk_field.to_python(value))
+                except DjangoValidationError:
+                    continue
+            objects = queryset.in_bulk(ids)
+            field.to_internal_value = partial(
+                self._get_resolved_object, field, pk_field, objects
+            )
+
+    @staticmethod
+    def _get_resolved_object(field, pk_field, objects, data):
+        """PrimaryKeyRelatedField.to_internal_value over prefetched objects"""
+        if isinstance(data, bool):
+            field.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            obj = objects.get(pk_field.to_python(data))
+        except (DjangoValidationError, TypeError):
+            field.fail("incorrect_type", data_type=type(data).__name__)
+        if obj is None:
+            field.fail("does_not_exist", pk_value=data)
+        return obj
+
+    def _validate_bulk_items(self, serializer, items, instances=None):
+        """
+        Validate each item with the child of a ListSerializer. Returns the
+        ``(index, instance, validated_data)`` of the valid items and the
+        ``{"index", "errors"}`` of the others.
+        """
+        self._resolve_related_ids(serializer.child, items)
+        valid, errors = [], []
+        for index, item in enumerate(items):
+            instance = instances[index] if instances is not None else None
+            if instances is not None and instance is None:
+                errors.append({"index": index, "errors": {"id": ["Not found."]}})
+                continue
+            serializer.child.instance = instance
+            serializer.child.initial_data = item
+            try:
+                data = serializer.run_child_validation(item)
+            except ValidationError as e:
+                errors.append({"index": index, "errors": e.detail})
+                continue
+            valid.append((index, instance, data))
+        return valid, errors
+
+    def _get_items(self, request):
+        """The list of items of a bulk payload, or None"""
+        items = request.data if isinstance(request.data, list) else None
+        if items is None and hasattr(request.data, "get"):
+            items = request.data.get("items")
+        return items if isinstance(items, list) else None
+
+    def _refresh_bulk_rows(self, model, pks):
+        """Recompute the score save() would have for rows written in bulk"""
+        score = get_score_expression(model)
+        if score is None:
+            return
+        for start in range(0, len(pks), self.bulk_batch_size):
+            model.objects.filter(
+                pk__in=pks[start : start + self.bulk_batch_size]
+            ).update(**{get_score_field(model): score})
+
+    def _bulk_response(self, count_key, pks, errors, success_status):
+        if errors and not pks:
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {
+                "message": f"Successfully wrote {len(pks)} records",
+                count_key: len(pks),
+                "ids": pks,
+                "errors": errors,
+            },
+            status=status.HTTP_207_MULTI_STATUS if errors else success_status,
+        )
+
+    def writes_set_based(self, model):
+        """
+        Whether valid items of a model are written with bulk queries, which
+        skip its save() and signals
+        """
+        return model.save is Model.save
+
+    def _write_items(self, model, valid, errors, write_batch, write_row):
+        """
+        Write the valid items with ``write_batch(valid)`` in one savepoint,
+        or item by item with ``write_row(instance, data)`` when the model is
+        saved row by row or the batch broke a database constraint. Items the
+        database rejects are added to the errors. Returns the written
+        objects and whether they were written as a batch.
+        """
+        if self.writes_set_based(model):
+            try:
+                with transaction.atomic():
+                    return write_batch(valid), True
+            except IntegrityError:
+                pass
+
+        written = []
+        for index, instance, data in valid:
+            try:
+                with transaction.atomic():
+                    written.append(write_row(instance, dict(data)))
+            except IntegrityError as e:
+                errors.append(
+                    {
+                        "index": index,
+                        "errors": {api_settings.NON_FIELD_ERRORS_KEY: [str(e)]},
+                    }
+                )
+        errors.sort(key=lambda error: error["index"])
+        return written, False
+
+    def _log_bulk_changes(self, model, objects, originals=None):
+        """
+        Write the audit log entries the saves of the objects would have, in
+        bulk. ``originals`` are the objects before an update.
+        """
+        if not objects or not auditlog.contains(model) or auditlog_disabled.get():
+            return
+        log_action = LogEntry.Action.UPDATE if originals else LogEntry.Action.CREATE
+        content_type = ContentType.objects.get_for_model(model)
+        user = self.request.user if self.request.user.is_authenticated else None
+        entries = []
+        for position, obj in enumerate(objects):
+            changes = model_instance_diff(
+                originals[position] if originals else None,
+                obj,
+                use_json_for_changes=settings.AUDITLOG_STORE_JSON_CHANGES,
+            )
+            if not changes:
+                continue
+            entries.append(
+                LogEntry(
+                    content_type=content_type,
+                    object_pk=str(obj.pk),
+                    object_id=obj.pk if isinstance(obj.pk, int) else None,
+                    object_repr=str(obj),
+                    action=log_action,
+                    changes=changes,
+                    actor=user,
+                    actor_email=getattr(user, "email", None),
+                )
+            )
+        LogEntry.objects.bulk_create(entries, batch_size=self.bulk_batch_size)
+
+    @action(detail=False, methods=["post"])
+    def bulk_create(self, request):
+        """
+        Create multiple instances in a single request
+
+        Expected request format:
+        [{"field1": "value1", ...}, ...]  or  {"items": [...]}
+
+        The valid items are created and the errors of the others are
+        returned by index, with 207 Multi-Status if some items failed.
+        """
+        items = self._get_items(request)
+        if not items:
+            return Response(
+                {"error": "A non-empty list of items is required for bulk create"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        serializer = self.get_serializer(data=items, many=True)
+        model = serializer.child.Meta.model
+        relations = model_meta.get_field_info(model).relations
+        to_many = {name for name, relation in relations.items() if relation.to_many}
+
+        def write_batch(valid):
+            objects = model.objects.bulk_create(
+                [
+                    model(**{k: v for k, v in data.items() if k not in to_many})
+                    for _, _, data in valid
+                ],
+                batch_size=self.bulk_batch_size,
+            )
+            for obj, (_, _, data) in zip(objects, valid):
+                for name in to_many & set(data):
+                    getattr(obj, name).set(data[name])
+            return objects
+
+        def write_row(instance, data):
+            return serializer.child.create(data)
+
+        with transaction.atomic():
+            valid, errors = self._validate_bulk_items(serializer, items)
+            objects, as_batch = self._write_items(
+                model, valid, errors, write_batch, write_row
+            )
+            pks = [obj.pk for obj in objects]
+            if as_batch and pks:
+                self._refresh_bulk_rows(model, pks)
+                self._log_bulk_changes(model, objects)
+                records_bulk_written.send(sender=model, pks=pks, fields=None)
+
+        return self._bulk_response(
+            "created_count", pks, errors, status.HTTP_201_CREATED
+        )
+
+    def _bulk_update_items(self, items):
+        """
+        Update each item's instance with its own values, found by ``id``
+        """
+        ids = [item.get("id") if isinstance(item, dict) else None for item in items]
+        serializer = self.get_serializer(data=items, many=True, partial=True)
+        model = serializer.child.Meta.model
+        relations = model_meta.get_field_info(model).relations
+        to_many = {name for name, relation in relations.items() if relation.to_many}
+        concrete = {field.name for field in model._meta.concrete_fields}
+        stamp = get_updated_at_stamp(model)
+        fields = set()
+        originals = []
+
+        def write_batch(valid):
+            objects = []
+            for _, instance, data in valid:
+                originals.append(copy.copy(instance))
+                for name, value in {**data, **stamp}.items():
+                    if name not in to_many:
+                        setattr(instance, name, value)
+                        fields.add(name)
+                objects.append(instance)
+            fields.intersection_update(concrete)
+            if fields:
+                model.objects.bulk_update(
+                    objects, sorted(fields), batch_size=self.bulk_batch_size
+                )
+            for instance, (_, _, data) in zip(objects, valid):
+                for name in to_many & set(data):
+                    getattr(instance, name).set(data[name])
+            return objects
+
+        def write_row(instance, data):
+            return serializer.child.update(instance, {**data, **stamp})
+
+        with transaction.atomic():
+            pk_field = model._meta.pk
+            lookup_ids = set()
+            for pk in ids:
+                try:
+                    lookup_ids.add(pk_field.to_python(pk))
+                except (DjangoValidationError, TypeError):
+                    continue
+            found = self.get_queryset().select_for_update().in_bulk(lookup_ids)
+            instances = []
+            for pk in ids:
+                try:
+                    instances.append(found.get(pk_field.to_python(pk)))
+                except (DjangoValidationError, TypeError):
+                    instances.append(None)
+
+            valid, errors = self._validate_bulk_items(serializer, items, instances)
+            objects, as_batch = self._write_items(
+                model, valid, errors, write_batch, write_row
+            )
+            pks = [instance.pk for instance in objects]
+            if as_batch and pks:
+                self._refresh_bulk_rows(model, pks)
+                self._log_bulk_changes(model, objects, originals)
+                if fields:
+                    records_bulk_written.send(
+                        sender=model, pks=pks, fields=sorted(fields)
+                    )
+
+        return self._bulk_response("updated_count", pks, errors, status.HTTP_200_OK)
+
     def _apply_filters_to_queryset(self, queryset, filters):
         """
         Apply filters to queryset based on provided filter criteria
@@ -85,7 +620,14 @@ class BulkOperationsMixin:
                 ...
             }
         }
+
+        Or, to give each instance its own values:
+        {"items": [{"id": 1, "field1": "value1"}, ...]}  or  [...]
         """
+        items = self._get_items(request)
+        if items:
+            return self._bulk_update_items(items)
+
         ids = request.data.get("ids", [])
         filters = request.data.get("filters", {})
         update_data = request.data.get("data", {})
@@ -121,9 +663,16 @@ class BulkOperationsMixin:
                 status=status.HTTP_404_NOT_FOUND,
             )
 
+        # Stamp the rows so cached copies and ETags see the change
+        update_data = {**get_updated_at_stamp(queryset.model), **update_data}
+
         # Perform bulk update within a transaction
         with transaction.atomic():
+            pks = list(queryset.values_list("pk", flat=True))
             updated_count = queryset.update(**update_data)
+            records_bulk_written.send(
+                sender=queryset.model, pks=pks, fields=list(update_data)
+            )
 
         return Response(
             {
@@ -0,0 +1,103 @@
+"""
+API pagination classes
+
+``PageNumberPagination`` stays the default. Viewsets over large tables opt
+in to ``CreatedAtCursorPagination`` with ``pagination_class``.
+"""
+
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, _reverse_ordering
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Cursor pagination keyed by ``(created_at, id)``, newest first.
+
+    The cursor holds the created_at and id of the last row served, and the
+    next page is read with a keyset condition on both, so every page costs
+    one indexed query without a COUNT, whatever its depth, and rows sharing
+    a timestamp are never skipped or repeated.
+    """
+
+    ordering = ("-created_at", "-id")
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+        position = self.cursor.position if self.cursor else None
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(position, reverse))
+
+        results = list(queryset[: self.page_size + 1])
+        self.page = results[: self.page_size]
+        has_more = len(results) > self.page_size
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_keyset_filter(self, position, reverse):
+        """Rows after the position in the (possibly reversed) ordering"""
+        try:
+            created_at, pk = position.rsplit("|", 1)
+            created_at, pk = datetime.fromisoformat(created_at), int(pk)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        descending = self.ordering[0].startswith("-")
+        lookup = "gt" if reverse == descending else "lt"
+        created_field, id_field = (order.lstrip("-") for order in self.ordering)
+        return Q(**{f"{created_field}__{lookup}": created_at}) | Q(
+            **{created_field: created_at, f"{id_field}__{lookup}": pk}
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.page:
+            position = self._get_position_from_instance(self.page[-1], self.ordering)
+        else:
+            position = self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.page:
+            position = self._get_position_from_instance(self.page[0], self.ordering)
+        else:
+            position = self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def _get_position_from_instance(self, instance, ordering):
+        created_field, id_field = (order.lstrip("-") for order in ordering)
+        if isinstance(instance, dict):
+            created_at, pk = instance[created_field], instance[id_field]
+        else:
+            created_at, pk = getattr(instance, created_field), getattr(
+                instance, id_field
+            )
+        return f"{created_at.isoformat()}|{pk}"
@@ -0,0 +1,150 @@
+"""
+Search backends for ``SearchFilterMixin``
+
+``IContainsSearchBackend`` ORs an ``icontains`` lookup per search field,
+which scans the whole table. ``IndexedSearchBackend``, the default, reads
+the indexes created by ``genie_core.search_index.CreateSearchIndex`` and
+returns the same rows:
+
+* on PostgreSQL the ``icontains`` lookups are kept as they are, the
+  ``pg_trgm`` GIN indexes on ``UPPER(column::text)`` serve them directly;
+* on SQLite the term is matched against the FTS5 trigram table, restricted
+  to the search field columns.
+
+Terms shorter than a trigram, fields the index does not cover (lookups
+across relations) and tables without an index use ``icontains``.
+
+The backend is chosen per viewset with ``search_backend`` or for the whole
+API with the ``API_SEARCH_BACKEND`` setting, both a class or dotted path.
+
+Which columns a table has indexed is read once per process and checked
+again after ``API_SEARCH_INDEX_TTL`` seconds, or right after the migrations
+run, so an index created or dropped by a migration is picked up.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from genie_core.search_index import search_table_name, search_trigger_names
+
+API_SEARCH_BACKEND = getattr(
+    settings, "API_SEARCH_BACKEND", "genie_core.api.search.IndexedSearchBackend"
+)
+
+API_SEARCH_INDEX_TTL = getattr(settings, "API_SEARCH_INDEX_TTL", 300)
+
+# Trigram indexes cannot narrow down shorter terms
+MIN_INDEXED_TERM_LENGTH = 3
+
+# (alias, db_table) -> (checked at, indexed columns)
+_indexed_columns = {}
+
+
+def get_search_backend(backend=None):
+    """Return an instance of a backend class or dotted path, or the default"""
+    backend = backend or API_SEARCH_BACKEND
+    if isinstance(backend, str):
+        backend = import_string(backend)
+    return backend()
+
+
+def get_indexed_columns(alias, db_table):
+    """
+    Columns of the SQLite FTS5 table of a table, empty when the table or any
+    of its sync triggers is missing, so a stale index is never read.
+    """
+    now = time.monotonic()
+    cached = _indexed_columns.get((alias, db_table))
+    if cached and now - cached[0] < API_SEARCH_INDEX_TTL:
+        return cached[1]
+    columns = read_indexed_columns(alias, db_table)
+    _indexed_columns[(alias, db_table)] = (now, columns)
+    return columns
+
+
+def clear_indexed_columns(**kwargs):
+    """Read the indexed columns of every table again, e.g. after migrating"""
+    _indexed_columns.clear()
+
+
+get_indexed_columns.cache_clear = clear_indexed_columns
+
+
+def read_indexed_columns(alias, db_table):
+    """Query the indexed columns of a table, see ``get_indexed_columns``"""
+    search = search_table_name(db_table)
+    triggers = search_trigger_names(db_table)
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s",
+            [db_table],
+        )
+        if not set(triggers) <= {row[0] for row in cursor.fetchall()}:
+            return frozenset()
+        cursor.execute(
+            "SELECT name FROM pragma_table_info(%s)",
+            [search],
+        )
+        return frozenset(row[0] for row in cursor.fetchall())
+
+
+def get_field_columns(model, fields):
+    """Columns of the search fields, None if any is not a local column"""
+    columns = []
+    for name in fields:
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if not field.concrete or field.is_relation:
+            return None
+        columns.append(field.column)
+    return columns
+
+
+class IContainsSearchBackend:
+    """Match the term anywhere in any search field, case-insensitively"""
+
+    def filter_queryset(self, queryset, fields, term):
+        q_objects = Q()
+        for field in fields:
+            q_objects |= Q(**{f"{field}__icontains": term})
+        return queryset.filter(q_objects)
+
+
+class IndexedSearchBackend(IContainsSearchBackend):
+    """``icontains`` search answered from the trigram indexes, see module docs"""
+
+    def filter_queryset(self, queryset, fields, term):
+        alias = queryset.db
+        if (
+            connections[alias].vendor == "sqlite"
+            and len(term) >= MIN_INDEXED_TERM_LENGTH
+        ):
+            model = queryset.model
+            columns = get_field_columns(model, fields)
+            indexed = get_indexed_columns(alias, model._meta.db_table)
+            if columns and set(columns) <= indexed:
+                return queryset.filter(
+                    pk__in=self.sqlite_match(alias, model, columns, term)
+                )
+        return super().filter_queryset(queryset, fields, term)
+
+    def sqlite_match(self, alias, model, columns, term):
+        """Subquery of the pks whose columns contain the term"""
+        search = connections[alias].ops.quote_name(
+            search_table_name(model._meta.db_table)
+        )
+        # A quoted phrase is taken literally; the trigram tokenizer matches
+        # it as a case-insensitive substring, like LIKE
+        phrase = '"%s"' % term.replace('"', '""')
+        return RawSQL(
+            f"SELECT rowid FROM {search} WHERE {search} MATCH %s",
+            [f"{{{' '.join(columns)}}} : {phrase}"],
+        )
@@ -63,6 +63,10 @@ class CoreConfig(AppConfig):
             __import__("genie_core.login_history")
             __import__("genie_core.menu")
 
+            from genie_core.scheduler import autostart_scheduler
+
+            autostart_scheduler()
+
             from django.conf import settings
 
             from .celery_schedules import HORILLA_BEAT_SCHEDULE
@@ -0,0 +1,68 @@
+"""
+Authentication backend caching permission sets.
+
+``ModelBackend`` loads a user's permission set with two queries the first
+time ``has_perm`` is called on a user object, so every request pays for it
+again. ``HorillaModelBackend`` keeps the set in the shared cache, tagged
+with a version token per user and a global one. The receivers in
+``genie_core.signals`` replace the user token when the user, their direct
+permissions, groups or role permissions change, and the global token when
+groups, roles or permissions themselves are changed or deleted.
+"""
+
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+# Seconds a user's permission set stays cached
+PERMISSION_CACHE_TIMEOUT = getattr(settings, "PERMISSION_CACHE_TIMEOUT", 3600)
+
+GLOBAL_VERSION_KEY = "permissions_version"
+
+
+def _user_version_key(user_id):
+    return f"user_permissions_version_{user_id}"
+
+
+def get_permission_cache_key(user_id):
+    """Return the cache key of the current permission set of a user."""
+    keys = [GLOBAL_VERSION_KEY, _user_version_key(user_id)]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Fresh tokens rather than counters restarting at 1, so a set
+            # cached before the token was evicted is never taken as current
+            cache.add(key, uuid4().hex, timeout=None)
+            versions[key] = cache.get(key)
+    return f"user_permissions_{user_id}_{versions[keys[0]]}_{versions[keys[1]]}"
+
+
+def bump_user_permission_version(user_ids):
+    """Make the given users' permission sets reload on their next check."""
+    cache.set_many(
+        {_user_version_key(user_id): uuid4().hex for user_id in user_ids},
+        timeout=None,
+    )
+
+
+def bump_permission_version():
+    """Make every user's permission set reload on its next check."""
+    cache.set(GLOBAL_VERSION_KEY, uuid4().hex, timeout=None)
+
+
+class HorillaModelBackend(ModelBackend):
+    """``ModelBackend`` reading permission sets from the shared cache"""
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, "_perm_cache"):
+            key = get_permission_cache_key(user_obj.pk)
+            permissions = cache.get(key)
+            if permissions is None:
+                permissions = super().get_all_permissions(user_obj)
+                cache.set(key, permissions, PERMISSION_CACHE_TIMEOUT)
+            user_obj._perm_cache = permissions
+        return user_obj._perm_cache
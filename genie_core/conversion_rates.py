@@ -0,0 +1,107 @@
+"""
+In-memory index of dated conversion rates.
+
+Every process keeps the ``DatedConversionRate`` rows of a company sorted by
+start date per currency, loaded with one query, and finds the rate on a
+date with ``bisect``. The index is tagged with a version token kept in
+the shared cache and replaced by the post_save/post_delete receivers in
+``genie_core.signals``; a process rebuilds its index once the token
+changes. Rows written without signals (``bulk_create``, ``update``) must
+call ``bump_conversion_rate_version`` themselves.
+"""
+
+from bisect import bisect_right
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import uuid4
+
+from django.core.cache import cache
+
+from genie_core.models import DatedConversionRate
+
+# company id -> (version, ConversionRateIndex)
+_indexes = {}
+
+
+def _version_key(company_id):
+    return f"dated_conversion_rates_version_{company_id}"
+
+
+def get_conversion_rate_version(company_id):
+    """Return the current version of a company's dated conversion rates."""
+    key = _version_key(company_id)
+    version = cache.get(key)
+    if version is None:
+        # A fresh token rather than a counter restarting at 1, so an index
+        # built before the cache was cleared is never taken as current
+        cache.add(key, uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_conversion_rate_version(company_id):
+    """Make every process reload the dated conversion rates of a company."""
+    cache.set(_version_key(company_id), uuid4().hex, timeout=None)
+
+
+class ConversionRateIndex:
+    """Start dates and rates of each currency of a company, by start date"""
+
+    def __init__(self, rows):
+        self.start_dates = {}
+        self.rates = {}
+        for currency_id, start_date, conversion_rate in rows:
+            self.start_dates.setdefault(currency_id, []).append(start_date)
+            self.rates.setdefault(currency_id, []).append(conversion_rate)
+
+    def rate_on(self, currency_id, on_date, default=None):
+        """Rate of the latest period starting on or before the date"""
+        start_dates = self.start_dates.get(currency_id)
+        if not start_dates:
+            return default
+        position = bisect_right(start_dates, on_date)
+        return self.rates[currency_id][position - 1] if position else default
+
+    def rates_on(self, currency_id, dates, default=None):
+        """Rates on each of the dates, searching every distinct date once"""
+        found = {}
+        rates = []
+        for on_date in dates:
+            rate = found.get(on_date)
+            if rate is None:
+                rate = found[on_date] = self.rate_on(currency_id, on_date, default)
+            rates.append(rate)
+        return rates
+
+
+def get_conversion_rate_index(company_id):
+    """Return the rate index of a company, rebuilding it if out of date."""
+    version = get_conversion_rate_version(company_id)
+    cached = _indexes.get(company_id)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    rows = (
+        DatedConversionRate.all_objects.filter(company_id=company_id)
+        .order_by("currency_id", "start_date")
+        .values_list("currency_id", "start_date", "conversion_rate")
+    )
+    index = ConversionRateIndex(rows)
+    _indexes[company_id] = (version, index)
+    return index
+
+
+def as_date(value):
+    """The date of a date or datetime, today for None"""
+    if value is None:
+        return date.today()
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def as_decimal(amount):
+    """An amount as a Decimal, going through str like the single conversions"""
+    if isinstance(amount, (Decimal, int)):
+        return Decimal(amount)
+    return Decimal(str(amount))
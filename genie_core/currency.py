@@ -0,0 +1,179 @@
+"""
+Set-based conversion of stored money amounts after a company's default
+currency changes.
+
+Receivers of ``company_currency_changed`` call ``convert_currency_fields``,
+which multiplies the amounts in the database with one
+``UPDATE ... SET amount = amount * rate`` per model instead of loading the
+rows. Tables above ``CURRENCY_CONVERSION_ASYNC_THRESHOLD`` rows are
+converted by a Celery task in pk-range chunks once the currency change is
+committed.
+"""
+
+import logging
+from decimal import Context, Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DecimalField, F, Func, Max, Min, Value
+
+from genie_core.signals import currency_amounts_converted
+from genie_core.utils import get_updated_at_stamp
+
+logger = logging.getLogger(__name__)
+
+# Rows above which a model is converted by a Celery task instead of inline
+CURRENCY_CONVERSION_ASYNC_THRESHOLD = getattr(
+    settings, "CURRENCY_CONVERSION_ASYNC_THRESHOLD", 100000
+)
+
+# Width of the pk range converted by each UPDATE of the Celery task
+CURRENCY_CONVERSION_CHUNK_SIZE = getattr(
+    settings, "CURRENCY_CONVERSION_CHUNK_SIZE", 20000
+)
+
+SQLITE_CONVERT_FUNCTION = "horilla_convert_amount"
+
+
+def sqlite_convert_amount(value, conversion_rate, decimal_places):
+    """
+    SQLite function converting a stored amount with ``Decimal`` arithmetic,
+    reading and rounding it the way a loaded and saved DecimalField does.
+    """
+    if value is None:
+        return None
+    exponent = Decimal(1).scaleb(-decimal_places)
+    amount = Context(prec=15).create_decimal_from_float(float(value))
+    converted = amount.quantize(exponent) * Decimal(conversion_rate)
+    return str(converted.quantize(exponent))
+
+
+class ConvertedAmount(Func):
+    """
+    ``amount * rate`` rounded half-even to ``decimal_places``, the value a
+    saved Decimal product would be stored as. SQLite, whose arithmetic is
+    floating point, computes it with ``sqlite_convert_amount``.
+    """
+
+    def __init__(self, expression, conversion_rate, decimal_places, **extra):
+        self.decimal_places = decimal_places
+        rate = Value(Decimal(conversion_rate), output_field=DecimalField())
+        super().__init__(expression, rate, **extra)
+
+    def compile_arguments(self, compiler):
+        amount, rate = self.get_source_expressions()
+        amount_sql, amount_params = compiler.compile(amount)
+        rate_sql, rate_params = compiler.compile(rate)
+        return amount_sql, rate_sql, (*amount_params, *rate_params)
+
+    def compile_product(self, compiler):
+        amount_sql, rate_sql, params = self.compile_arguments(compiler)
+        return f"({amount_sql} * {rate_sql})", params
+
+    def as_sql(self, compiler, connection, **extra_context):
+        product, params = self.compile_product(compiler)
+        return f"ROUND({product}, {self.decimal_places})", params
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        # ROUND rounds numeric ties away from zero; truncate the ties whose
+        # rounding digit is even instead
+        product, params = self.compile_product(compiler)
+        scale = 10**self.decimal_places
+        sql = (
+            f"CASE WHEN MOD({product} * {scale}, 2) IN (0.5, -0.5) "
+            f"THEN TRUNC({product}, {self.decimal_places}) "
+            f"ELSE ROUND({product}, {self.decimal_places}) END"
+        )
+        return sql, params * 3
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        connection.ensure_connection()
+        connection.connection.create_function(
+            SQLITE_CONVERT_FUNCTION, 3, sqlite_convert_amount, deterministic=True
+        )
+        amount_sql, rate_sql, params = self.compile_arguments(compiler)
+        return (
+            f"{SQLITE_CONVERT_FUNCTION}({amount_sql}, {rate_sql}, "
+            f"{self.decimal_places})",
+            params,
+        )
+
+
+def get_conversion_updates(model, fields, conversion_rate):
+    """
+    Return the ``update()`` keyword arguments multiplying each field by the
+    rate, rounded to the field's decimal places like a saved Decimal, and
+    stamping ``updated_at``.
+    """
+    updates = get_updated_at_stamp(model)
+    for name in fields:
+        field = model._meta.get_field(name)
+        updates[name] = ConvertedAmount(
+            F(name), conversion_rate, field.decimal_places or 0, output_field=field
+        )
+    return updates
+
+
+def convert_amounts(queryset, fields, conversion_rate, chunk_size=None, progress=None):
+    """
+    Multiply the given fields of every row of the queryset by the rate in
+    the database. With ``chunk_size`` the rows are updated one pk range at
+    a time and ``progress(converted, total)`` is called after each range.
+    Returns the number of rows converted.
+    """
+    model = queryset.model
+    queryset = queryset.order_by()
+    updates = get_conversion_updates(model, fields, conversion_rate)
+
+    bounds = {}
+    if chunk_size:
+        bounds = queryset.aggregate(low=Min("pk"), high=Max("pk"))
+    low, high = bounds.get("low"), bounds.get("high")
+    if not isinstance(low, int):
+        converted = queryset.update(**updates)
+    else:
+        total = queryset.count()
+        converted = 0
+        for start in range(low, high + 1, chunk_size):
+            converted += queryset.filter(
+                pk__gte=start, pk__lt=start + chunk_size
+            ).update(**updates)
+            if progress:
+                progress(converted, total)
+
+    currency_amounts_converted.send(
+        sender=model, fields=list(fields), conversion_rate=conversion_rate
+    )
+    return converted
+
+
+def convert_currency_fields(model, filters, fields, conversion_rate):
+    """
+    Convert the money fields of the model rows matching ``filters`` after a
+    currency change: inline for ordinary tables, or in a Celery task after
+    commit when more than ``CURRENCY_CONVERSION_ASYNC_THRESHOLD`` rows match.
+    Model instances in ``filters`` are passed to the task by pk.
+    """
+    if conversion_rate is None:
+        return None
+    queryset = model.objects.filter(**filters)
+    if queryset.count() <= CURRENCY_CONVERSION_ASYNC_THRESHOLD:
+        return convert_amounts(queryset, fields, conversion_rate)
+
+    from genie_core.tasks import convert_currency_amounts
+
+    task_filters = {key: getattr(value, "pk", value) for key, value in filters.items()}
+    transaction.on_commit(
+        lambda: convert_currency_amounts.delay(
+            model._meta.label,
+            task_filters,
+            list(fields),
+            str(conversion_rate),
+        )
+    )
+    logger.info(
+        "Queued currency conversion of %s rows matching %s",
+        model._meta.label,
+        task_filters,
+    )
+    return None
@@ -34,6 +34,7 @@ from genie.exceptions import HorillaHttp404
 from genie.registry.feature import FEATURE_REGISTRY
 from genie_core.decorators import htmx_required, permission_required_or_denied
 from genie_core.models import ImportHistory
+from genie_core.signals import records_bulk_written
 from genie_generics.views import HorillaListView, HorillaTabView
 
 logger = logging.getLogger(__name__)
@@ -1874,6 +1875,10 @@ class ImportStep4View(View):
                 bulk_create_start = time.perf_counter()
                 model.objects.bulk_create(created, batch_size=create_batch_size)
                 created_count = len(created)
+                pks = [obj.pk for obj in created]
+                records_bulk_written.send(
+                    sender=model, pks=None if None in pks else pks, fields=None
+                )
 
             bulk_update_start = time.perf_counter()
             for fields, objs in updated_groups.items():
@@ -1884,6 +1889,9 @@ class ImportStep4View(View):
                             batch, fields=list(fields), batch_size=len(batch)
                         )
                         updated_count += len(batch)
+                    records_bulk_written.send(
+                        sender=model, pks=[obj.pk for obj in objs], fields=list(fields)
+                    )
 
         # Generate error CSV if there are errors
         error_file_path = None
@@ -0,0 +1,36 @@
+"""
+Management command to run the scheduled APScheduler jobs in a dedicated
+process; web workers only start the scheduler with SCHEDULER_AUTOSTART = True.
+
+Usage:
+python manage.py run_scheduler
+
+Several runners may be started; only the one holding the leader lock runs
+the jobs, the others take over if it stops.
+"""
+
+import threading
+
+from django.core.management.base import BaseCommand
+
+from genie_core.scheduler import scheduler, start_scheduler, stop_scheduler
+
+
+class Command(BaseCommand):
+    help = "Run the scheduled jobs of every app in this process"
+
+    def handle(self, *args, **options):
+        if start_scheduler():
+            self.stdout.write(self.style.SUCCESS("Running scheduled jobs"))
+        else:
+            self.stdout.write("Another process runs the scheduled jobs, standing by")
+
+        for job in scheduler.get_jobs():
+            self.stdout.write(f"  {job.id}: {job.trigger}")
+
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stop_scheduler()
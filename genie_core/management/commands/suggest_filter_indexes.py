@@ -0,0 +1,44 @@
+from collections import Counter
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from genie_core.models import SavedFilterList
+from genie_generics.filter_plans import get_filter_plan, get_filter_spec
+
+
+class Command(BaseCommand):
+    help = "Suggest indexes for fields compared by saved filter lists"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--model",
+            help="Only consider saved filters of this model, e.g. Lead",
+        )
+
+    def handle(self, *args, **options):
+        models_by_name = {}
+        for model in apps.get_models():
+            models_by_name.setdefault(model.__name__, []).append(model)
+
+        saved_lists = SavedFilterList.all_objects.all()
+        if options["model"]:
+            saved_lists = saved_lists.filter(model_name=options["model"])
+
+        suggestions = Counter()
+        for saved_list in saved_lists.iterator():
+            spec = get_filter_spec(saved_list.get_filter_params())
+            for model in models_by_name.get(saved_list.model_name, []):
+                for field in get_filter_plan(model, spec).index_suggestions:
+                    suggestions[field] += 1
+
+        if not suggestions:
+            self.stdout.write(self.style.SUCCESS("No missing filter indexes found"))
+            return
+
+        for field, count in suggestions.most_common():
+            meta = field.model._meta
+            self.stdout.write(
+                f"{meta.label}.{field.name}: used by {count} saved filter(s), "
+                f'add models.Index(fields=["{field.name}"]) to {meta.object_name}.Meta'
+            )
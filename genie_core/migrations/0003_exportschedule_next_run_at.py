@@ -0,0 +1,109 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:52
+
+from calendar import monthrange
+from datetime import date, timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+WEEKDAYS = [
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+]
+
+
+def next_run_date(schedule, today):
+    """
+    ExportSchedule.compute_next_run_at as of this migration: the first date,
+    from today on, on which the schedule is due given its last run.
+    """
+    if not schedule.start_date:
+        return None
+
+    last_run = schedule.last_run
+    earliest = max(schedule.start_date, today)
+    if last_run:
+        earliest = max(earliest, last_run + timedelta(days=1))
+
+    next_run = None
+    if schedule.frequency == "daily":
+        next_run = earliest
+
+    elif schedule.frequency == "weekly":
+        if last_run:
+            earliest = max(earliest, last_run + timedelta(days=7))
+        if schedule.weekday in WEEKDAYS:
+            days_ahead = (WEEKDAYS.index(schedule.weekday) - earliest.weekday()) % 7
+            next_run = earliest + timedelta(days=days_ahead)
+
+    elif schedule.frequency == "monthly":
+        if last_run:
+            next_month = date(
+                last_run.year + last_run.month // 12, last_run.month % 12 + 1, 1
+            )
+            earliest = max(earliest, next_month)
+        if schedule.day_of_month:
+            year, month = earliest.year, earliest.month
+            for _month in range(13):
+                if schedule.day_of_month <= monthrange(year, month)[1]:
+                    candidate = date(year, month, schedule.day_of_month)
+                    if candidate >= earliest:
+                        next_run = candidate
+                        break
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    elif schedule.frequency == "yearly":
+        if last_run:
+            earliest = max(earliest, date(last_run.year + 1, 1, 1))
+        if schedule.yearly_month and schedule.yearly_day_of_month:
+            for year in range(earliest.year, earliest.year + 9):
+                if (
+                    schedule.yearly_day_of_month
+                    <= monthrange(year, schedule.yearly_month)[1]
+                ):
+                    candidate = date(
+                        year, schedule.yearly_month, schedule.yearly_day_of_month
+                    )
+                    if candidate >= earliest:
+                        next_run = candidate
+                        break
+
+    if next_run and schedule.end_date and next_run > schedule.end_date:
+        return None
+    return next_run
+
+
+def populate_next_run_at(apps, schema_editor):
+    ExportSchedule = apps.get_model("horilla_core", "ExportSchedule")
+    today = timezone.now().date()
+    schedules = list(ExportSchedule.objects.all())
+    for schedule in schedules:
+        schedule.next_run_at = next_run_date(schedule, today)
+    ExportSchedule.objects.bulk_update(schedules, ["next_run_at"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("horilla_core", "0002_fieldpermission"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="exportschedule",
+            name="next_run_at",
+            field=models.DateField(
+                blank=True,
+                db_index=True,
+                editable=False,
+                help_text="Next date the export is due, empty once it has ended.",
+                null=True,
+            ),
+        ),
+        migrations.RunPython(populate_next_run_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("horilla_core", "0003_exportschedule_next_run_at"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="recyclebin",
+            index=models.Index(
+                fields=["company", "deleted_at"], name="recyclebin_company_deleted"
+            ),
+        ),
+    ]
@@ -4,8 +4,9 @@ models for horilla core app
 
 import json
 import logging
+from calendar import monthrange
 from collections.abc import Iterable
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 from decimal import ROUND_HALF_UP, Decimal
 from uuid import uuid4
 
@@ -48,6 +49,17 @@ from genie_utils.middlewares import _thread_local
 
 logger = logging.getLogger(__name__)
 
+# DAY_CHOICES values in date.weekday() order
+WEEKDAYS = [
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+]
+
 
 def upload_path(instance, filename):
     """
@@ -638,24 +650,11 @@ class MultipleCurrency(HorillaCoreModel):
         Returns:
             Decimal: The conversion rate
         """
-        if conversion_date is None:
-            conversion_date = date.today()
-
-        # Try to get dated conversion rate
-        dated_rate = (
-            DatedConversionRate.objects.filter(
-                company=self.company, currency=self, start_date__lte=conversion_date
-            )
-            .order_by("-start_date")
-            .first()
-        )
+        from genie_core.conversion_rates import as_date, get_conversion_rate_index
 
-        if dated_rate:
-            # Check if this rate is still valid (no newer rate exists before conversion_date)
-            return dated_rate.conversion_rate
-
-        # Fall back to static conversion rate
-        return self.conversion_rate
+        # Dated rates come from the company's in-memory index
+        index = get_conversion_rate_index(self.company_id)
+        return index.rate_on(self.pk, as_date(conversion_date), self.conversion_rate)
 
     def format_amount(self, amount):
         """Format amount according to currency's decimal places and format"""
@@ -708,6 +707,34 @@ class MultipleCurrency(HorillaCoreModel):
         rate = self.get_conversion_rate_for_date(conversion_date)
         return Decimal(str(amount)) * rate
 
+    def convert_many(self, amounts, dates=None):
+        """
+        Convert many amounts from default currency to this currency at once,
+        each at the rate of its date (default today). For reports and
+        forecasts converting whole columns: the rates are looked up once per
+        distinct date.
+
+        Args:
+            amounts: Amounts to convert
+            dates: Dates for conversion rate lookup, one per amount
+        """
+        from genie_core.conversion_rates import (
+            as_date,
+            as_decimal,
+            get_conversion_rate_index,
+        )
+
+        amounts = list(amounts)
+        if dates is None:
+            rates = [self.get_conversion_rate_for_date()] * len(amounts)
+        else:
+            index = get_conversion_rate_index(self.company_id)
+            rates = index.rates_on(self.pk, map(as_date, dates), self.conversion_rate)
+        return [
+            Decimal("0") if amount is None else as_decimal(amount) * rate
+            for amount, rate in zip(amounts, rates)
+        ]
+
     def convert_to_default(self, amount, conversion_date=None):
         """
         Convert amount from this currency to default currency.
@@ -2526,6 +2553,11 @@ class RecycleBin(models.Model):
     class Meta:
         verbose_name = "Recycle Bin"
         verbose_name_plural = "Recycle Bin"
+        indexes = [
+            models.Index(
+                fields=["company", "deleted_at"], name="recyclebin_company_deleted"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.model_name} ({self.record_id}) - Deleted at {self.deleted_at}"
@@ -3263,6 +3295,13 @@ class ExportSchedule(HorillaCoreModel):
     last_run = models.DateField(
         null=True, blank=True, verbose_name=_("Last Executed On")
     )
+    next_run_at = models.DateField(
+        null=True,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text=_("Next date the export is due, empty once it has ended."),
+    )
 
     class Meta:
         verbose_name = _("Export Schedule")
@@ -3271,6 +3310,79 @@ class ExportSchedule(HorillaCoreModel):
     def __str__(self):
         return f"{self.user} – {self.frequency} – {self.export_format}"
 
+    def save(self, *args, **kwargs):
+        """
+        Recompute next_run_at from the schedule and its last run on every save.
+        """
+        self.next_run_at = self.compute_next_run_at()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "next_run_at"}
+        super().save(*args, **kwargs)
+
+    def compute_next_run_at(self, today=None):
+        """
+        Return the first date, from today on, on which the schedule is due
+        given its last run, or None if it never runs again. A schedule runs
+        at most once a day, week, calendar month or calendar year.
+        """
+        if not self.start_date:
+            return None
+
+        today = today or timezone.now().date()
+        last_run = self.last_run
+        earliest = max(self.start_date, today)
+        if last_run:
+            earliest = max(earliest, last_run + timedelta(days=1))
+
+        next_run = None
+        if self.frequency == "daily":
+            next_run = earliest
+
+        elif self.frequency == "weekly":
+            if last_run:
+                earliest = max(earliest, last_run + timedelta(days=7))
+            if self.weekday in WEEKDAYS:
+                days_ahead = (WEEKDAYS.index(self.weekday) - earliest.weekday()) % 7
+                next_run = earliest + timedelta(days=days_ahead)
+
+        elif self.frequency == "monthly":
+            if last_run:
+                next_month = date(
+                    last_run.year + last_run.month // 12, last_run.month % 12 + 1, 1
+                )
+                earliest = max(earliest, next_month)
+            if self.day_of_month:
+                year, month = earliest.year, earliest.month
+                for _month in range(13):
+                    if self.day_of_month <= monthrange(year, month)[1]:
+                        candidate = date(year, month, self.day_of_month)
+                        if candidate >= earliest:
+                            next_run = candidate
+                            break
+                    year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+        elif self.frequency == "yearly":
+            if last_run:
+                earliest = max(earliest, date(last_run.year + 1, 1, 1))
+            if self.yearly_month and self.yearly_day_of_month:
+                # A 29th of February can be up to eight years away
+                for year in range(earliest.year, earliest.year + 9):
+                    if (
+                        self.yearly_day_of_month
+                        <= monthrange(year, self.yearly_month)[1]
+                    ):
+                        candidate = date(
+                            year, self.yearly_month, self.yearly_day_of_month
+                        )
+                        if candidate >= earliest:
+                            next_run = candidate
+                            break
+
+        if next_run and self.end_date and next_run > self.end_date:
+            return None
+        return next_run
+
     def module_names_display(self):
         """Return the module names as a comma-separated string."""
         return ", ".join(self.modules)
@@ -1,36 +1,290 @@
 # myapp/scheduler.py
+"""
+In-process APScheduler jobs, run by a single leader process.
+
+Apps register their jobs with ``register_job`` when their scheduler module
+is imported. Every process may call ``start_scheduler``, but the jobs only
+run in the process holding the scheduler leader lock: a session advisory
+lock on PostgreSQL, an ``flock`` on a lock file elsewhere. The other
+processes keep retrying the lock and take over if the leader exits.
+
+The jobs run in the process started with ``python manage.py run_scheduler``.
+Set ``SCHEDULER_AUTOSTART = True`` to also start the scheduler from every
+process loading the apps, such as web workers.
+"""
+
+import hashlib
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from datetime import time as dt_time
+
 from apscheduler.schedulers.background import BackgroundScheduler
+from django.conf import settings
 from django.core.management import call_command
+from django.db import connections
 from django.utils import timezone
 
 from genie_core.models import RecycleBin, RecycleBinPolicy
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Seconds between attempts of a standby process to become the leader
+SCHEDULER_LEADER_RETRY_INTERVAL = getattr(
+    settings, "SCHEDULER_LEADER_RETRY_INTERVAL", 60
+)
+
+# Rows removed by each DELETE of the recycle bin purge
+RECYCLE_BIN_PURGE_BATCH_SIZE = getattr(settings, "RECYCLE_BIN_PURGE_BATCH_SIZE", 5000)
+
+# Seconds a recycle bin purge may run before leaving the rest to the next run
+RECYCLE_BIN_PURGE_TIME_BUDGET = getattr(settings, "RECYCLE_BIN_PURGE_TIME_BUDGET", 300)
+
+# Commands that never run the scheduler from app loading
+SCHEDULER_SKIP_COMMANDS = [
+    "makemigrations",
+    "migrate",
+    "compilemessages",
+    "collectstatic",
+    "flush",
+    "shell",
+    "test",
+    "run_scheduler",
+]
+
+# Arbitrary 64 bit id of the PostgreSQL advisory lock
+ADVISORY_LOCK_ID = 0x686F72696C6C61
+
+
+class SchedulerLeaderLock:
+    """
+    Process-wide lock electing the one process that runs scheduled jobs.
+    The lock is held until ``release`` or until the process exits.
+    """
+
+    def __init__(self, using="default", lock_file=None):
+        self.using = using
+        self.lock_file = lock_file
+        self.connection = None
+        self.file = None
+
+    @property
+    def is_leader(self):
+        return self.connection is not None or self.file is not None
+
+    def get_lock_file(self):
+        """Lock file shared by every process using the same database"""
+        if self.lock_file:
+            return self.lock_file
+        lock_file = getattr(settings, "SCHEDULER_LOCK_FILE", None)
+        if lock_file:
+            return lock_file
+        database = str(settings.DATABASES[self.using]["NAME"])
+        digest = hashlib.sha256(os.path.abspath(database).encode()).hexdigest()
+        return os.path.join(
+            tempfile.gettempdir(), f"horilla-scheduler-{digest[:16]}.lock"
+        )
+
+    def acquire(self):
+        """Try to become the leader without blocking; returns True on success"""
+        if self.is_leader:
+            return True
+        if connections[self.using].vendor == "postgresql":
+            return self.acquire_advisory_lock()
+        return self.acquire_file_lock()
+
+    def acquire_advisory_lock(self):
+        # A dedicated connection, so the session lock outlives request
+        # connections being closed
+        connection = connections.create_connection(self.using)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_try_advisory_lock(%s)", [ADVISORY_LOCK_ID])
+                acquired = cursor.fetchone()[0]
+        except Exception:
+            connection.close()
+            raise
+        if acquired:
+            self.connection = connection
+        else:
+            connection.close()
+        return acquired
+
+    def acquire_file_lock(self):
+        lock_file = open(self.get_lock_file(), "a")
+        # Without flock (Windows) every process runs the jobs, as before
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+        self.file = lock_file
+        return True
+
+    def release(self):
+        """Give up leadership"""
+        if self.connection is not None:
+            try:
+                with self.connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", [ADVISORY_LOCK_ID])
+            finally:
+                self.connection.close()
+                self.connection = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+scheduler = BackgroundScheduler()
+leader_lock = SchedulerLeaderLock()
+_standby = None
+
+
+def register_job(func, trigger, **kwargs):
+    """Register a job to run in the scheduler leader process"""
+    kwargs.setdefault("id", func.__name__)
+    kwargs.setdefault("replace_existing", True)
+    return scheduler.add_job(func, trigger, **kwargs)
+
+
+def wait_for_leadership(stop_event):
+    """Retry the leader lock until it is acquired, then run the jobs"""
+    while not stop_event.wait(SCHEDULER_LEADER_RETRY_INTERVAL):
+        try:
+            if leader_lock.acquire():
+                logger.info("Process %s is now the scheduler leader", os.getpid())
+                scheduler.start()
+                return
+        except Exception as e:
+            logger.error("Error acquiring the scheduler leader lock: %s", e)
+
+
+def start_scheduler():
+    """
+    Run the registered jobs in this process if it can take the leader
+    lock, otherwise stand by in a background thread until it can.
+    Returns True if this process is the leader.
+    """
+    global _standby
+
+    if scheduler.running:
+        return True
+    if leader_lock.acquire():
+        logger.info("Process %s is the scheduler leader", os.getpid())
+        scheduler.start()
+        return True
+    if _standby is None:
+        _standby = threading.Event()
+        threading.Thread(
+            target=wait_for_leadership, args=(_standby,), daemon=True
+        ).start()
+    return False
+
+
+def stop_scheduler():
+    """Stop running jobs or standing by, and release the leader lock"""
+    global _standby
+
+    if _standby is not None:
+        _standby.set()
+        _standby = None
+    if scheduler.running:
+        scheduler.shutdown()
+    leader_lock.release()
+
+
+def autostart_scheduler():
+    """Start the scheduler from app loading, if enabled and needed"""
+    if not getattr(settings, "SCHEDULER_AUTOSTART", False):
+        return
+    if any(cmd in sys.argv for cmd in SCHEDULER_SKIP_COMMANDS):
+        return
+    # Off the app loading path, which should not touch the database
+    threading.Thread(target=start_scheduler, daemon=True).start()
+
 
 def fiscal_year_update():
     call_command("update_fiscal_year")
 
 
-def clear_expired_recyclebin():
-    now = timezone.now()
-    total_deleted = 0
+def purge_in_batches(queryset, batch_size, deadline):
+    """
+    Delete the rows of a queryset with one short DELETE ... WHERE id IN
+    (SELECT id ... LIMIT n) statement per batch, until none are left or the
+    deadline passes. Rows are removed without loading them or sending
+    delete signals. Returns the (deleted, batches, complete) counts.
+    """
+    model = queryset.model
+    connection = connections[queryset.db]
+    deleted = batches = 0
+    while time.monotonic() < deadline:
+        ids = queryset.order_by().values("pk")[:batch_size]
+        if not connection.features.allow_sliced_subqueries_with_in:
+            ids = list(ids.values_list("pk", flat=True))
+        batch = model._base_manager.using(queryset.db).filter(pk__in=ids)
+        count = batch._raw_delete(queryset.db)
+        deleted += count
+        batches += 1
+        if count < batch_size:
+            return deleted, batches, True
+    return deleted, batches, False
+
+
+def clear_expired_recyclebin(now=None, batch_size=None, time_budget=None):
+    """
+    Purge recycle bin records older than their company's retention period,
+    in batches, stopping once the time budget is spent; the next run picks
+    up where this one stopped. Returns the run's metrics.
+    """
+    now = now or timezone.now()
+    batch_size = batch_size or RECYCLE_BIN_PURGE_BATCH_SIZE
+    time_budget = RECYCLE_BIN_PURGE_TIME_BUDGET if time_budget is None else time_budget
+    started = time.monotonic()
+    deadline = started + time_budget
+
+    metrics = {"deleted": 0, "batches": 0, "complete": True}
     for policy in RecycleBinPolicy.objects.select_related("company"):
         cutoff = now - timezone.timedelta(days=policy.retention_days)
-        deleted_count, _ = RecycleBin.objects.filter(
-            company=policy.company, deleted_at__date__lte=cutoff.date()
-        ).delete()
-        total_deleted += deleted_count
+        # Records deleted on or before the cutoff date, as a range on the index
+        expired_before = timezone.make_aware(
+            datetime.combine(cutoff.date() + timezone.timedelta(days=1), dt_time.min)
+        )
+        deleted, batches, complete = purge_in_batches(
+            RecycleBin.objects.filter(
+                company=policy.company, deleted_at__lt=expired_before
+            ),
+            batch_size,
+            deadline,
+        )
+        metrics["deleted"] += deleted
+        metrics["batches"] += batches
+        if not complete:
+            metrics["complete"] = False
+            break
 
-
-def start_scheduler():
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(
-        fiscal_year_update, "interval", hours=12, id="fiscal_year_update_job"
-    )
-    scheduler.add_job(
-        clear_expired_recyclebin,
-        "interval",
-        hours=4,
-        id="clear_expired_recyclebin_job",
-        replace_existing=True,
+    metrics["seconds"] = round(time.monotonic() - started, 3)
+    logger.info(
+        "Purged %(deleted)s expired recycle bin records in %(batches)s batches "
+        "(%(seconds)ss, complete=%(complete)s)",
+        metrics,
     )
-    scheduler.start()
+    return metrics
+
+
+register_job(fiscal_year_update, "interval", hours=12, id="fiscal_year_update_job")
+register_job(
+    clear_expired_recyclebin,
+    "interval",
+    hours=4,
+    id="clear_expired_recyclebin_job",
+)
@@ -0,0 +1,153 @@
+"""
+Database indexes serving the API ``search`` parameter.
+
+``CreateSearchIndex`` is a migration operation indexing text columns of a
+model for substring search:
+
+* on PostgreSQL, a ``pg_trgm`` GIN index per column on the
+  ``UPPER(column::text)`` expression Django's ``icontains`` compares, so
+  those lookups stop scanning the table;
+* on SQLite, an FTS5 table with the trigram tokenizer over the columns,
+  kept in sync with the table by triggers.
+
+Other databases are left unchanged. ``genie_core.api.search`` uses the
+indexes when they exist and falls back to ``icontains`` otherwise.
+
+SQLite drops the triggers when a later migration rebuilds the table
+(most ``AlterField``); the search then falls back to ``icontains`` until
+the operation is run again, which is safe as every statement is
+idempotent.
+"""
+
+from django.db.migrations.operations.base import Operation
+
+
+def search_table_name(db_table):
+    """Name of the SQLite FTS5 table indexing a table"""
+    return f"{db_table}_search"
+
+
+def search_trigger_names(db_table):
+    """Names of the SQLite triggers keeping the FTS5 table in sync"""
+    table = search_table_name(db_table)
+    return [f"{table}_insert", f"{table}_delete", f"{table}_update"]
+
+
+def trigram_index_name(db_table, column):
+    """Name of the PostgreSQL trigram index of a column, within 63 chars"""
+    return f"{db_table}_{column}_trgm"[-63:]
+
+
+class CreateSearchIndex(Operation):
+    """Index text fields of a model for the API search, see module docs"""
+
+    reversible = True
+
+    def __init__(self, model_name, fields):
+        self.model_name = model_name
+        self.fields = fields
+
+    def deconstruct(self):
+        return (
+            self.__class__.__qualname__,
+            [],
+            {"model_name": self.model_name, "fields": self.fields},
+        )
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def get_columns(self, model, schema_editor):
+        return [
+            schema_editor.quote_name(model._meta.get_field(name).column)
+            for name in self.fields
+        ]
+
+    def postgresql_statements(self, model, schema_editor):
+        table = model._meta.db_table
+        statements = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"]
+        for name in self.fields:
+            column = model._meta.get_field(name).column
+            statements.append(
+                f"CREATE INDEX IF NOT EXISTS "
+                f"{schema_editor.quote_name(trigram_index_name(table, column))} "
+                f"ON {schema_editor.quote_name(table)} USING gin "
+                f"((UPPER({schema_editor.quote_name(column)}::text)) gin_trgm_ops)"
+            )
+        return statements
+
+    def sqlite_statements(self, model, schema_editor):
+        quote = schema_editor.quote_name
+        table = model._meta.db_table
+        search = search_table_name(table)
+        pk = quote(model._meta.pk.column)
+        columns = self.get_columns(model, schema_editor)
+        names = ", ".join(columns)
+        new_values = ", ".join(f"new.{column}" for column in columns)
+        old_values = ", ".join(f"old.{column}" for column in columns)
+        delete_old = (
+            f"INSERT INTO {quote(search)} ({quote(search)}, rowid, {names}) "
+            f"VALUES ('delete', old.{pk}, {old_values});"
+        )
+        insert_new = (
+            f"INSERT INTO {quote(search)} (rowid, {names}) "
+            f"VALUES (new.{pk}, {new_values});"
+        )
+        insert_trigger, delete_trigger, update_trigger = search_trigger_names(table)
+        return [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {quote(search)} USING fts5("
+            f"{names}, content={quote(table)}, content_rowid={pk}, "
+            f"tokenize='trigram')",
+            f"CREATE TRIGGER IF NOT EXISTS {quote(insert_trigger)} AFTER INSERT ON "
+            f"{quote(table)} BEGIN {insert_new} END",
+            f"CREATE TRIGGER IF NOT EXISTS {quote(delete_trigger)} AFTER DELETE ON "
+            f"{quote(table)} BEGIN {delete_old} END",
+            f"CREATE TRIGGER IF NOT EXISTS {quote(update_trigger)} AFTER UPDATE ON "
+            f"{quote(table)} BEGIN {delete_old} {insert_new} END",
+            f"INSERT INTO {quote(search)} ({quote(search)}) VALUES ('rebuild')",
+        ]
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        vendor = schema_editor.connection.vendor
+        if vendor == "postgresql":
+            statements = self.postgresql_statements(model, schema_editor)
+        elif vendor == "sqlite":
+            statements = self.sqlite_statements(model, schema_editor)
+        else:
+            return
+        for statement in statements:
+            schema_editor.execute(statement, params=None)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        quote = schema_editor.quote_name
+        table = model._meta.db_table
+        vendor = schema_editor.connection.vendor
+        if vendor == "postgresql":
+            statements = [
+                f"DROP INDEX IF EXISTS "
+                f"{quote(trigram_index_name(table, model._meta.get_field(name).column))}"
+                for name in self.fields
+            ]
+        elif vendor == "sqlite":
+            statements = [
+                f"DROP TRIGGER IF EXISTS {quote(trigger)}"
+                for trigger in search_trigger_names(table)
+            ]
+            statements.append(f"DROP TABLE IF EXISTS {quote(search_table_name(table))}")
+        else:
+            return
+        for statement in statements:
+            schema_editor.execute(statement, params=None)
+
+    def describe(self):
+        return f"Create search index on {self.model_name}"
+
+    @property
+    def migration_name_fragment(self):
+        return f"{self.model_name.lower()}_search_index"
@@ -18,16 +18,35 @@ from decimal import Decimal
 from venv import logger
 
 from django.apps import apps
-from django.contrib.auth.models import Permission
+from django.contrib.auth.models import Group, Permission
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import FieldDoesNotExist
 from django.db import transaction
-from django.db.models import Case, F, IntegerField, Q, When
-from django.db.models.signals import post_migrate, post_save, pre_delete
+from django.db.models import (
+    Case,
+    ExpressionWrapper,
+    F,
+    IntegerField,
+    Q,
+    Value,
+    When,
+)
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_migrate,
+    post_save,
+    pre_delete,
+)
 from django.dispatch import Signal, receiver
 
+from genie_core.api.search import clear_indexed_columns
+from genie_core.backends import bump_permission_version, bump_user_permission_version
+from genie_core.conversion_rates import bump_conversion_rate_version
 from genie_core.models import (
     Company,
+    DatedConversionRate,
+    FieldPermission,
     FiscalYear,
     HorillaUser,
     MultipleCurrency,
@@ -37,11 +56,25 @@ from genie_core.models import (
     ScoringRule,
 )
 from genie_core.services.fiscal_year_service import FiscalYearService
+from genie_core.utils import (
+    bump_field_permission_version,
+    clear_currency_context,
+    get_updated_at_stamp,
+)
 from genie_keys.models import ShortcutKey
 from genie_utils.middlewares import _thread_local
 
 company_currency_changed = Signal()
 
+# Sent with the model as sender once its money fields have been converted
+currency_amounts_converted = Signal()
+
+# Sent with the model as sender after rows were written with update(),
+# bulk_create() or bulk_update(), which skip the per-row save receivers.
+# ``pks`` are the rows written (None if unknown) and ``fields`` the fields
+# set on them (None for new rows).
+records_bulk_written = Signal()
+
 
 @receiver(post_save, sender=Company)
 def create_company_fiscal_config(sender, instance, created, **kwargs):
@@ -104,6 +137,99 @@ def create_default_currency(sender, instance, created, **kwargs):
             )
 
 
+@receiver(post_save, sender=MultipleCurrency)
+@receiver(post_delete, sender=MultipleCurrency)
+@receiver(post_save, sender=DatedConversionRate)
+@receiver(post_delete, sender=DatedConversionRate)
+def reset_currency_context(sender, **kwargs):
+    """
+    Drop the currencies cached for the current request once a currency or
+    a dated rate changes, so the rest of the response shows the new values.
+    """
+    clear_currency_context()
+
+
+@receiver(post_save, sender=DatedConversionRate)
+@receiver(post_delete, sender=DatedConversionRate)
+def refresh_conversion_rate_index(sender, instance, **kwargs):
+    """Make every process reload the company's dated rates after a change"""
+    company_id = instance.company_id
+    bump_conversion_rate_version(company_id)
+    # Again once committed, for processes that reloaded before the commit
+    transaction.on_commit(lambda: bump_conversion_rate_version(company_id))
+
+
+@receiver(post_save, sender=FieldPermission)
+@receiver(post_delete, sender=FieldPermission)
+def refresh_field_permissions(sender, instance, **kwargs):
+    """Invalidate the cached field permission matrices after a change"""
+    bump_field_permission_version()
+    # Again once committed, for requests that cached the old rows meanwhile
+    transaction.on_commit(bump_field_permission_version)
+
+
+def refresh_user_permissions(user_ids):
+    """Reload the permission sets of the users, now and once committed"""
+    user_ids = list(user_ids)
+    bump_user_permission_version(user_ids)
+    transaction.on_commit(lambda: bump_user_permission_version(user_ids))
+
+
+def refresh_all_permissions():
+    """Reload every permission set, now and once committed"""
+    bump_permission_version()
+    transaction.on_commit(bump_permission_version)
+
+
+@receiver(post_save, sender=HorillaUser)
+@receiver(post_delete, sender=HorillaUser)
+def refresh_permissions_on_user_change(sender, instance, **kwargs):
+    """A changed role, superuser or active flag changes the permission set"""
+    update_fields = kwargs.get("update_fields")
+    if update_fields and set(update_fields) <= {"last_login"}:
+        return
+    refresh_user_permissions([instance.pk])
+
+
+@receiver(m2m_changed, sender=HorillaUser.user_permissions.through)
+@receiver(m2m_changed, sender=HorillaUser.groups.through)
+def refresh_permissions_on_user_m2m_change(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    """Reload the users whose direct permissions or groups changed"""
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        refresh_user_permissions([instance.pk])
+    elif pk_set:
+        refresh_user_permissions(pk_set)
+    elif action == "post_clear":
+        refresh_all_permissions()
+
+
+@receiver(m2m_changed, sender=Role.permissions.through)
+def refresh_permissions_on_role_change(sender, instance, action, reverse, **kwargs):
+    """Reload the members of a role whose permissions changed"""
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        refresh_all_permissions()
+    else:
+        refresh_user_permissions(instance.users.values_list("pk", flat=True))
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+@receiver(post_delete, sender=Role)
+def refresh_permissions_on_group_change(sender, **kwargs):
+    """Group permissions and deleted permissions touch any number of users"""
+    action = kwargs.get("action")
+    if action and action not in ("post_add", "post_remove", "post_clear"):
+        return
+    refresh_all_permissions()
+
+
 def add_custom_permissions(sender, **kwargs):
     """
     Add custom permissions ('can_import' and 'view_own') for models
@@ -148,6 +274,7 @@ def add_custom_permissions(sender, **kwargs):
 
 
 post_migrate.connect(add_custom_permissions)
+post_migrate.connect(clear_indexed_columns)
 
 
 def get_score_field(model):
@@ -267,7 +394,7 @@ def update_all_scores_for_module(module):
 
         with transaction.atomic():
             try:
-                Model.objects.update(**{score_field: 0})
+                Model.objects.update(**{score_field: 0}, **get_updated_at_stamp(Model))
                 logger.info(
                     f"Reset {score_field} to 0 for all {Model._meta.model_name} instances"
                 )
@@ -311,6 +438,30 @@ def update_all_scores_for_module(module):
                         raise
 
 
+def get_score_expression(Model):
+    """
+    Expression computing the score field of a model's rows in the database,
+    the points of every active scoring criterion whose conditions a row
+    matches, for rows written without save() and its pre_save receivers.
+    Returns None for models without a score field.
+    """
+    if not get_score_field(Model):
+        return None
+
+    score = Value(0)
+    rules = ScoringRule.objects.filter(module=Model._meta.model_name, is_active=True)
+    for rule in rules:
+        for criterion in rule.criteria.all().order_by("order"):
+            query = build_query_from_conditions(criterion, Model)
+            if not query:
+                continue
+            points = criterion.points
+            if criterion.operation_type == "sub":
+                points = -points
+            score = score + Case(When(query, then=Value(points)), default=Value(0))
+    return ExpressionWrapper(score, output_field=IntegerField())
+
+
 @receiver(post_save, sender=ScoringRule)
 @receiver(pre_delete, sender=ScoringRule)
 def handle_rule_change(sender, instance, **kwargs):
@@ -3,13 +3,14 @@ import io
 import logging
 import zipfile
 from datetime import datetime, timedelta
+from decimal import Decimal
 from io import BytesIO
 
 from celery import shared_task
 from django.apps import apps
 from django.conf import settings
 from django.core.mail import EmailMessage, get_connection
-from django.db import models
+from django.db import connection, transaction
 from django.utils import timezone
 from django.utils.translation import gettext as _
 from openpyxl import Workbook
@@ -22,139 +23,64 @@ from genie_utils.middlewares import _thread_local
 
 logger = logging.getLogger(__name__)
 
+SCHEDULED_EXPORT_BATCH_SIZE = getattr(settings, "SCHEDULED_EXPORT_BATCH_SIZE", 500)
 
-@shared_task
-def process_scheduled_exports():
+
+def claim_due_exports(today=None, limit=SCHEDULED_EXPORT_BATCH_SIZE):
     """
-    Main task to process all due scheduled exports.
-    This should be run periodically (e.g., every hour or every 15 minutes).
+    Claim up to ``limit`` export schedules due today and return their ids.
+    Claiming moves next_run_at on to the following occurrence, so a schedule
+    runs at most once per occurrence even if its export fails. PostgreSQL
+    claims the batch with SELECT ... FOR UPDATE SKIP LOCKED; other databases
+    advance each row with a conditional update that only one worker can win.
     """
     from .models import ExportSchedule
 
-    now = timezone.now()
-    current_date = now.date()
-    current_weekday = now.strftime("%A").lower()
-
-    logger.info(f"=== process_scheduled_exports running at {now} ===")
-    logger.info(f"Current: date={current_date}, weekday={current_weekday}")
-
-    # Get all active schedules
-    schedules = ExportSchedule.objects.filter(start_date__lte=current_date).filter(
-        models.Q(end_date__isnull=True) | models.Q(end_date__gte=current_date)
+    today = today or timezone.now().date()
+    due_schedules = ExportSchedule.objects.filter(next_run_at__lte=today).order_by(
+        "next_run_at"
     )
 
-    logger.info(f"Found {schedules.count()} active schedules")
-
-    for schedule in schedules:
-        try:
-            logger.info(
-                f"Checking schedule {schedule.id}: frequency={schedule.frequency}, last_run={schedule.last_run}"
-            )
-            if should_run_schedule(schedule, current_date, current_weekday):
-                logger.info(
-                    f"✓ Schedule {schedule.id} should run - triggering execute_scheduled_export"
+    def following_run(schedule):
+        schedule.last_run = today
+        return schedule.compute_next_run_at(today)
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            schedules = list(due_schedules.select_for_update(skip_locked=True)[:limit])
+            claims = {}
+            for schedule in schedules:
+                claims.setdefault(following_run(schedule), []).append(schedule.pk)
+            for next_run_at, schedule_ids in claims.items():
+                ExportSchedule.objects.filter(pk__in=schedule_ids).update(
+                    next_run_at=next_run_at
                 )
-                execute_scheduled_export.delay(schedule.id)
-            else:
-                logger.info(f"✗ Schedule {schedule.id} should NOT run yet")
-        except Exception as e:
-            logger.error(f"Error checking schedule {schedule.id}: {str(e)}")
-            logger.exception(e)
-
-    return f"Processed {schedules.count()} schedules"
-
-
-def should_run_schedule(schedule, current_date, current_weekday):
-    """
-    Determine if a schedule should run based on frequency and last_run date.
-    Ensures the schedule only runs once per frequency period.
-    """
-    last_run = schedule.last_run
-
-    if last_run is None:
-        logger.info(f"  Schedule has never run before")
-        return check_frequency_match(schedule, current_date, current_weekday)
-
-    days_since_last_run = (current_date - last_run).days
-    logger.info(f"  Days since last run: {days_since_last_run}")
-
-    if schedule.frequency == "daily":
-        should_run = days_since_last_run >= 1
-        logger.info(
-            f"  Daily schedule: days_since_last_run={days_since_last_run}, should_run={should_run}"
-        )
-        return should_run and check_frequency_match(
-            schedule, current_date, current_weekday
-        )
-
-    elif schedule.frequency == "weekly":
-        should_run = days_since_last_run >= 7 and current_weekday == schedule.weekday
-        logger.info(
-            f"  Weekly schedule: days_since_last_run={days_since_last_run}, weekday_match={current_weekday == schedule.weekday}, should_run={should_run}"
-        )
-        return should_run
-
-    elif schedule.frequency == "monthly":
-        month_changed = current_date.year > last_run.year or (
-            current_date.year == last_run.year and current_date.month > last_run.month
-        )
-        day_matches = current_date.day == schedule.day_of_month
-        should_run = month_changed and day_matches
-        logger.info(
-            f"  Monthly schedule: month_changed={month_changed}, day_matches={day_matches}, should_run={should_run}"
-        )
-        return should_run
+        return [schedule.pk for schedule in schedules]
 
-    elif schedule.frequency == "yearly":
-        year_changed = current_date.year > last_run.year
-        date_matches = (
-            current_date.day == schedule.yearly_day_of_month
-            and current_date.month == schedule.yearly_month
-        )
-        should_run = year_changed and date_matches
-        logger.info(
-            f"  Yearly schedule: year_changed={year_changed}, date_matches={date_matches}, should_run={should_run}"
-        )
-        return should_run
+    claimed = []
+    with transaction.atomic():
+        for schedule in due_schedules[:limit]:
+            if ExportSchedule.objects.filter(
+                pk=schedule.pk, next_run_at=schedule.next_run_at
+            ).update(next_run_at=following_run(schedule)):
+                claimed.append(schedule.pk)
+    return claimed
 
-    logger.info(f"  ✗ Unknown frequency: {schedule.frequency}")
-    return False
 
-
-def check_frequency_match(schedule, current_date, current_weekday):
+@shared_task
+def process_scheduled_exports():
     """
-    Check if the current date matches the schedule's frequency requirements.
-    Used for first-time runs.
+    Periodic task to claim the export schedules due today and queue them.
+    Only due rows are read, through the next_run_at index.
     """
-    if schedule.frequency == "daily":
-        logger.info(f"  ✓ Daily schedule - will run")
-        return True
+    schedule_ids = claim_due_exports()
 
-    elif schedule.frequency == "weekly":
-        match = current_weekday == schedule.weekday
-        logger.info(
-            f"  Weekly: current={current_weekday}, required={schedule.weekday}, match={match}"
-        )
-        return match
+    for schedule_id in schedule_ids:
+        execute_scheduled_export.delay(schedule_id)
 
-    elif schedule.frequency == "monthly":
-        match = current_date.day == schedule.day_of_month
-        logger.info(
-            f"  Monthly: current_day={current_date.day}, required={schedule.day_of_month}, match={match}"
-        )
-        return match
-
-    elif schedule.frequency == "yearly":
-        match = (
-            current_date.day == schedule.yearly_day_of_month
-            and current_date.month == schedule.yearly_month
-        )
-        logger.info(
-            f"  Yearly: current={current_date.month}/{current_date.day}, required={schedule.yearly_month}/{schedule.yearly_day_of_month}, match={match}"
-        )
-        return match
-
-    return False
+    if schedule_ids:
+        logger.info(f"Queued {len(schedule_ids)} scheduled exports")
+    return f"Queued {len(schedule_ids)} schedules"
 
 
 @shared_task
@@ -594,3 +520,33 @@ def cleanup_old_schedules():
 
     logger.info(f"Cleaned up {deleted_count} expired schedules")
     return f"Deleted {deleted_count} expired schedules"
+
+
+@shared_task(bind=True)
+def convert_currency_amounts(self, model_label, filters, fields, conversion_rate):
+    """
+    Convert the money fields of a large table after a currency change, one
+    pk range per UPDATE, reporting the rows converted so far as progress.
+    """
+    from .currency import CURRENCY_CONVERSION_CHUNK_SIZE, convert_amounts
+
+    model = apps.get_model(model_label)
+
+    def report(converted, total):
+        logger.info(
+            f"Converted {converted} of {total} {model_label} rows to the new currency"
+        )
+        if self.request.id and not self.request.is_eager:
+            self.update_state(
+                state="PROGRESS",
+                meta={"model": model_label, "converted": converted, "total": total},
+            )
+
+    converted = convert_amounts(
+        model._base_manager.filter(**filters),
+        fields,
+        Decimal(conversion_rate),
+        chunk_size=CURRENCY_CONVERSION_CHUNK_SIZE,
+        progress=report,
+    )
+    return {"model": model_label, "converted": converted}
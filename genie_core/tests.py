@@ -1,3 +1,598 @@
-from django.test import TestCase
+"""
+Tests for horilla_core
+"""
 
-# Create your core tests here.
+import datetime
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import Permission
+from django.contrib.auth.signals import user_logged_in
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from login_history.models import post_login
+
+from genie_core import scheduler as core_scheduler
+from genie_core.conversion_rates import bump_conversion_rate_version
+from genie_core.models import (
+    Company,
+    DatedConversionRate,
+    ExportSchedule,
+    HorillaUser,
+    MultipleCurrency,
+    RecycleBin,
+    RecycleBinPolicy,
+    Role,
+)
+from genie_core.scheduler import SchedulerLeaderLock
+from genie_core.tasks import process_scheduled_exports
+
+
+def legacy_should_run(schedule, day):
+    """Whether the former every-row tick ran a schedule on a day"""
+    weekday_matches = day.strftime("%A").lower() == schedule.weekday
+    day_matches = day.day == schedule.day_of_month
+    date_matches = (
+        day.day == schedule.yearly_day_of_month and day.month == schedule.yearly_month
+    )
+    last_run = schedule.last_run
+
+    if schedule.frequency == "daily":
+        return last_run is None or (day - last_run).days >= 1
+    if schedule.frequency == "weekly":
+        return weekday_matches and (last_run is None or (day - last_run).days >= 7)
+    if schedule.frequency == "monthly":
+        return day_matches and (
+            last_run is None or (day.year, day.month) > (last_run.year, last_run.month)
+        )
+    if schedule.frequency == "yearly":
+        return date_matches and (last_run is None or day.year > last_run.year)
+    return False
+
+
+class ExportScheduleDispatchTests(TestCase):
+    """Test that due export schedules are found by index and run once"""
+
+    def setUp(self):
+        """Set up the owner of the schedules"""
+        self.user = HorillaUser.objects.create_user(
+            username="exporter", email="exporter@example.com", password="password123"
+        )
+        self.today = datetime.date.today()
+
+    def test_next_run_at_follows_schedule_rules(self):
+        """Test next_run_at fires on exactly the days the schedule rules allow"""
+        start = datetime.date(2024, 1, 1)
+        schedules = [
+            ExportSchedule(frequency="daily", start_date=start),
+            ExportSchedule(frequency="weekly", weekday="wednesday", start_date=start),
+            ExportSchedule(frequency="monthly", day_of_month=31, start_date=start),
+            ExportSchedule(
+                frequency="yearly",
+                yearly_day_of_month=29,
+                yearly_month=2,
+                start_date=start,
+            ),
+            ExportSchedule(
+                frequency="daily",
+                start_date=datetime.date(2024, 3, 10),
+                end_date=datetime.date(2024, 4, 2),
+            ),
+        ]
+        for schedule in schedules:
+            schedule.next_run_at = schedule.compute_next_run_at(start)
+            for offset in range(3 * 366):
+                day = start + datetime.timedelta(days=offset)
+                expected = (
+                    day >= schedule.start_date
+                    and (not schedule.end_date or day <= schedule.end_date)
+                    and legacy_should_run(schedule, day)
+                )
+                due = schedule.next_run_at is not None and schedule.next_run_at <= day
+                self.assertEqual(due, expected, f"{schedule.frequency} {day}")
+                if due:
+                    schedule.last_run = day
+                    schedule.next_run_at = schedule.compute_next_run_at(day)
+
+    def test_save_recomputes_next_run_at(self):
+        """Test recording a run moves next_run_at to the next occurrence"""
+        schedule = ExportSchedule.objects.create(
+            user=self.user,
+            modules=["Lead"],
+            export_format="csv",
+            frequency="daily",
+            start_date=self.today,
+        )
+        self.assertEqual(schedule.next_run_at, self.today)
+
+        schedule.last_run = self.today
+        schedule.save(update_fields=["last_run"])
+        schedule.refresh_from_db()
+        self.assertEqual(schedule.next_run_at, self.today + datetime.timedelta(days=1))
+
+    def test_tick_reads_only_due_schedules_once(self):
+        """Test a tick over 600 schedules is one indexed query and never repeats"""
+        self.assert_tick_reads_only_due_schedules(600, due=30)
+
+    @tag("benchmark")
+    def test_tick_reads_only_due_schedules_once_at_scale(self):
+        """Test a tick over 100k schedules is one indexed query and never repeats"""
+        self.assert_tick_reads_only_due_schedules(100000, due=300)
+
+    def assert_tick_reads_only_due_schedules(self, count, due):
+        """Tick twice over ``count`` daily schedules, ``due`` of them due today"""
+        tomorrow = self.today + datetime.timedelta(days=1)
+        ExportSchedule.objects.bulk_create(
+            [
+                ExportSchedule(
+                    user=self.user,
+                    modules=["Lead"],
+                    export_format="csv",
+                    frequency="daily",
+                    start_date=self.today,
+                    next_run_at=self.today if index < due else tomorrow,
+                )
+                for index in range(count)
+            ],
+            batch_size=5000,
+        )
+
+        with mock.patch(
+            "genie_core.tasks.execute_scheduled_export.delay"
+        ) as delay, CaptureQueriesContext(connection) as ctx:
+            process_scheduled_exports()
+        selects = [
+            query["sql"]
+            for query in ctx.captured_queries
+            if query["sql"].startswith("SELECT")
+        ]
+
+        self.assertEqual(len(selects), 1)
+        self.assertIn("next_run_at", selects[0])
+        queued = [call.args[0] for call in delay.call_args_list]
+        self.assertEqual(len(queued), due)
+        self.assertEqual(len(set(queued)), due)
+
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {selects[0]}")
+                plan = " ".join(str(row) for row in cursor.fetchall())
+            self.assertIn("next_run_at", plan)
+            self.assertNotIn("SCAN", plan.replace("USING INDEX", ""))
+
+        with mock.patch("genie_core.tasks.execute_scheduled_export.delay") as delay:
+            process_scheduled_exports()
+        delay.assert_not_called()
+        self.assertEqual(
+            ExportSchedule.objects.filter(next_run_at=tomorrow).count(), count
+        )
+
+
+def record_run(output):
+    """Scheduled job of the leader election test, logging the running process"""
+    with open(output, "a") as f:
+        f.write(f"{os.getpid()}\n")
+
+
+def run_scheduler_process(lock_file, output, deadline):
+    """Run the scheduler in a forked process until a deadline, like a web worker"""
+    core_scheduler.leader_lock = SchedulerLeaderLock(lock_file=lock_file)
+    core_scheduler.SCHEDULER_LEADER_RETRY_INTERVAL = 0.05
+    core_scheduler.register_job(
+        record_run, "interval", seconds=0.1, id="record_run", args=[output]
+    )
+    core_scheduler.start_scheduler()
+    time.sleep(max(0, deadline - time.time()))
+    core_scheduler.stop_scheduler()
+
+
+class SchedulerLeaderTests(TestCase):
+    """Test that scheduled jobs run in a single process"""
+
+    def setUp(self):
+        """Set up a lock file and a job log for the processes to share"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.lock_file = os.path.join(directory.name, "scheduler.lock")
+        self.output = os.path.join(directory.name, "runs.log")
+
+    def start_processes(self, durations):
+        """Fork one scheduler process per duration and wait for them all"""
+        context = multiprocessing.get_context("fork")
+        # Deadlines rather than durations, so processes forked late do not
+        # outlive the leader and take over at the end of the test
+        start = time.time()
+        processes = [
+            context.Process(
+                target=run_scheduler_process,
+                args=(self.lock_file, self.output, start + seconds),
+            )
+            for seconds in durations
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(30)
+            self.assertEqual(process.exitcode, 0)
+        with open(self.output) as f:
+            return [int(pid) for pid in f.read().split()]
+
+    def test_jobs_run_in_one_process(self):
+        """Test four worker processes run each tick of a job exactly once"""
+        runs = self.start_processes([1.5] * 4)
+
+        self.assertGreater(len(runs), 5)
+        self.assertEqual(len(set(runs)), 1)
+
+    def test_standby_process_takes_over(self):
+        """Test a standby process runs the jobs once the leader stops"""
+        runs = self.start_processes([0.6, 2])
+
+        leaders = list(dict.fromkeys(runs))
+        self.assertEqual(len(leaders), 2)
+        # Never both at once: the first leader's runs all come first
+        self.assertEqual(runs, sorted(runs, key=leaders.index))
+
+    def test_lock_is_exclusive_until_released(self):
+        """Test a second lock holder is refused until the first releases"""
+        first = SchedulerLeaderLock(lock_file=self.lock_file)
+        second = SchedulerLeaderLock(lock_file=self.lock_file)
+        self.addCleanup(first.release)
+        self.addCleanup(second.release)
+
+        self.assertTrue(first.acquire())
+        self.assertFalse(second.acquire())
+        first.release()
+        self.assertTrue(second.acquire())
+
+    def test_web_processes_start_the_scheduler_only_when_enabled(self):
+        """Test app loading starts the scheduler only with SCHEDULER_AUTOSTART"""
+        with mock.patch.object(
+            core_scheduler.threading, "Thread"
+        ) as thread, mock.patch.object(
+            core_scheduler.sys, "argv", ["gunicorn", "genie.wsgi"]
+        ):
+            with self.settings(SCHEDULER_AUTOSTART=False):
+                core_scheduler.autostart_scheduler()
+            thread.assert_not_called()
+
+            with self.settings(SCHEDULER_AUTOSTART=True):
+                core_scheduler.autostart_scheduler()
+            thread.assert_called_once_with(
+                target=core_scheduler.start_scheduler, daemon=True
+            )
+
+
+class RecycleBinPurgeTests(TestCase):
+    """Test that expired recycle bin records are purged in short batches"""
+
+    def setUp(self):
+        """Set up a company with a 30 day retention policy"""
+        self.company = Company.objects.bulk_create(
+            [
+                Company(
+                    name="Acme",
+                    email="acme@example.com",
+                    contact_number="123",
+                    no_of_employees=10,
+                    city="Kochi",
+                    state="Kerala",
+                    country="IN",
+                    zip_code="682001",
+                )
+            ]
+        )[0]
+        RecycleBinPolicy.objects.bulk_create(
+            [RecycleBinPolicy(company=self.company, retention_days=30)]
+        )
+        self.now = timezone.now()
+
+    def insert_records(self, count, age_days, company=None):
+        """Insert synthetic recycle bin rows deleted ``age_days`` ago"""
+        deleted_at = connection.ops.adapt_datetimefield_value(
+            self.now - datetime.timedelta(days=age_days)
+        )
+        company_id = (company or self.company).pk
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {RecycleBin._meta.db_table} "
+                "(model_name, record_id, data, deleted_at, company_id) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                [
+                    ("leads.lead", str(index), "{}", deleted_at, company_id)
+                    for index in range(count)
+                ],
+            )
+
+    def test_purges_expired_rows_in_batches(self):
+        """Test expired rows go in LIMIT bounded DELETEs, keeping recent ones"""
+        self.insert_records(5000, age_days=40)
+        self.insert_records(500, age_days=5)
+
+        with CaptureQueriesContext(connection) as ctx:
+            metrics = core_scheduler.clear_expired_recyclebin(
+                now=self.now, batch_size=1000
+            )
+
+        deletes = [
+            query["sql"]
+            for query in ctx.captured_queries
+            if query["sql"].startswith("DELETE")
+        ]
+        self.assertEqual(metrics["deleted"], 5000)
+        self.assertEqual(metrics["batches"], 6)
+        self.assertTrue(metrics["complete"])
+        self.assertEqual(RecycleBin.objects.count(), 500)
+        self.assertEqual(len(deletes), 6)
+        self.assertTrue(all("LIMIT 1000" in sql for sql in deletes))
+
+    @tag("benchmark")
+    def test_purges_a_million_rows_in_short_batches(self):
+        """Test 1M expired rows go in short DELETEs, keeping recent ones"""
+        self.insert_records(1000000, age_days=40)
+        self.insert_records(500, age_days=5)
+        deletes = []
+
+        def time_deletes(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                if sql.startswith("DELETE"):
+                    deletes.append((sql, time.perf_counter() - start))
+
+        with connection.execute_wrapper(time_deletes):
+            metrics = core_scheduler.clear_expired_recyclebin(
+                now=self.now, batch_size=20000
+            )
+
+        self.assertEqual(metrics["deleted"], 1000000)
+        self.assertEqual(metrics["batches"], 51)
+        self.assertTrue(metrics["complete"])
+        self.assertEqual(RecycleBin.objects.count(), 500)
+        self.assertEqual(len(deletes), 51)
+        self.assertTrue(all("LIMIT 20000" in sql for sql, _ in deletes))
+        self.assertLess(max(seconds for _, seconds in deletes), 2)
+
+    def test_time_budget_leaves_the_rest_for_the_next_run(self):
+        """Test a spent time budget stops the purge and a later run finishes it"""
+        self.insert_records(300, age_days=40)
+        ticks = iter([0, 0, 0, 100, 100, 100])
+
+        with mock.patch.object(core_scheduler.time, "monotonic", lambda: next(ticks)):
+            metrics = core_scheduler.clear_expired_recyclebin(
+                now=self.now, batch_size=100, time_budget=50
+            )
+        self.assertEqual((metrics["deleted"], metrics["complete"]), (200, False))
+
+        metrics = core_scheduler.clear_expired_recyclebin(now=self.now, batch_size=100)
+        self.assertEqual((metrics["deleted"], metrics["complete"]), (100, True))
+        self.assertEqual(RecycleBin.objects.count(), 0)
+
+
+class ConversionRateIndexTests(TestCase):
+    """Test dated conversion rates are looked up from the in-memory index"""
+
+    def setUp(self):
+        """Set up a EUR currency with a monthly dated rate over three years"""
+        cache.clear()
+        self.company = Company.objects.bulk_create(
+            [
+                Company(
+                    name="Acme",
+                    email="acme@example.com",
+                    contact_number="123",
+                    no_of_employees=10,
+                    city="Kochi",
+                    state="Kerala",
+                    country="IN",
+                    zip_code="682001",
+                )
+            ]
+        )[0]
+        self.currency = MultipleCurrency.objects.bulk_create(
+            [
+                MultipleCurrency(
+                    company=self.company,
+                    currency="EUR",
+                    conversion_rate=Decimal("0.5"),
+                )
+            ]
+        )[0]
+        self.start = datetime.date(2023, 1, 1)
+        DatedConversionRate.objects.bulk_create(
+            [
+                DatedConversionRate(
+                    company=self.company,
+                    currency=self.currency,
+                    conversion_rate=Decimal("0.8") + Decimal(month) / 1000,
+                    start_date=datetime.date(2023 + month // 12, month % 12 + 1, 1),
+                )
+                for month in range(36)
+            ]
+        )
+        bump_conversion_rate_version(self.company.pk)
+
+    def query_rate(self, conversion_date):
+        """The rate on a date as the per-call query found it"""
+        dated_rate = (
+            DatedConversionRate.objects.filter(
+                company=self.company,
+                currency=self.currency,
+                start_date__lte=conversion_date,
+            )
+            .order_by("-start_date")
+            .first()
+        )
+        return (
+            dated_rate.conversion_rate if dated_rate else self.currency.conversion_rate
+        )
+
+    def test_index_matches_rate_query(self):
+        """Test every date gets the rate the query found, with one query in all"""
+        dates = [
+            self.start + datetime.timedelta(days=offset) for offset in range(-40, 1150)
+        ]
+        expected = [self.query_rate(day) for day in dates]
+
+        with CaptureQueriesContext(connection) as ctx:
+            rates = [self.currency.get_conversion_rate_for_date(day) for day in dates]
+
+        self.assertEqual(rates, expected)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(rates[0], Decimal("0.5"))
+
+    def test_rate_changes_rebuild_the_index(self):
+        """Test a saved or deleted dated rate is seen by the next lookup"""
+        day = datetime.date(2024, 6, 15)
+        self.assertEqual(
+            self.currency.get_conversion_rate_for_date(day), Decimal("0.817")
+        )
+
+        rate = DatedConversionRate.objects.create(
+            company=self.company,
+            currency=self.currency,
+            conversion_rate=Decimal("1.25"),
+            start_date=datetime.date(2024, 6, 10),
+        )
+        self.assertEqual(
+            self.currency.get_conversion_rate_for_date(day), Decimal("1.25")
+        )
+
+        rate.delete()
+        self.assertEqual(
+            self.currency.get_conversion_rate_for_date(day), Decimal("0.817")
+        )
+
+    def test_convert_many_matches_single_conversion(self):
+        """Test amounts convert in one query with the single conversion results"""
+        rng = random.Random(42)
+        amounts = [Decimal(rng.randint(0, 10**9)) / 100 for _ in range(2000)]
+        dates = [
+            self.start + datetime.timedelta(days=rng.randint(-30, 1100))
+            for _ in range(2000)
+        ]
+
+        with CaptureQueriesContext(connection) as ctx:
+            converted = self.currency.convert_many(amounts, dates)
+
+        self.assertLessEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(
+            converted,
+            [amount * self.query_rate(day) for amount, day in zip(amounts, dates)],
+        )
+        self.assertEqual(
+            self.currency.convert_many([None, 10], [dates[0], None]),
+            [Decimal("0"), self.currency.convert_from_default(10)],
+        )
+
+    @tag("benchmark")
+    def test_convert_many_million_amounts(self):
+        """Test 1M amounts convert in one pass with the single conversion results"""
+        rng = random.Random(42)
+        amounts = [Decimal(rng.randint(0, 10**9)) / 100 for _ in range(1000000)]
+        dates = [
+            self.start + datetime.timedelta(days=rng.randint(-30, 1100))
+            for _ in range(1000000)
+        ]
+
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            converted = self.currency.convert_many(amounts, dates)
+            elapsed = time.perf_counter() - start
+
+        self.assertEqual(len(converted), 1000000)
+        self.assertLessEqual(len(ctx.captured_queries), 1)
+        self.assertLess(elapsed, 10)
+        for position in rng.sample(range(1000000), 500):
+            self.assertEqual(
+                converted[position],
+                amounts[position] * self.query_rate(dates[position]),
+            )
+        self.assertEqual(
+            self.currency.convert_many([None, 10], [dates[0], None]),
+            [Decimal("0"), self.currency.convert_from_default(10)],
+        )
+
+
+class PermissionCacheTests(TestCase):
+    """Test permission sets are served from the shared cache once warm"""
+
+    def setUp(self):
+        """Set up a role member allowed to view opportunities"""
+        cache.clear()
+        self.role = Role.objects.create(role_name="Sales")
+        self.user = HorillaUser.objects.create_user(
+            username="member",
+            email="member@example.com",
+            password="password123",
+            role=self.role,
+        )
+        self.user.user_permissions.add(
+            Permission.objects.get(
+                codename="view_opportunity", content_type__app_label="opportunities"
+            )
+        )
+
+        user_logged_in.disconnect(post_login)
+        self.addCleanup(user_logged_in.connect, post_login)
+        self.client.force_login(self.user)
+
+    def fresh_user(self):
+        """The user as a new request loads it, without a permission cache"""
+        return HorillaUser.objects.get(pk=self.user.pk)
+
+    def get_list(self):
+        """Render a list page and return its permission set queries"""
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(
+                reverse("opportunities:opportunities_list"), HTTP_HX_REQUEST="true"
+            )
+        self.assertEqual(response.status_code, 200)
+        return [
+            query["sql"]
+            for query in ctx.captured_queries
+            if f'"{Permission._meta.db_table}"' in query["sql"]
+        ]
+
+    def test_warm_requests_load_no_permission_sets(self):
+        """Test only the first request loads the permission set"""
+        self.assertGreater(len(self.get_list()), 0)
+        self.assertEqual(self.get_list(), [])
+
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm("opportunities.view_opportunity"))
+            self.assertFalse(user.has_perm("opportunities.delete_opportunity"))
+
+    def test_permission_changes_reload_the_set(self):
+        """Test user, role and group changes are seen by the next check"""
+        perm = "opportunities.delete_opportunity"
+        delete = Permission.objects.get(
+            codename="delete_opportunity", content_type__app_label="opportunities"
+        )
+        self.assertFalse(self.fresh_user().has_perm(perm))
+
+        self.user.user_permissions.add(delete)
+        self.assertTrue(self.fresh_user().has_perm(perm))
+
+        delete.user_set.remove(self.user)
+        self.assertFalse(self.fresh_user().has_perm(perm))
+
+        group = self.user.groups.create(name="Managers")
+        self.assertFalse(self.fresh_user().has_perm(perm))
+        group.permissions.add(delete)
+        self.assertTrue(self.fresh_user().has_perm(perm))
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(self.fresh_user().has_perm(perm))
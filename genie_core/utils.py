@@ -1,11 +1,16 @@
 import json
 import logging
+from datetime import date
+from decimal import Decimal
 
 from dateutil.parser import parse
 from django.apps import apps
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.db import models, transaction
-from django.db.models import QuerySet
+from django.db.models import F, Q, QuerySet
+from django.utils import timezone
 
 from genie_core.models import (
     FieldPermission,
@@ -13,9 +18,15 @@ from genie_core.models import (
     RecycleBin,
     ScoringRule,
 )
+from genie_utils.middlewares import _thread_local
 
 logger = logging.getLogger(__name__)
 
+# Seconds a user's field permission matrix of a model stays cached
+FIELD_PERMISSION_CACHE_TIMEOUT = getattr(
+    settings, "FIELD_PERMISSION_CACHE_TIMEOUT", 3600
+)
+
 
 def restore_recycle_bin_records(request, recycle_objs):
     """
@@ -309,6 +320,98 @@ def compute_score(instance):
     return score
 
 
+class CurrencyContext:
+    """
+    Currencies used to display money values to one user, loaded once: the
+    default currency of each company, the user's currency and its rate for
+    today. ``get_currency_context`` keeps one per request so rendering a
+    list costs the same few queries however many money cells it has.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.default_currencies = {}
+        self.conversion_rates = {}
+        self._user_currency = None
+        self._user_currency_loaded = False
+
+    def get_default_currency(self, company):
+        """Default currency of a company, cached by company id"""
+        key = getattr(company, "pk", company)
+        if key not in self.default_currencies:
+            self.default_currencies[key] = MultipleCurrency.get_default_currency(
+                company
+            )
+        return self.default_currencies[key]
+
+    @property
+    def user_currency(self):
+        """The user's preferred currency, or their company's default"""
+        if not self._user_currency_loaded:
+            user = self.user
+            if not user or not user.is_authenticated:
+                currency = None
+            elif getattr(user, "currency", None):
+                currency = user.currency
+            else:
+                currency = self.get_default_currency(getattr(user, "company", None))
+            self._user_currency = currency
+            self._user_currency_loaded = True
+        return self._user_currency
+
+    def get_conversion_rate(self, currency, conversion_date=None):
+        """Rate of a currency on a date (default today), cached per date"""
+        key = (currency.pk, conversion_date or date.today())
+        if key not in self.conversion_rates:
+            self.conversion_rates[key] = currency.get_conversion_rate_for_date(key[1])
+        return self.conversion_rates[key]
+
+    def display_value(self, value, company):
+        """
+        Format an amount stored in the company's default currency, adding
+        the amount in the user's currency when it differs.
+        """
+        default_currency = self.get_default_currency(company)
+        if not default_currency:
+            return str(value)
+
+        user_currency = self.user_currency
+        if not user_currency or user_currency.pk == default_currency.pk:
+            return default_currency.display_with_symbol(value)
+
+        rate = self.get_conversion_rate(user_currency)
+        converted_amount = Decimal(str(value)) * rate
+        user_display = user_currency.display_with_symbol(converted_amount)
+        default_display = default_currency.display_with_symbol(value)
+
+        return f"{default_display} ({user_display})"
+
+
+def get_currency_context(user):
+    """
+    Return the currency context of the user for the current request,
+    creating it on first use. Outside a request a fresh context is returned.
+    """
+    request = getattr(_thread_local, "request", None)
+    if request is None:
+        return CurrencyContext(user)
+
+    context = getattr(request, "_currency_context", None)
+    if context is None or getattr(context.user, "pk", None) != getattr(
+        user, "pk", None
+    ):
+        context = CurrencyContext(user)
+        request._currency_context = context
+    return context
+
+
+def clear_currency_context():
+    """Drop the current request's currency context after currencies change"""
+    request = getattr(_thread_local, "request", None)
+    if request is not None and hasattr(request, "_currency_context"):
+        del request._currency_context
+
+
 def get_currency_display_value(obj, field_name, user):
     """
     Generic helper to format currency fields with user's preferred currency
@@ -326,29 +429,84 @@ def get_currency_display_value(obj, field_name, user):
     if value is None or value == "":
         return ""
 
-    company = getattr(obj, "company", None)
+    # The id is enough to find the company's currency, without fetching it
+    company = getattr(obj, "company_id", None) or getattr(obj, "company", None)
     if not company and hasattr(user, "company"):
         company = user.company
 
     if not company:
         return str(value)
 
-    # Get currencies
-    default_currency = MultipleCurrency.get_default_currency(company)
-    user_currency = MultipleCurrency.get_user_currency(user)
+    return get_currency_context(user).display_value(value, company)
+
+
+def _field_permission_version_key():
+    return "field_permissions_version"
+
+
+def get_field_permission_version():
+    """Return the version stamp of the stored field permissions"""
+    version = cache.get(_field_permission_version_key())
+    if version is None:
+        version = 1
+        cache.add(_field_permission_version_key(), version, timeout=None)
+    return version
+
+
+def bump_field_permission_version():
+    """Invalidate every cached field permission matrix"""
+    key = _field_permission_version_key()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, get_field_permission_version() + 1, timeout=None)
+    request = getattr(_thread_local, "request", None)
+    if request is not None and hasattr(request, "_field_permissions"):
+        del request._field_permissions
 
-    if not default_currency:
-        return str(value)
 
-    # If user currency is same as default or not set, just show default
-    if not user_currency or user_currency.pk == default_currency.pk:
-        return default_currency.display_with_symbol(value)
+def load_field_permissions(user, model):
+    """
+    Return the {field_name: permission_type} matrix of a user on a model,
+    user permissions taking priority over those of the user's role.
 
-    converted_amount = user_currency.convert_from_default(value)
-    user_display = user_currency.display_with_symbol(converted_amount)
-    default_display = default_currency.display_with_symbol(value)
+    Both are fetched with one query, memoized on the current request and
+    cached across requests under the field permission version stamp.
+    """
+    content_type = ContentType.objects.get_for_model(model)
+    role_id = getattr(user, "role_id", None)
+    key = (user.pk, role_id, content_type.pk)
+
+    request = getattr(_thread_local, "request", None)
+    memo = None
+    if request is not None:
+        memo = request.__dict__.setdefault("_field_permissions", {})
+        if key in memo:
+            return memo[key]
+
+    cache_key = (
+        f"field_permissions_{get_field_permission_version()}_"
+        f"{user.pk}_{role_id}_{content_type.pk}"
+    )
+    permissions = cache.get(cache_key)
+    if permissions is None:
+        holders = Q(user=user)
+        if role_id:
+            holders |= Q(role_id=role_id)
+        permissions = {}
+        # Role permissions first, so the user's own override them
+        rows = (
+            FieldPermission.objects.filter(holders, content_type=content_type)
+            .order_by(F("user_id").asc(nulls_first=True))
+            .values_list("field_name", "permission_type")
+        )
+        for field_name, permission_type in rows:
+            permissions[field_name] = permission_type
+        cache.set(cache_key, permissions, FIELD_PERMISSION_CACHE_TIMEOUT)
 
-    return f"{default_display} ({user_display})"
+    if memo is not None:
+        memo[key] = permissions
+    return permissions
 
 
 def get_user_field_permission(user, model, field_name):
@@ -365,24 +523,7 @@ def get_user_field_permission(user, model, field_name):
     if user.is_superuser:
         return "readwrite"
 
-    content_type = ContentType.objects.get_for_model(model)
-
-    user_perm = FieldPermission.objects.filter(
-        user=user, content_type=content_type, field_name=field_name
-    ).first()
-
-    if user_perm:
-        return user_perm.permission_type
-
-    if hasattr(user, "role") and user.role:
-        role_perm = FieldPermission.objects.filter(
-            role=user.role, content_type=content_type, field_name=field_name
-        ).first()
-
-        if role_perm:
-            return role_perm.permission_type
-
-    return "readwrite"
+    return load_field_permissions(user, model).get(field_name, "readwrite")
 
 
 def get_field_permissions_for_model(user, model):
@@ -390,29 +531,14 @@ def get_field_permissions_for_model(user, model):
     Get all field permissions for a model for a specific user
     Returns a dictionary: {field_name: permission_type}
 
-    This is optimized to reduce database queries by fetching
-    all permissions at once instead of one by one.
+    Served from the field permission matrix of the user, see
+    load_field_permissions.
     """
 
     if user.is_superuser:
         return {}
 
-    content_type = ContentType.objects.get_for_model(model)
-    permissions_dict = {}
-
-    user_perms = FieldPermission.objects.filter(user=user, content_type=content_type)
-    for perm in user_perms:
-        permissions_dict[perm.field_name] = perm.permission_type
-
-    if hasattr(user, "role") and user.role:
-        role_perms = FieldPermission.objects.filter(
-            role=user.role, content_type=content_type
-        )
-        for perm in role_perms:
-            if perm.field_name not in permissions_dict:
-                permissions_dict[perm.field_name] = perm.permission_type
-
-    return permissions_dict
+    return dict(load_field_permissions(user, model))
 
 
 def filter_hidden_fields(user, model, fields_list):
@@ -473,3 +599,13 @@ def get_editable_fields(user, model, fields_list):
         for field_name in fields_list
         if field_permissions.get(field_name, "readwrite") == "readwrite"
     ]
+
+
+def get_updated_at_stamp(model):
+    """
+    Return the ``update()`` keyword arguments setting ``updated_at`` to now,
+    empty for models without it, so rows written in bulk show as changed.
+    """
+    if any(field.name == "updated_at" for field in model._meta.concrete_fields):
+        return {"updated_at": timezone.now()}
+    return {}
@@ -12,7 +12,11 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from genie_core.api.docs import BULK_DELETE_DOCS, BULK_UPDATE_DOCS, SEARCH_FILTER_DOCS
-from genie_core.api.mixins import BulkOperationsMixin, SearchFilterMixin
+from genie_core.api.mixins import (
+    BulkOperationsMixin,
+    ConditionalGetMixin,
+    SearchFilterMixin,
+)
 from genie_core.api.permissions import IsCompanyMember, IsOwnerOrAdmin
 from genie_crm.accounts.api.docs import (
     ACCOUNT_CHILD_ACCOUNTS_DOCS,
@@ -70,7 +74,12 @@ bulk_delete_body = openapi.Schema(
 )
 
 
-class AccountViewSet(SearchFilterMixin, BulkOperationsMixin, viewsets.ModelViewSet):
+class AccountViewSet(
+    ConditionalGetMixin,
+    SearchFilterMixin,
+    BulkOperationsMixin,
+    viewsets.ModelViewSet,
+):
     """ViewSet for Account model"""
 
     queryset = Account.objects.all()
@@ -1,6 +1,7 @@
 from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
 
+from genie_core.currency import convert_currency_fields
 from genie_core.models import HorillaUser
 from genie_core.signals import company_currency_changed
 from genie_crm.accounts.models import Account
@@ -31,25 +32,9 @@ def update_accounts_on_currency_change(sender, **kwargs):
     """
     Update Account currency fields (like annual_revenue) when a company's currency changes.
     """
-    company = kwargs.get("company")
-    conversion_rate = kwargs.get("conversion_rate")
-
-    accounts_to_update = []
-
-    # Assuming Account has a ForeignKey to company, else adjust filtering accordingly
-    accounts = Account.objects.filter(company=company).only("id", "annual_revenue")
-
-    for account in accounts:
-        needs_update = False
-
-        if account.annual_revenue is not None:
-            account.annual_revenue *= conversion_rate
-            needs_update = True
-
-        if needs_update:
-            accounts_to_update.append(account)
-
-    if accounts_to_update:
-        Account.objects.bulk_update(
-            accounts_to_update, ["annual_revenue"], batch_size=1000
-        )
+    convert_currency_fields(
+        Account,
+        {"company": kwargs.get("company")},
+        ["annual_revenue"],
+        kwargs.get("conversion_rate"),
+    )
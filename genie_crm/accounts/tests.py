@@ -1,3 +1,120 @@
+"""
+Tests for accounts
+"""
+
+from django.contrib.auth.models import Permission
+from django.contrib.auth.signals import user_logged_in
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from login_history.models import post_login
+
+from genie_core.models import FieldPermission, HorillaUser, Role
+from genie_core.utils import get_field_permissions_for_model, is_field_editable
+from genie_crm.accounts.models import Account
+
+
+class AccountFieldPermissionTests(TestCase):
+    """Test the details tab reads field permissions in one query"""
+
+    def setUp(self):
+        """Set up a role member with permissions on every account field"""
+        cache.clear()
+        self.role = Role.objects.create(role_name="Sales")
+        self.user = HorillaUser.objects.create_user(
+            username="member",
+            email="member@example.com",
+            password="password123",
+            role=self.role,
+        )
+        self.user.user_permissions.add(
+            Permission.objects.get(
+                codename="view_account", content_type__app_label="accounts"
+            )
+        )
+        self.account = Account.objects.create(
+            name="Acme", account_number="ACC-1", site="Kochi"
+        )
+
+        content_type = ContentType.objects.get_for_model(Account)
+        self.fields = [
+            field.name for field in Account._meta.get_fields() if field.concrete
+        ]
+        FieldPermission.objects.bulk_create(
+            [
+                FieldPermission(
+                    role=self.role,
+                    content_type=content_type,
+                    field_name=name,
+                    permission_type="readonly",
+                )
+                for name in self.fields
+            ]
+            + [
+                FieldPermission(
+                    user=self.user,
+                    content_type=content_type,
+                    field_name=name,
+                    permission_type="hidden",
+                )
+                for name in ["site", "account_number"]
+            ]
+        )
+
+        user_logged_in.disconnect(post_login)
+        self.addCleanup(user_logged_in.connect, post_login)
+        self.client.force_login(self.user)
+
+    def get_details(self):
+        """Render the details tab and return it with its permission queries"""
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(
+                reverse("accounts:account_details_tab_view", args=[self.account.pk]),
+                HTTP_HX_REQUEST="true",
+            )
+        queries = [
+            query["sql"]
+            for query in ctx.captured_queries
+            if f'"{FieldPermission._meta.db_table}"' in query["sql"]
+        ]
+        return response, queries
+
+    def test_user_permissions_override_role_permissions(self):
+        """Test the matrix merges role and user rows, the user's winning"""
+        permissions = get_field_permissions_for_model(self.user, Account)
+        self.assertEqual(len(permissions), len(self.fields))
+        self.assertEqual(permissions["site"], "hidden")
+        self.assertEqual(permissions["name"], "readonly")
+
+    def test_details_tab_reads_permissions_once(self):
+        """Test every field of the tab shares one permission query"""
+        response, queries = self.get_details()
+        self.assertContains(response, "Acme")
+        self.assertNotContains(response, "Kochi")
+        self.assertLessEqual(len(queries), 1)
+
+        response, queries = self.get_details()
+        self.assertNotContains(response, "Kochi")
+        self.assertEqual(queries, [])
+
+        # Cached across requests, so forms and columns add no query either
+        with self.assertNumQueries(0):
+            editable = [
+                is_field_editable(self.user, Account, name) for name in self.fields
+            ]
+        self.assertFalse(any(editable))
 
-# Create your accounts tests here.
+    def test_permission_changes_invalidate_the_cache(self):
+        """Test a saved field permission is seen by the next lookup"""
+        self.assertEqual(
+            get_field_permissions_for_model(self.user, Account)["site"], "hidden"
+        )
+        permission = FieldPermission.objects.get(user=self.user, field_name="site")
+        permission.permission_type = "readwrite"
+        permission.save()
+        self.assertEqual(
+            get_field_permissions_for_model(self.user, Account)["site"], "readwrite"
+        )
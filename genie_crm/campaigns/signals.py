@@ -5,6 +5,7 @@ from django.db.models import Q, Sum
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
+from genie_core.currency import convert_currency_fields
 from genie_core.models import HorillaUser
 from genie_core.signals import company_currency_changed
 from genie_crm.campaigns.models import Campaign, CampaignMember
@@ -38,40 +39,13 @@ def update_campaigns_on_currency_change(sender, **kwargs):
     """
     Update Campaign currency amounts when a company's currency changes.
     """
-    company = kwargs.get("company")
-    conversion_rate = kwargs.get("conversion_rate")
-
-    campaigns_to_update = []
-
-    campaigns = Campaign.objects.filter(company=company).only(
-        "id", "expected_revenue", "budget_cost", "actual_cost"
+    convert_currency_fields(
+        Campaign,
+        {"company": kwargs.get("company")},
+        ["expected_revenue", "budget_cost", "actual_cost"],
+        kwargs.get("conversion_rate"),
     )
 
-    for campaign in campaigns:
-        needs_update = False
-
-        if campaign.expected_revenue is not None:
-            campaign.expected_revenue *= conversion_rate
-            needs_update = True
-
-        if campaign.budget_cost is not None:
-            campaign.budget_cost *= conversion_rate
-            needs_update = True
-
-        if campaign.actual_cost is not None:
-            campaign.actual_cost *= conversion_rate
-            needs_update = True
-
-        if needs_update:
-            campaigns_to_update.append(campaign)
-
-    if campaigns_to_update:
-        Campaign.objects.bulk_update(
-            campaigns_to_update,
-            ["expected_revenue", "budget_cost", "actual_cost"],
-            batch_size=1000,
-        )
-
 
 def update_campaign_metrics(campaign):
     """
@@ -12,7 +12,11 @@ from drf_yasg.utils import swagger_auto_schema
 from rest_framework import permissions, viewsets
 
 from genie_core.api.docs import BULK_DELETE_DOCS, BULK_UPDATE_DOCS, SEARCH_FILTER_DOCS
-from genie_core.api.mixins import BulkOperationsMixin, SearchFilterMixin
+from genie_core.api.mixins import (
+    BulkOperationsMixin,
+    ConditionalGetMixin,
+    SearchFilterMixin,
+)
 from genie_core.api.permissions import IsCompanyMember
 from genie_crm.contacts.api.docs import (
     CONTACT_CREATE_DOCS,
@@ -55,7 +59,12 @@ bulk_delete_body = openapi.Schema(
 )
 
 
-class ContactViewSet(SearchFilterMixin, BulkOperationsMixin, viewsets.ModelViewSet):
+class ContactViewSet(
+    ConditionalGetMixin,
+    SearchFilterMixin,
+    BulkOperationsMixin,
+    viewsets.ModelViewSet,
+):
     """ViewSet for Contact model"""
 
     queryset = Contact.objects.all()
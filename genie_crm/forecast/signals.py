@@ -5,6 +5,7 @@ import logging
 from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
+from genie_core.currency import convert_currency_fields
 from genie_core.models import HorillaUser, Period
 from genie_core.signals import company_currency_changed
 from genie_crm.forecast.models import Forecast, ForecastType
@@ -24,40 +25,20 @@ def update_forecast_on_currency_change(sender, **kwargs):
     if not company or not conversion_rate:
         return
 
-    forecasts_to_update = []
-
-    revenue_fields = [
-        "target_amount",
-        "pipeline_amount",
-        "best_case_amount",
-        "commit_amount",
-        "closed_amount",
-        "actual_amount",
-    ]
-
-    forecasts = Forecast.objects.filter(owner__company=company).only(
-        "id", *revenue_fields
+    convert_currency_fields(
+        Forecast,
+        {"owner__company": company},
+        [
+            "target_amount",
+            "pipeline_amount",
+            "best_case_amount",
+            "commit_amount",
+            "closed_amount",
+            "actual_amount",
+        ],
+        conversion_rate,
     )
 
-    for forecast in forecasts:
-        needs_update = False
-
-        for field in revenue_fields:
-            value = getattr(forecast, field)
-            if value is not None:
-                setattr(forecast, field, value * conversion_rate)
-                needs_update = True
-
-        if needs_update:
-            forecasts_to_update.append(forecast)
-
-    if forecasts_to_update:
-        Forecast.objects.bulk_update(
-            forecasts_to_update,
-            revenue_fields,
-            batch_size=500,
-        )
-
 
 @receiver(pre_save, sender=Opportunity)
 def track_opportunity_changes(sender, instance, **kwargs):
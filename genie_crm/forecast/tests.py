@@ -1,3 +1,385 @@
-from django.test import TestCase
+"""
+Tests for forecast
+"""
 
-# Create your forecasts tests here.
+import datetime
+import random
+import time
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase, tag
+from django.test.utils import CaptureQueriesContext
+
+from genie_core.models import (
+    FiscalYear,
+    FiscalYearInstance,
+    HorillaUser,
+    Period,
+    Quarter,
+)
+from genie_crm.forecast.models import (
+    Forecast,
+    ForecastCondition,
+    ForecastTarget,
+    ForecastType,
+)
+from genie_crm.forecast.utils import ForecastCalculator
+from genie_crm.opportunities.models import Opportunity, OpportunityStage
+
+
+class ForecastTestMixin:
+    """Shared fixtures for forecast tests"""
+
+    def setUp(self):
+        """Set up a fiscal year of two week periods with opportunities"""
+        config = FiscalYear.objects.create(
+            fiscal_year_type="standard", start_date_month="january"
+        )
+        self.fiscal_year = FiscalYearInstance.objects.create(
+            fiscal_year_config=config,
+            start_date=datetime.date(2025, 1, 1),
+            end_date=datetime.date(2025, 12, 31),
+            name="FY 2025",
+            is_current=True,
+        )
+        quarter = Quarter.objects.create(
+            fiscal_year=self.fiscal_year,
+            name="Q1",
+            quarter_number=1,
+            start_date=datetime.date(2025, 1, 1),
+            end_date=datetime.date(2025, 3, 31),
+        )
+        self.periods = [
+            Period.objects.create(
+                quarter=quarter,
+                name=f"Period {number}",
+                period_number=number,
+                start_date=datetime.date(2025, 1, 1)
+                + datetime.timedelta(days=14 * (number - 1)),
+                end_date=datetime.date(2025, 1, 14)
+                + datetime.timedelta(days=14 * (number - 1)),
+            )
+            for number in range(1, 7)
+        ]
+        self.users = [
+            HorillaUser.objects.create_user(
+                username=f"rep{index}",
+                email=f"rep{index}@example.com",
+                password="password123",
+            )
+            for index in range(3)
+        ]
+        self.stages = [
+            OpportunityStage.objects.create(
+                name=name,
+                order=order,
+                probability=Decimal(probability),
+                stage_type=stage_type,
+            )
+            for order, (name, probability, stage_type) in enumerate(
+                [
+                    ("Prospecting", 20, "open"),
+                    ("Proposal", 60, "open"),
+                    ("Negotiation", 80, "open"),
+                    ("Won", 100, "won"),
+                    ("Lost", 0, "lost"),
+                ]
+            )
+        ]
+
+        rng = random.Random(29)
+        for index in range(80):
+            Opportunity.objects.create(
+                name=f"Deal {index}",
+                owner=rng.choice(self.users),
+                stage=rng.choice(self.stages),
+                amount=Decimal(rng.randint(100, 10000)),
+                close_date=datetime.date(2024, 12, 20)
+                + datetime.timedelta(days=rng.randint(0, 110)),
+            )
+
+        self.amount_type = ForecastType.objects.create(name="Revenue")
+        self.expected_type = ForecastType.objects.create(
+            name="Expected", forecast_type="deal_revenue_expected_amount"
+        )
+        self.quantity_type = ForecastType.objects.create(
+            name="Quantity", forecast_type="deal_quantity", include_commit=False
+        )
+
+
+class ForecastCalculatorBulkTests(ForecastTestMixin, TestCase):
+    """Test the bulk forecast calculation paths"""
+
+    def test_period_values_match_per_forecast_calculation(self):
+        """Test grouped period values equal the single forecast calculation"""
+        ForecastCondition.objects.create(
+            forecast_type=self.expected_type,
+            field="amount",
+            operator="greater_than",
+            value="1000",
+        )
+        for forecast_type in [self.amount_type, self.expected_type, self.quantity_type]:
+            calculator = ForecastCalculator(fiscal_year=self.fiscal_year)
+            values = calculator.aggregate_period_values(
+                forecast_type, [user.id for user in self.users], self.periods
+            )
+            self.assertTrue(values)
+            for user in self.users:
+                for period in self.periods:
+                    expected = calculator.calculate_forecast_values(
+                        user, period, forecast_type
+                    )
+                    self.assertEqual(
+                        values.get((user.id, period.id), calculator.empty_values()),
+                        expected,
+                        f"{forecast_type.name} {user} {period.name}",
+                    )
+
+    def test_bulk_calculation_query_count_is_constant(self):
+        """Test bulk calculation cost does not grow with users or periods"""
+
+        def count_queries(users, periods):
+            forecasts = [
+                Forecast.objects.create(
+                    owner=user,
+                    forecast_type=self.amount_type,
+                    period=period,
+                    quarter=period.quarter,
+                    fiscal_year=self.fiscal_year,
+                    name=f"{user.username} {period.name}",
+                )
+                for user in users
+                for period in periods
+            ]
+            calculator = ForecastCalculator(fiscal_year=self.fiscal_year)
+            with CaptureQueriesContext(connection) as ctx:
+                calculator.bulk_calculate_forecast_values(forecasts, self.amount_type)
+            Forecast.objects.all().delete()
+            return len(ctx.captured_queries)
+
+        small = count_queries(self.users[:1], self.periods[:2])
+        large = count_queries(self.users, self.periods)
+        self.assertEqual(small, large)
+
+    def forecast_state(self):
+        """Return the stored forecast values as comparable tuples"""
+        return sorted(
+            Forecast.objects.values_list(
+                "owner_id",
+                "period_id",
+                "forecast_type_id",
+                "name",
+                "target_amount",
+                "pipeline_amount",
+                "best_case_amount",
+                "commit_amount",
+                "closed_amount",
+                "actual_amount",
+                "pipeline_quantity",
+                "best_case_quantity",
+                "commit_quantity",
+                "closed_quantity",
+                "actual_quantity",
+            )
+        )
+
+    def test_bulk_generate_matches_per_forecast_generation(self):
+        """Test bulk generation stores the same values as the per-row path"""
+        ForecastTarget.objects.create(
+            assigned_to=self.users[0],
+            forcasts_type=self.amount_type,
+            period=self.periods[1],
+            target_amount=Decimal("5000"),
+        )
+        calculator = ForecastCalculator(fiscal_year=self.fiscal_year)
+        for user in self.users:
+            for forecast_type in ForecastType.objects.filter(is_active=True):
+                for period in self.periods:
+                    calculator.create_or_update_period_forecast(
+                        user, forecast_type, period
+                    )
+        expected = self.forecast_state()
+        Forecast.objects.all().delete()
+
+        ForecastCalculator(fiscal_year=self.fiscal_year).bulk_generate_forecasts(
+            users=self.users
+        )
+        self.assertEqual(self.forecast_state(), expected)
+
+        # A second run updates the existing rows in place
+        ForecastCalculator(fiscal_year=self.fiscal_year).bulk_generate_forecasts(
+            users=self.users
+        )
+        self.assertEqual(self.forecast_state(), expected)
+
+    def test_bulk_generate_query_count_per_forecast_type(self):
+        """Test bulk generation cost does not grow with users or periods"""
+
+        def count_queries(users, periods):
+            calculator = ForecastCalculator(fiscal_year=self.fiscal_year)
+            with CaptureQueriesContext(connection) as ctx:
+                calculator.bulk_generate_forecasts(users=users, periods=periods)
+            return len(ctx.captured_queries)
+
+        small_create = count_queries(self.users[:1], self.periods[:2])
+        small_update = count_queries(self.users[:1], self.periods[:2])
+        Forecast.objects.all().delete()
+        large_create = count_queries(self.users, self.periods)
+        large_update = count_queries(self.users, self.periods)
+
+        self.assertEqual(small_create, large_create)
+        self.assertEqual(small_update, large_update)
+        self.assertLessEqual(large_update, 8 * ForecastType.objects.count())
+
+
+@tag("benchmark")
+class ForecastCalculatorBenchmarkTests(TestCase):
+    """Benchmark bulk forecasts at 100k opportunities x 52 periods x 200 users"""
+
+    def setUp(self):
+        """Set up weekly periods, users and opportunities with bulk inserts"""
+        # Standard fiscal years make every period a calendar month
+        config = FiscalYear.objects.create(
+            fiscal_year_type="custom", start_date_month="january"
+        )
+        self.fiscal_year = FiscalYearInstance.objects.create(
+            fiscal_year_config=config,
+            start_date=datetime.date(2025, 1, 1),
+            end_date=datetime.date(2025, 12, 30),
+            name="FY 2025",
+            is_current=True,
+        )
+        start = datetime.date(2025, 1, 1)
+        self.periods = []
+        for quarter_number in range(1, 5):
+            quarter = Quarter.objects.create(
+                fiscal_year=self.fiscal_year,
+                name=f"Q{quarter_number}",
+                quarter_number=quarter_number,
+                start_date=start + datetime.timedelta(weeks=13 * (quarter_number - 1)),
+                end_date=start + datetime.timedelta(weeks=13 * quarter_number, days=-1),
+            )
+            for week in range(13):
+                number = 13 * (quarter_number - 1) + week + 1
+                self.periods.append(
+                    Period.objects.create(
+                        quarter=quarter,
+                        name=f"Week {number}",
+                        period_number=number,
+                        start_date=start + datetime.timedelta(weeks=number - 1),
+                        end_date=start + datetime.timedelta(weeks=number, days=-1),
+                    )
+                )
+        HorillaUser.objects.bulk_create(
+            HorillaUser(
+                username=f"rep{index}",
+                email=f"rep{index}@example.com",
+                password="!",
+            )
+            for index in range(200)
+        )
+        self.users = list(HorillaUser.objects.filter(username__startswith="rep"))
+        stages = [
+            OpportunityStage.objects.create(
+                name=name,
+                order=order,
+                probability=Decimal(probability),
+                stage_type=stage_type,
+            )
+            for order, (name, probability, stage_type) in enumerate(
+                [
+                    ("Prospecting", 20, "open"),
+                    ("Proposal", 60, "open"),
+                    ("Negotiation", 80, "open"),
+                    ("Won", 100, "won"),
+                    ("Lost", 0, "lost"),
+                ]
+            )
+        ]
+
+        rng = random.Random(29)
+        opportunities = []
+        for index in range(100_000):
+            stage = rng.choice(stages)
+            amount = Decimal(rng.randint(100, 10000))
+            opportunity = Opportunity(
+                name=f"Deal {index}",
+                owner=rng.choice(self.users),
+                stage=stage,
+                amount=amount,
+                probability=stage.probability,
+                expected_revenue=amount * (stage.probability / 100),
+                close_date=start + datetime.timedelta(days=rng.randint(-10, 375)),
+            )
+            opportunity.set_forecast_category()
+            opportunities.append(opportunity)
+        Opportunity.objects.bulk_create(opportunities, batch_size=5000)
+
+        self.forecast_types = [
+            ForecastType.objects.create(name="Revenue"),
+            ForecastType.objects.create(
+                name="Expected", forecast_type="deal_revenue_expected_amount"
+            ),
+            ForecastType.objects.create(
+                name="Quantity", forecast_type="deal_quantity", include_commit=False
+            ),
+        ]
+
+    def test_bulk_generate_against_per_forecast_generation(self):
+        """Test bulk generation beats the per-forecast path with fixed queries"""
+        calculator = ForecastCalculator(fiscal_year=self.fiscal_year)
+        sample_users = self.users[:2]
+        start = time.perf_counter()
+        for user in sample_users:
+            for forecast_type in self.forecast_types:
+                for period in self.periods:
+                    calculator.create_or_update_period_forecast(
+                        user, forecast_type, period
+                    )
+        # The per-forecast cost grows linearly with the number of users
+        per_forecast_seconds = (
+            (time.perf_counter() - start) * len(self.users) / len(sample_users)
+        )
+        Forecast.objects.all().delete()
+
+        calculator = ForecastCalculator(fiscal_year=self.fiscal_year)
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            calculator.bulk_generate_forecasts(users=self.users, periods=self.periods)
+            bulk_seconds = time.perf_counter() - start
+
+        self.assertEqual(
+            Forecast.objects.count(),
+            len(self.users) * len(self.periods) * len(self.forecast_types),
+        )
+        # Rows are inserted in batches as large as the backend takes, the
+        # rest is a fixed number of queries per forecast type
+        fields = [
+            field for field in Forecast._meta.concrete_fields if not field.primary_key
+        ]
+        batch = min(1000, connection.ops.bulk_batch_size(fields, []))
+        inserts = [
+            query
+            for query in ctx.captured_queries
+            if query["sql"].startswith('INSERT INTO "forecast_forecast"')
+        ]
+        self.assertLessEqual(
+            len(inserts),
+            len(self.forecast_types) * -(-len(self.users) * len(self.periods) // batch),
+        )
+        self.assertLessEqual(
+            len(ctx.captured_queries) - len(inserts), 8 * len(self.forecast_types)
+        )
+        self.assertLess(bulk_seconds, per_forecast_seconds)
+
+        for user in sample_users:
+            for period in self.periods[::13]:
+                forecast = Forecast.objects.get(
+                    owner=user, period=period, forecast_type=self.forecast_types[0]
+                )
+                expected = calculator.calculate_forecast_values(
+                    user, period, self.forecast_types[0]
+                )
+                self.assertEqual(forecast.pipeline_amount, expected["pipeline"])
+                self.assertEqual(forecast.closed_amount, expected["closed"])
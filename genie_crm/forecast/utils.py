@@ -14,7 +14,17 @@ Features:
 - Caches condition queries for efficiency.
 """
 
-from django.db.models import Q, Sum
+from django.db.models import (
+    Case,
+    Count,
+    IntegerField,
+    Q,
+    QuerySet,
+    Sum,
+    Value,
+    When,
+)
+from django.utils import timezone
 
 from genie_core.models import FiscalYearInstance, HorillaUser, Period
 from genie_crm.forecast.models import Forecast, ForecastTarget, ForecastType
@@ -117,75 +127,17 @@ class ForecastCalculator:
         if not forecasts:
             return
 
-        # Group forecasts by user and period for efficient querying
-        user_period_forecasts = {}
-        for forecast in forecasts:
-            key = (forecast.owner_id, forecast.period_id)
-            user_period_forecasts[key] = forecast
-
-        # Get all opportunities for all users/periods in single query
-        user_ids = list(set(f.owner_id for f in forecasts))
-        period_data = {}
-        for forecast in forecasts:
-            if forecast.period_id not in period_data:
-                period_data[forecast.period_id] = {
-                    "start_date": forecast.period.start_date,
-                    "end_date": forecast.period.end_date,
-                }
-
-        # Build conditions query once and cache it
-        conditions_query = self.get_cached_conditions_query(forecast_type)
-
-        # Get all relevant opportunities in bulk
-        opportunities_query = Q(owner_id__in=user_ids)
-
-        # Add date range conditions for all periods
-        date_conditions = Q()
-        for period_info in period_data.values():
-            date_conditions |= Q(
-                close_date__range=[period_info["start_date"], period_info["end_date"]]
-            )
-        opportunities_query &= date_conditions
-
-        if conditions_query:
-            opportunities_query &= conditions_query
-
-        opportunities = Opportunity.objects.filter(opportunities_query).values(
-            "id",
-            "owner_id",
-            "close_date",
-            "amount",
-            "expected_revenue",
-            "forecast_category",
-            "stage__stage_type",
+        user_ids = {f.owner_id for f in forecasts}
+        periods = {f.period_id: f.period for f in forecasts}.values()
+        user_period_values = self.aggregate_period_values(
+            forecast_type, user_ids, periods
         )
 
-        # Group opportunities by user and period
-        user_period_opportunities = {}
-        for opp in opportunities:
-            # Find which period this opportunity belongs to
-            for forecast in forecasts:
-                if (
-                    forecast.owner_id == opp["owner_id"]
-                    and forecast.period.start_date
-                    <= opp["close_date"]
-                    <= forecast.period.end_date
-                ):
-
-                    key = (opp["owner_id"], forecast.period_id)
-                    if key not in user_period_opportunities:
-                        user_period_opportunities[key] = []
-                    user_period_opportunities[key].append(opp)
-                    break
-
         # Calculate values for each forecast
         forecasts_to_update = []
         for forecast in forecasts:
-            key = (forecast.owner_id, forecast.period_id)
-            user_opportunities = user_period_opportunities.get(key, [])
-
-            values = self.calculate_values_from_opportunities(
-                user_opportunities, forecast_type
+            values = user_period_values.get(
+                (forecast.owner_id, forecast.period_id), self.empty_values()
             )
 
             # Update forecast fields based on type
@@ -228,36 +180,9 @@ class ForecastCalculator:
                 forecasts_to_update, fields_to_update, batch_size=1000
             )
 
-    def get_cached_conditions_query(self, forecast_type):
-        """
-        Cache conditions query to avoid rebuilding for each forecast
-        """
-        cache_key = f"conditions_{forecast_type.id}"
-        if cache_key not in self._conditions_cache:
-            self._conditions_cache[cache_key] = self.build_conditions_query(
-                forecast_type
-            )
-        return self._conditions_cache[cache_key]
-
-    def calculate_values_from_opportunities(self, opportunities, forecast_type):
-        """
-        Calculate values from pre-fetched opportunity data
-        """
-
-        if forecast_type.is_quantity_based:
-            return self._calculate_quantity_values_from_data(
-                opportunities, forecast_type
-            )
-        elif forecast_type.is_revenue_expected_based:
-            return self._calculate_expected_amount_values_from_data(
-                opportunities, forecast_type
-            )
-        else:
-            return self._calculate_amount_values_from_data(opportunities, forecast_type)
-
-    def _calculate_quantity_values_from_data(self, opportunities, forecast_type):
-        """Calculate quantity values from opportunity data"""
-        values = {
+    def empty_values(self):
+        """Return forecast values for an owner/period without opportunities"""
+        return {
             "pipeline": 0,
             "best_case": 0,
             "commit": 0,
@@ -265,87 +190,108 @@ class ForecastCalculator:
             "actual": 0,
         }
 
-        for opp in opportunities:
-            if (
-                forecast_type.include_pipeline
-                and opp["forecast_category"] == "pipeline"
-            ):
-                values["pipeline"] += 1
-            if (
-                forecast_type.include_best_case
-                and opp["forecast_category"] == "best_case"
-            ):
-                values["best_case"] += 1
-            if forecast_type.include_commit and opp["forecast_category"] == "commit":
-                values["commit"] += 1
-            if forecast_type.include_closed and opp["forecast_category"] == "closed":
-                values["closed"] += 1
-            if opp["stage__stage_type"] == "won":
-                values["actual"] += 1
+    def get_period_bucket(self, periods):
+        """
+        Build an expression mapping an opportunity's close date to the id of
+        the period containing it, so opportunities can be grouped by period
+        in SQL. Periods are matched in start date order.
+        """
+        return Case(
+            *[
+                When(
+                    close_date__range=[period.start_date, period.end_date],
+                    then=Value(period.id),
+                )
+                for period in periods
+            ],
+            default=Value(None),
+            output_field=IntegerField(),
+        )
 
-        return values
+    def get_value_aggregates(self, forecast_type):
+        """
+        Build the conditional aggregates computing each forecast value of a
+        forecast type in a single grouped query
+        """
+        if forecast_type.is_quantity_based:
 
-    def _calculate_expected_amount_values_from_data(self, opportunities, forecast_type):
-        """Calculate expected amount values from opportunity data"""
-        values = {
-            "pipeline": 0,
-            "best_case": 0,
-            "commit": 0,
-            "closed": 0,
-            "actual": 0,
-        }
+            def aggregate(condition):
+                return Count("id", filter=condition)
 
-        for opp in opportunities:
-            expected_revenue = opp["expected_revenue"] or 0
-            if (
-                forecast_type.include_pipeline
-                and opp["forecast_category"] == "pipeline"
-            ):
-                values["pipeline"] += expected_revenue
-            if (
-                forecast_type.include_best_case
-                and opp["forecast_category"] == "best_case"
-            ):
-                values["best_case"] += expected_revenue
-            if forecast_type.include_commit and opp["forecast_category"] == "commit":
-                values["commit"] += expected_revenue
-            if forecast_type.include_closed and opp["forecast_category"] == "closed":
-                values["closed"] += expected_revenue
-            if opp["stage__stage_type"] == "won":
-                values["actual"] += expected_revenue
+        else:
+            value_field = (
+                "expected_revenue"
+                if forecast_type.is_revenue_expected_based
+                else "amount"
+            )
 
-        return values
+            def aggregate(condition):
+                return Sum(value_field, filter=condition)
 
-    def _calculate_amount_values_from_data(self, opportunities, forecast_type):
-        """Calculate amount values from opportunity data"""
-        values = {
-            "pipeline": 0,
-            "best_case": 0,
-            "commit": 0,
-            "closed": 0,
-            "actual": 0,
+        included = {
+            "pipeline": forecast_type.include_pipeline,
+            "best_case": forecast_type.include_best_case,
+            "commit": forecast_type.include_commit,
+            "closed": forecast_type.include_closed,
+        }
+        aggregates = {
+            category: aggregate(Q(forecast_category=category))
+            for category, include in included.items()
+            if include
         }
+        aggregates["actual"] = aggregate(Q(stage__stage_type="won"))
+        return aggregates
+
+    def aggregate_period_values(self, forecast_type, user_ids, periods):
+        """
+        Calculate forecast values for every (owner, period) pair in one query.
+        Opportunities are joined to periods on their close date and summed
+        per owner and period with conditional aggregates.
+        Returns a dict keyed by (owner_id, period_id).
+        """
+        periods = sorted(periods, key=lambda p: (p.start_date, p.end_date))
+        if not user_ids or not periods:
+            return {}
+
+        opportunities_query = Q(
+            owner_id__in=user_ids,
+            close_date__range=[
+                periods[0].start_date,
+                max(period.end_date for period in periods),
+            ],
+        )
+        conditions_query = self.get_cached_conditions_query(forecast_type)
+        if conditions_query:
+            opportunities_query &= conditions_query
 
-        for opp in opportunities:
-            amount = opp["amount"] or 0
-            if (
-                forecast_type.include_pipeline
-                and opp["forecast_category"] == "pipeline"
-            ):
-                values["pipeline"] += amount
-            if (
-                forecast_type.include_best_case
-                and opp["forecast_category"] == "best_case"
-            ):
-                values["best_case"] += amount
-            if forecast_type.include_commit and opp["forecast_category"] == "commit":
-                values["commit"] += amount
-            if forecast_type.include_closed and opp["forecast_category"] == "closed":
-                values["closed"] += amount
-            if opp["stage__stage_type"] == "won":
-                values["actual"] += amount
+        aggregates = self.get_value_aggregates(forecast_type)
+        rows = (
+            Opportunity.objects.filter(opportunities_query)
+            .annotate(forecast_period_id=self.get_period_bucket(periods))
+            .filter(forecast_period_id__isnull=False)
+            .values("owner_id", "forecast_period_id")
+            .annotate(**aggregates)
+            .order_by()
+        )
 
-        return values
+        results = {}
+        for row in rows:
+            values = self.empty_values()
+            for key in aggregates:
+                values[key] = row[key] or 0
+            results[(row["owner_id"], row["forecast_period_id"])] = values
+        return results
+
+    def get_cached_conditions_query(self, forecast_type):
+        """
+        Cache conditions query to avoid rebuilding for each forecast
+        """
+        cache_key = f"conditions_{forecast_type.id}"
+        if cache_key not in self._conditions_cache:
+            self._conditions_cache[cache_key] = self.build_conditions_query(
+                forecast_type
+            )
+        return self._conditions_cache[cache_key]
 
     # Keep the rest of your existing methods but with optimizations
     def generate_forecasts_for_user(self, user=None, forecast_type=None):
@@ -675,9 +621,117 @@ class ForecastCalculator:
         if not periods:
             periods = Period.objects.filter(quarter__fiscal_year=self.fiscal_year)
 
+        users = list(users)
+        if isinstance(periods, QuerySet):
+            periods = periods.select_related("quarter__fiscal_year")
+        periods = list(periods)
+
         forecast_types = ForecastType.objects.filter(is_active=True)
 
+        for forecast_type in forecast_types:
+            self.bulk_materialize_forecasts(forecast_type, users, periods)
+
+    def get_bulk_targets(self, user_ids, period_ids):
+        """
+        Return the active target of each (user, period) pair, picking the
+        same target as get_target_for_period
+        """
+        targets = {}
+        for target in ForecastTarget.objects.filter(
+            assigned_to_id__in=user_ids, period_id__in=period_ids, is_active=True
+        ):
+            targets.setdefault((target.assigned_to_id, target.period_id), target)
+        return targets
+
+    def bulk_materialize_forecasts(self, forecast_type, users, periods):
+        """
+        Create or update the forecasts of one forecast type for every user
+        and period with a fixed number of queries: values are computed in
+        one aggregate pass, existing forecasts fetched in one query and rows
+        written with bulk_create/bulk_update, skipping per-row save hooks.
+        """
+        if not users or not periods:
+            return
+
+        user_ids = [user.id for user in users]
+        period_ids = [period.id for period in periods]
+        period_values = self.aggregate_period_values(forecast_type, user_ids, periods)
+        targets = self.get_bulk_targets(user_ids, period_ids)
+        existing = {
+            (forecast.company_id, forecast.owner_id, forecast.period_id): forecast
+            for forecast in Forecast.objects.filter(
+                forecast_type=forecast_type,
+                owner_id__in=user_ids,
+                period_id__in=period_ids,
+            )
+        }
+
+        if forecast_type.is_quantity_based:
+            value_fields = {
+                "pipeline": "pipeline_quantity",
+                "best_case": "best_case_quantity",
+                "commit": "commit_quantity",
+                "closed": "closed_quantity",
+                "actual": "actual_quantity",
+            }
+            target_field = "target_quantity"
+        else:
+            value_fields = {
+                "pipeline": "pipeline_amount",
+                "best_case": "best_case_amount",
+                "commit": "commit_amount",
+                "closed": "closed_amount",
+                "actual": "actual_amount",
+            }
+            target_field = "target_amount"
+
+        now = timezone.now()
+        forecasts_to_create = []
+        forecasts_to_update = []
         for user in users:
-            for forecast_type in forecast_types:
-                for period in periods:
-                    self.create_or_update_period_forecast(user, forecast_type, period)
+            for period in periods:
+                target = targets.get((user.id, period.id))
+                target_amount = target.target_amount if target else 0
+                target_quantity = getattr(target, "quantity_target", 0) if target else 0
+
+                forecast = existing.get((user.company_id, user.id, period.id))
+                if forecast is None:
+                    forecast = Forecast(
+                        company_id=user.company_id,
+                        owner=user,
+                        forecast_type=forecast_type,
+                        period=period,
+                        quarter=period.quarter,
+                        fiscal_year=period.quarter.fiscal_year,
+                        name=f"{forecast_type.name} - {period.name}",
+                        target_amount=target_amount,
+                        target_quantity=target_quantity,
+                    )
+                    forecasts_to_create.append(forecast)
+                else:
+                    forecast.updated_at = now
+                    forecasts_to_update.append(forecast)
+
+                values = period_values.get((user.id, period.id), self.empty_values())
+                for key, field in value_fields.items():
+                    setattr(forecast, field, values[key])
+
+                if not getattr(forecast, target_field):
+                    setattr(
+                        forecast,
+                        target_field,
+                        (
+                            target_quantity
+                            if forecast_type.is_quantity_based
+                            else target_amount
+                        ),
+                    )
+
+        if forecasts_to_create:
+            Forecast.objects.bulk_create(forecasts_to_create, batch_size=1000)
+        if forecasts_to_update:
+            Forecast.objects.bulk_update(
+                forecasts_to_update,
+                [*value_fields.values(), target_field, "updated_at"],
+                batch_size=1000,
+            )
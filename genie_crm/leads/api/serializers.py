@@ -14,3 +14,14 @@ class LeadStatusSerializer(serializers.ModelSerializer):
     class Meta:
         model = LeadStatus
         fields = "__all__"
+
+
+class LeadSerializer(serializers.ModelSerializer):
+    """Serializer for Lead model"""
+
+    lead_owner_details = HorillaUserSerializer(source="lead_owner", read_only=True)
+    lead_status_details = LeadStatusSerializer(source="lead_status", read_only=True)
+
+    class Meta:
+        model = Lead
+        fields = "__all__"
@@ -12,7 +12,13 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from genie_core.api.docs import BULK_DELETE_DOCS, BULK_UPDATE_DOCS, SEARCH_FILTER_DOCS
-from genie_core.api.mixins import BulkOperationsMixin, SearchFilterMixin
+from genie_core.api.mixins import (
+    BulkOperationsMixin,
+    ConditionalGetMixin,
+    SearchFilterMixin,
+    SparseFieldsetMixin,
+)
+from genie_core.api.pagination import CreatedAtCursorPagination
 from genie_core.api.permissions import IsCompanyMember, IsOwnerOrAdmin
 from genie_crm.leads.api.docs import (
     LEAD_BY_OWNER_DOCS,
@@ -29,7 +35,7 @@ from genie_crm.leads.api.docs import (
     LEAD_STATUS_LIST_DOCS,
     LEAD_STATUS_REORDER_DOCS,
 )
-from genie_crm.leads.api.serializers import LeadStatusSerializer
+from genie_crm.leads.api.serializers import LeadSerializer, LeadStatusSerializer
 from genie_crm.leads.models import Lead, LeadStatus
 
 # Define common Swagger parameters and bodies consistent with horilla_core
@@ -63,10 +69,18 @@ bulk_delete_body = openapi.Schema(
 )
 
 
-class LeadViewSet(SearchFilterMixin, BulkOperationsMixin, viewsets.ModelViewSet):
+class LeadViewSet(
+    ConditionalGetMixin,
+    SparseFieldsetMixin,
+    SearchFilterMixin,
+    BulkOperationsMixin,
+    viewsets.ModelViewSet,
+):
     """ViewSet for Lead model"""
 
     queryset = Lead.objects.all()
+    serializer_class = LeadSerializer
+    pagination_class = CreatedAtCursorPagination
     permission_classes = [permissions.IsAuthenticated, IsCompanyMember]
 
     # Search across common lead fields
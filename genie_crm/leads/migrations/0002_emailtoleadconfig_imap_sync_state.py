@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("leads", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="emailtoleadconfig",
+            name="imap_last_uid",
+            field=models.PositiveBigIntegerField(
+                default=0,
+                editable=False,
+                help_text="Highest inbox UID already processed.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="emailtoleadconfig",
+            name="imap_uidvalidity",
+            field=models.PositiveBigIntegerField(
+                blank=True,
+                editable=False,
+                help_text="UIDVALIDITY of the inbox when it was last synced.",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("leads", "0002_emailtoleadconfig_imap_sync_state"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="emailtoleadconfig",
+            name="outlook_delta_link",
+            field=models.TextField(
+                blank=True,
+                editable=False,
+                help_text="Microsoft Graph link to resume the inbox sync from.",
+                null=True,
+            ),
+        ),
+    ]
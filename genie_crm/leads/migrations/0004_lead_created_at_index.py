@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("horilla_core", "0004_recyclebin_company_deleted_index"),
+        ("leads", "0003_emailtoleadconfig_outlook_delta_link"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="lead",
+            index=models.Index(
+                fields=["company", "created_at", "id"],
+                name="leads_lead_company_c30a20_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+from genie_core.search_index import CreateSearchIndex
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("leads", "0004_lead_created_at_index"),
+    ]
+
+    operations = [
+        CreateSearchIndex(
+            model_name="lead",
+            fields=[
+                "first_name",
+                "last_name",
+                "email",
+                "title",
+                "lead_company",
+                "contact_number",
+                "city",
+                "state",
+                "country",
+                "requirements",
+            ],
+        ),
+    ]
@@ -290,6 +290,10 @@ class Lead(HorillaCoreModel):
 
         verbose_name = _("Lead")
         verbose_name_plural = _("Leads")
+        indexes = [
+            # Keyset pages of the API, see CreatedAtCursorPagination
+            models.Index(fields=["company", "created_at", "id"]),
+        ]
 
     def __str__(self):
         return f"{str(self.title)}-{self.id}"
@@ -390,6 +394,23 @@ class EmailToLeadConfig(HorillaCoreModel):
     last_fetched = models.DateTimeField(
         null=True, blank=True, verbose_name=_("Last Fetched On")
     )
+    imap_uidvalidity = models.PositiveBigIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text=_("UIDVALIDITY of the inbox when it was last synced."),
+    )
+    imap_last_uid = models.PositiveBigIntegerField(
+        default=0,
+        editable=False,
+        help_text=_("Highest inbox UID already processed."),
+    )
+    outlook_delta_link = models.TextField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text=_("Microsoft Graph link to resume the inbox sync from."),
+    )
 
     def update_last_fetched(self):
         self.last_fetched = timezone.now()
@@ -6,6 +6,7 @@ Handles automatic updates when company-related events occur, e.g., currency chan
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
+from genie_core.currency import convert_currency_fields
 from genie_core.models import HorillaUser
 from genie_core.signals import company_currency_changed
 from genie_crm.leads.models import Lead
@@ -43,24 +44,13 @@ def update_crm_on_currency_change(sender, **kwargs):
     """
     Updates Lead amounts when a company's currency changes.
     """
-    company = kwargs.get("company")
-    conversion_rate = kwargs.get("conversion_rate")
-
-    leads_to_update = []
-    leads = (
-        Lead.objects.filter(company=company)
-        .select_related()
-        .only("id", "annual_revenue")
+    convert_currency_fields(
+        Lead,
+        {"company": kwargs.get("company")},
+        ["annual_revenue"],
+        kwargs.get("conversion_rate"),
     )
 
-    for lead in leads:
-        if lead.annual_revenue is not None:
-            lead.annual_revenue = lead.annual_revenue * conversion_rate
-            leads_to_update.append(lead)
-
-    if leads_to_update:
-        Lead.objects.bulk_update(leads_to_update, ["annual_revenue"], batch_size=1000)
-
 
 @receiver(post_save, sender=HorillaUser)
 def create_leads_shortcuts(sender, instance, created, **kwargs):
@@ -2,10 +2,12 @@ import email
 import email.utils
 import imaplib
 import logging
+import re
 from datetime import datetime
 
 import requests
 from celery import shared_task
+from django.conf import settings
 
 from genie_mail.horilla_outlook import refresh_outlook_token
 
@@ -13,6 +15,18 @@ from .models import EmailToLeadConfig, Lead, LeadStatus
 
 logger = logging.getLogger(__name__)
 
+EMAIL_TO_LEAD_FETCH_BATCH_SIZE = getattr(
+    settings, "EMAIL_TO_LEAD_FETCH_BATCH_SIZE", 500
+)
+
+# Headers needed to decide whether an email can become a lead
+IMAP_HEADER_FIELDS = (
+    "(BODY.PEEK[HEADER.FIELDS (MESSAGE-ID IN-REPLY-TO REFERENCES FROM)])"
+)
+UID_PATTERN = re.compile(rb"UID (\d+)")
+
+OUTLOOK_DELTA_PAGE_SIZE = getattr(settings, "OUTLOOK_DELTA_PAGE_SIZE", 100)
+
 
 @shared_task
 def fetch_emails_to_leads():
@@ -64,8 +78,92 @@ def fetch_emails_to_leads():
     }
 
 
+def get_mailbox_status(mail, mailbox="inbox"):
+    """Return the (UIDVALIDITY, UIDNEXT) of a mailbox"""
+    result, data = mail.status(mailbox, "(UIDVALIDITY UIDNEXT)")
+    if result != "OK":
+        raise imaplib.IMAP4.error(f"STATUS {mailbox} failed: {data}")
+    response = b" ".join(item for item in data if isinstance(item, bytes))
+    uidvalidity = re.search(rb"UIDVALIDITY (\d+)", response)
+    uidnext = re.search(rb"UIDNEXT (\d+)", response)
+    return (
+        int(uidvalidity.group(1)) if uidvalidity else None,
+        int(uidnext.group(1)) if uidnext else None,
+    )
+
+
+def get_uid_set(uids):
+    """Compress sorted UIDs into an IMAP sequence set, e.g. 1:5,8,10:12"""
+    ranges = []
+    for uid in uids:
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ",".join(
+        str(first) if first == last else f"{first}:{last}" for first, last in ranges
+    )
+
+
+def fetch_uid_batch(mail, uids, message_parts):
+    """UID FETCH the given parts of a batch of messages, as (uid, bytes)"""
+    result, data = mail.uid("FETCH", get_uid_set(uids), message_parts)
+    if result != "OK":
+        raise imaplib.IMAP4.error(f"UID FETCH failed: {data}")
+    messages = []
+    for item in data:
+        if isinstance(item, tuple):
+            uid = UID_PATTERN.search(item[0])
+            if uid:
+                messages.append((int(uid.group(1)), item[1]))
+    return messages
+
+
+def get_known_message_ids(messages):
+    """
+    Return the Message-IDs, among those the messages have or reply to,
+    that already belong to a lead, in a single query.
+    """
+    message_ids = set()
+    for msg in messages:
+        message_ids.add(msg.get("Message-ID", ""))
+        message_ids.add(msg.get("In-Reply-To", ""))
+        message_ids.update(msg.get("References", "").split())
+    return set(
+        Lead.objects.filter(email_message_id__in=message_ids).values_list(
+            "email_message_id", flat=True
+        )
+    )
+
+
+def is_known_message(msg, known_message_ids):
+    """Check if a message, or the thread it replies to, already has a lead."""
+    in_reply_to = msg.get("In-Reply-To", "")
+    return (
+        msg.get("Message-ID", "") in known_message_ids
+        or (in_reply_to and in_reply_to in known_message_ids)
+        or any(ref in known_message_ids for ref in msg.get("References", "").split())
+    )
+
+
+def save_imap_sync_state(config, uidvalidity, last_uid):
+    """Record how far the inbox of a configuration has been processed"""
+    config.imap_uidvalidity = uidvalidity
+    config.imap_last_uid = last_uid
+    config.save(update_fields=["imap_uidvalidity", "imap_last_uid"])
+
+
 def fetch_from_imap(config):
-    """Fetch emails using IMAP for standard mail configurations."""
+    """
+    Fetch new emails using IMAP for standard mail configurations.
+
+    Only UIDs above the last one processed are fetched, as long as the
+    inbox UIDVALIDITY is unchanged; on the first sync, or once the server
+    renumbers the inbox, today's messages are fetched as before. Headers
+    are fetched in batches and checked against existing leads with one
+    query per batch; full messages are only fetched for emails from
+    accepted senders that are neither leads nor replies in a lead's thread.
+    """
     imap_conf = {
         "host": config.mail.host,
         "port": config.mail.port,
@@ -77,59 +175,81 @@ def fetch_from_imap(config):
     else:
         mail = imaplib.IMAP4(imap_conf["host"], imap_conf["port"])
 
-    mail.login(config.mail.username, config.mail.get_decrypted_password())
-    mail.select("inbox")
-
-    # Get today's date in IMAP format
-    today = datetime.now().strftime("%d-%b-%Y")
-    result, data = mail.search(None, f"(SINCE {today})")
-
-    email_ids = data[0].split()
-    allowed_senders = config.get_accepted_emails()
     created_count = 0
     filtered_count = 0
+    try:
+        mail.login(config.mail.username, config.mail.get_decrypted_password())
+        uidvalidity, uidnext = get_mailbox_status(mail)
+        highest_uid = uidnext - 1 if uidnext else 0
+        mail.select("inbox")
+
+        resync = not uidvalidity or uidvalidity != config.imap_uidvalidity
+        last_uid = 0 if resync else config.imap_last_uid
+        if resync:
+            # Get today's date in IMAP format
+            today = datetime.now().strftime("%d-%b-%Y")
+            result, data = mail.uid("SEARCH", f"(SINCE {today})")
+        elif highest_uid and highest_uid <= last_uid:
+            result, data = "OK", [b""]
+        else:
+            result, data = mail.uid("SEARCH", f"UID {last_uid + 1}:*")
+        if result != "OK":
+            raise imaplib.IMAP4.error(f"UID SEARCH failed: {data}")
+
+        # "n:*" always matches the newest message, even below n
+        uids = sorted(uid for uid in map(int, data[0].split()) if uid > last_uid)
+        allowed_senders = config.get_accepted_emails()
+
+        for start in range(0, len(uids), EMAIL_TO_LEAD_FETCH_BATCH_SIZE):
+            batch = uids[start : start + EMAIL_TO_LEAD_FETCH_BATCH_SIZE]
+            headers = [
+                (uid, email.message_from_bytes(raw))
+                for uid, raw in fetch_uid_batch(mail, batch, IMAP_HEADER_FIELDS)
+            ]
+            known_message_ids = get_known_message_ids(msg for _, msg in headers)
+
+            candidates = [
+                uid
+                for uid, msg in headers
+                if not is_known_message(msg, known_message_ids)
+                and (
+                    not allowed_senders
+                    or email.utils.parseaddr(msg["From"])[1].lower() in allowed_senders
+                )
+            ]
+            if candidates:
+                for uid, raw in fetch_uid_batch(mail, candidates, "(RFC822)"):
+                    msg = email.message_from_bytes(raw)
+                    # Earlier leads of this batch may start the thread
+                    if is_known_message(msg, known_message_ids):
+                        continue
+                    result = create_lead_from_email(msg, config)
+                    if result == "created":
+                        created_count += 1
+                        known_message_ids.add(msg.get("Message-ID", ""))
+                    elif result == "filtered":
+                        filtered_count += 1
+
+            last_uid = batch[-1]
+            save_imap_sync_state(config, uidvalidity, last_uid)
+
+        if uidvalidity and (resync or highest_uid > last_uid):
+            save_imap_sync_state(config, uidvalidity, max(highest_uid, last_uid))
+    finally:
+        mail.logout()
 
-    for e_id in email_ids:
-        res, msg_data = mail.fetch(e_id, "(RFC822)")
-        msg = email.message_from_bytes(msg_data[0][1])
-
-        result = process_email_message(msg, config, allowed_senders)
-        if result == "created":
-            created_count += 1
-        elif result == "filtered":
-            filtered_count += 1
-
-    mail.logout()
     return created_count, filtered_count
 
 
-def fetch_from_outlook(config):
-    """Fetch emails using Microsoft Graph API for Outlook configurations."""
-
-    if not config.mail.token or "access_token" not in config.mail.token:
-        raise ValueError("No valid access token found for Outlook configuration")
-
-    access_token = config.mail.token["access_token"]
-
-    # Get today's date in ISO 8601 format
-    today = datetime.now().strftime("%Y-%m-%dT00:00:00Z")
-
-    # Microsoft Graph API endpoint
-    api_endpoint = (
-        config.mail.outlook_api_endpoint or "https://graph.microsoft.com/v1.0"
-    )
-    url = f"{api_endpoint}/me/messages"
-
+def get_outlook_page(config, url, params=None):
+    """
+    GET a Microsoft Graph page, refreshing the access token once if it has
+    expired. Returns the response.
+    """
     headers = {
-        "Authorization": f"Bearer {access_token}",
+        "Authorization": f"Bearer {config.mail.token['access_token']}",
         "Content-Type": "application/json",
-    }
-
-    # Filter for today's emails
-    params = {
-        "$filter": f"receivedDateTime ge {today}",
-        "$select": "id,subject,from,body,bodyPreview,internetMessageId,internetMessageHeaders",
-        "$top": 100,
+        "Prefer": f"odata.maxpagesize={OUTLOOK_DELTA_PAGE_SIZE}",
     }
     response = requests.get(url, headers=headers, params=params)
 
@@ -140,47 +260,97 @@ def fetch_from_outlook(config):
         # Retry with new token
         headers["Authorization"] = f'Bearer {config.mail.token["access_token"]}'
         response = requests.get(url, headers=headers, params=params)
+    return response
+
+
+def get_outlook_headers(msg):
+    """Return the threading headers of a Graph message, keyed like email headers"""
+    headers = {"Message-ID": msg.get("internetMessageId", "")}
+    for header in msg.get("internetMessageHeaders") or []:
+        if header.get("name") in ("In-Reply-To", "References"):
+            headers[header["name"]] = header.get("value", "")
+    return headers
+
+
+def fetch_from_outlook(config):
+    """
+    Fetch new emails using Microsoft Graph API for Outlook configurations.
+
+    The inbox is synced with a delta query: the first sync reads today's
+    messages, following every @odata.nextLink page, and stores the
+    @odata.deltaLink it ends with. Later syncs resume from the stored link
+    and only receive messages added or changed since. Each page is checked
+    against existing leads with a single query.
+    """
 
-    response.raise_for_status()
-    messages = response.json().get("value", [])
+    if not config.mail.token or "access_token" not in config.mail.token:
+        raise ValueError("No valid access token found for Outlook configuration")
+
+    url = config.outlook_delta_link
+    params = None
+    if url:
+        response = get_outlook_page(config, url)
+        if response.status_code == 410:
+            # The server dropped the sync state, start over from today
+            logger.info(f"Delta sync reset for {config.mail.username}")
+            url = None
+
+    if not url:
+        # Get today's date in ISO 8601 format
+        today = datetime.now().strftime("%Y-%m-%dT00:00:00Z")
+
+        # Microsoft Graph API endpoint
+        api_endpoint = (
+            config.mail.outlook_api_endpoint or "https://graph.microsoft.com/v1.0"
+        )
+        url = f"{api_endpoint}/me/mailFolders/inbox/messages/delta"
+        params = {
+            "$filter": f"receivedDateTime ge {today}",
+            "$select": "id,subject,from,body,bodyPreview,internetMessageId,internetMessageHeaders",
+        }
+        response = get_outlook_page(config, url, params)
 
     allowed_senders = config.get_accepted_emails()
     created_count = 0
     filtered_count = 0
 
-    for msg in messages:
-        result = process_outlook_message(msg, config, allowed_senders)
-        if result == "created":
-            created_count += 1
-        elif result == "filtered":
-            filtered_count += 1
+    while True:
+        response.raise_for_status()
+        page = response.json()
+
+        # Deleted messages only carry their id and an @removed marker
+        messages = [msg for msg in page.get("value", []) if "@removed" not in msg]
+        headers = [get_outlook_headers(msg) for msg in messages]
+        known_message_ids = get_known_message_ids(headers)
+
+        for msg, msg_headers in zip(messages, headers):
+            if is_known_message(msg_headers, known_message_ids):
+                continue
+            result = process_outlook_message(msg, config, allowed_senders)
+            if result == "created":
+                created_count += 1
+                known_message_ids.add(msg_headers["Message-ID"])
+            elif result == "filtered":
+                filtered_count += 1
+
+        # A next link resumes this round, a delta link starts the next one
+        next_link = page.get("@odata.nextLink")
+        config.outlook_delta_link = next_link or page.get("@odata.deltaLink")
+        config.save(update_fields=["outlook_delta_link"])
+        if not next_link:
+            break
+        response = get_outlook_page(config, next_link)
 
     return created_count, filtered_count
 
 
-def process_email_message(msg, config, allowed_senders):
+def create_lead_from_email(msg, config):
     """
-    Process an email message from IMAP and create a Lead if needed.
-    Returns: "created", "filtered", "skipped", or False
+    Create a Lead from an IMAP email that passes the keyword filters.
+    Returns: "created" or "filtered"
     """
 
-    message_id = msg.get("Message-ID", "")
-
-    if Lead.objects.filter(email_message_id=message_id).exists():
-        return "skipped"
-
-    in_reply_to = msg.get("In-Reply-To", "")
-    references = msg.get("References", "")
-
-    # Skip if this is a reply in an existing thread
-    if check_existing_thread(in_reply_to, references):
-        return "skipped"
-
     sender = email.utils.parseaddr(msg["From"])[1]
-
-    if allowed_senders and sender.lower() not in allowed_senders:
-        return "skipped"
-
     subject = msg.get("Subject", "(No Subject)")
     body = ""
 
@@ -205,7 +375,7 @@ def process_email_message(msg, config, allowed_senders):
         lead_status=LeadStatus.objects.first(),
         company=config.company,
         lead_source="email",
-        email_message_id=message_id,
+        email_message_id=msg.get("Message-ID", ""),
     )
     return "created"
 
@@ -213,28 +383,10 @@ def process_email_message(msg, config, allowed_senders):
 def process_outlook_message(msg, config, allowed_senders):
     """
     Process an Outlook message from Microsoft Graph API and create a Lead if needed.
+    The caller skips messages that already have a lead or reply to one.
     Returns: "created", "filtered", "skipped", or False
     """
 
-    message_id = msg.get("internetMessageId", "")
-
-    if Lead.objects.filter(email_message_id=message_id).exists():
-        return "skipped"
-
-    # Extract In-Reply-To and References from headers
-    in_reply_to = ""
-    references = ""
-    headers = msg.get("internetMessageHeaders", [])
-    for header in headers:
-        if header.get("name") == "In-Reply-To":
-            in_reply_to = header.get("value", "")
-        elif header.get("name") == "References":
-            references = header.get("value", "")
-
-    # Skip if this is a reply in an existing thread
-    if check_existing_thread(in_reply_to, references):
-        return "skipped"
-
     sender = msg.get("from", {}).get("emailAddress", {}).get("address", "")
 
     if allowed_senders and sender.lower() not in allowed_senders:
@@ -262,22 +414,6 @@ def process_outlook_message(msg, config, allowed_senders):
         lead_status=LeadStatus.objects.first(),
         company=config.company,
         lead_source="email",
-        email_message_id=message_id,
+        email_message_id=msg.get("internetMessageId", ""),
     )
     return "created"
-
-
-def check_existing_thread(in_reply_to, references):
-    """Check if email is part of an existing thread."""
-
-    existing_lead = None
-    if in_reply_to:
-        existing_lead = Lead.objects.filter(email_message_id=in_reply_to).first()
-
-    if not existing_lead and references:
-        # References contains all message IDs in the thread
-        ref_ids = references.split()
-        if ref_ids:
-            existing_lead = Lead.objects.filter(email_message_id__in=ref_ids).first()
-
-    return existing_lead is not None
@@ -1,3 +1,1056 @@
-from django.test import TestCase
+"""
+Tests for leads
+"""
 
-# Create your leads tests here.
+import datetime
+import imaplib
+import json
+import re
+import socketserver
+import threading
+import time
+from base64 import b64encode
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from auditlog.models import LogEntry
+from cryptography.fernet import Fernet
+from django.contrib.auth.signals import user_logged_in
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test import TestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from login_history.models import post_login
+
+from genie_core.api.pagination import CreatedAtCursorPagination
+from genie_core.api.search import (
+    IContainsSearchBackend,
+    IndexedSearchBackend,
+    get_indexed_columns,
+    get_search_backend,
+)
+from genie_core.currency import convert_amounts
+from genie_core.models import (
+    Company,
+    HorillaUser,
+    ScoringCondition,
+    ScoringCriterion,
+    ScoringRule,
+)
+from genie_core.signals import update_all_scores_for_module
+from genie_core.utils import compute_score
+from genie_crm.leads.api.views import LeadViewSet
+from genie_crm.leads.models import EmailToLeadConfig, Lead, LeadStatus
+from genie_crm.leads.tasks import fetch_from_imap, fetch_from_outlook
+from genie_mail.encryption_utils import encrypt_password
+from genie_mail.models import HorillaMailConfiguration
+
+
+class IMAPStubHandler(socketserver.StreamRequestHandler):
+    """Minimal IMAP4rev1 dialogue over the stand-in mailbox"""
+
+    def reply(self, line):
+        self.wfile.write(line if isinstance(line, bytes) else f"{line}\r\n".encode())
+
+    def parse_uid_set(self, uid_set):
+        """Expand an IMAP sequence set of UIDs, e.g. 1:5,8"""
+        highest = max(self.server.messages, default=0)
+        uids = set()
+        for part in uid_set.split(","):
+            first, _, last = part.partition(":")
+            first = highest if first == "*" else int(first)
+            last = first if not last else highest if last == "*" else int(last)
+            uids.update(range(min(first, last), max(first, last) + 1))
+        return sorted(uid for uid in uids if uid in self.server.messages)
+
+    def fetch(self, tag, uid_set, message_parts):
+        """Answer a UID FETCH of either the lead headers or whole messages"""
+        uids = self.parse_uid_set(uid_set)
+        self.server.fetches.append((message_parts, len(uids)))
+        for seq, uid in enumerate(uids, start=1):
+            raw = self.server.messages[uid]
+            if "HEADER.FIELDS" in message_parts:
+                item = f"BODY[HEADER.FIELDS {message_parts.split('FIELDS ')[1]}"
+                data = raw.split(b"\r\n\r\n")[0] + b"\r\n\r\n"
+            else:
+                item = "RFC822"
+                data = raw
+            self.reply(f"* {seq} FETCH (UID {uid} {item} {{{len(data)}}}".encode())
+            self.reply(b"\r\n" + data + b")\r\n")
+        self.reply(f"{tag} OK FETCH completed")
+
+    def handle(self):
+        self.reply("* OK IMAP4rev1 stub ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            tag, _, command = line.decode().strip().partition(" ")
+            name = command.split(" ")[0].upper()
+            if name == "CAPABILITY":
+                self.reply("* CAPABILITY IMAP4rev1")
+                self.reply(f"{tag} OK CAPABILITY completed")
+            elif name == "STATUS":
+                self.reply(
+                    f"* STATUS inbox (UIDVALIDITY {self.server.uidvalidity} "
+                    f"UIDNEXT {max(self.server.messages, default=0) + 1})"
+                )
+                self.reply(f"{tag} OK STATUS completed")
+            elif name == "SELECT":
+                self.reply(f"* {len(self.server.messages)} EXISTS")
+                self.reply(f"* OK [UIDVALIDITY {self.server.uidvalidity}] UIDs valid")
+                self.reply(f"{tag} OK [READ-WRITE] SELECT completed")
+            elif command.upper().startswith("UID SEARCH"):
+                criteria = command[len("UID SEARCH ") :]
+                self.server.searches.append(criteria)
+                if criteria.upper().startswith("UID "):
+                    uids = self.parse_uid_set(criteria[4:])
+                else:
+                    uids = sorted(self.server.messages)
+                self.reply("* SEARCH " + " ".join(map(str, uids)))
+                self.reply(f"{tag} OK SEARCH completed")
+            elif command.upper().startswith("UID FETCH"):
+                uid_set, message_parts = command[len("UID FETCH ") :].split(" ", 1)
+                self.fetch(tag, uid_set, message_parts)
+            elif name == "LOGOUT":
+                self.reply("* BYE logging out")
+                self.reply(f"{tag} OK LOGOUT completed")
+                return
+            else:
+                self.reply(f"{tag} OK {name} completed")
+
+
+class IMAPStubServer(socketserver.ThreadingTCPServer):
+    """Local IMAP stand-in serving an inbox of messages by UID"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), IMAPStubHandler)
+        self.uidvalidity = 1
+        self.messages = {}
+        self.searches = []
+        self.fetches = []
+
+    def add_message(self, index, subject, sender=None, in_reply_to=None):
+        """Append a message to the inbox under the next UID"""
+        headers = [
+            f"From: {sender or f'customer{index}@example.com'}",
+            f"Subject: {subject}",
+            f"Message-ID: <msg{index}@example.com>",
+        ]
+        if in_reply_to:
+            headers.append(f"In-Reply-To: {in_reply_to}")
+        raw = "\r\n".join(headers) + f"\r\n\r\nBody of message {index}\r\n"
+        self.messages[max(self.messages, default=0) + 1] = raw.encode()
+
+
+@override_settings(FIELD_ENCRYPTION_KEY=Fernet.generate_key().decode())
+class EmailToLeadIMAPSyncTests(TestCase):
+    """Test that mail to lead only fetches new inbox messages"""
+
+    def setUp(self):
+        """Set up a 10k message inbox and a mail to lead configuration"""
+        self.server = IMAPStubServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        patcher = mock.patch("genie_crm.leads.tasks.imaplib.IMAP4_SSL", imaplib.IMAP4)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # Every tenth message asks for pricing, the rest are filtered out
+        for index in range(10000):
+            subject = "Pricing enquiry" if index % 10 == 0 else "Newsletter"
+            self.server.add_message(index, subject)
+
+        LeadStatus.objects.create(name="New", probability=Decimal("10"))
+        owner = HorillaUser.objects.create_user(
+            username="owner", email="owner@example.com", password="password123"
+        )
+        mail = HorillaMailConfiguration.objects.create(
+            type="mail",
+            mail_channel="incoming",
+            host="127.0.0.1",
+            port=self.server.server_address[1],
+            username="inbox@example.com",
+            password=encrypt_password("secret"),
+        )
+        self.config = EmailToLeadConfig.objects.create(
+            mail=mail, lead_owner=owner, keywords="pricing"
+        )
+
+    def test_initial_sync_batches_header_fetches(self):
+        """Test 10k messages are synced with batched fetches and lookups"""
+        lookups = []
+
+        def record_lookups(execute, sql, params, many, context):
+            if re.search(r'"email_message_id" (IN \(|=)', sql):
+                lookups.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record_lookups):
+            created, filtered = fetch_from_imap(self.config)
+
+        self.assertEqual((created, filtered), (1000, 9000))
+        self.assertEqual(Lead.objects.filter(lead_source="email").count(), 1000)
+        self.config.refresh_from_db()
+        self.assertEqual(self.config.imap_uidvalidity, 1)
+        self.assertEqual(self.config.imap_last_uid, 10000)
+
+        header_fetches = [f for f in self.server.fetches if "HEADER" in f[0]]
+        self.assertEqual(len(header_fetches), 20)
+        # Every message is fetched once for headers and once in full
+        self.assertEqual(sum(count for _, count in self.server.fetches), 20000)
+        # One Message-ID lookup per batch, none per message
+        self.assertEqual(len(lookups), 20)
+
+    def test_next_sync_fetches_only_new_uids(self):
+        """Test a later sync only asks for UIDs above the last one seen"""
+        fetch_from_imap(self.config)
+        self.server.fetches.clear()
+        self.server.add_message(10000, "Pricing for 20 seats")
+        self.server.add_message(
+            10001, "Re: Pricing enquiry", in_reply_to="<msg0@example.com>"
+        )
+
+        created, _ = fetch_from_imap(self.config)
+
+        self.assertEqual(created, 1)
+        self.assertEqual(self.server.searches[-1], "UID 10001:*")
+        self.assertEqual(
+            self.server.fetches,
+            [
+                (f"(BODY.PEEK[HEADER.FIELDS {self.header_fields()}])", 2),
+                ("(RFC822)", 1),
+            ],
+        )
+        self.config.refresh_from_db()
+        self.assertEqual(self.config.imap_last_uid, 10002)
+
+        # Nothing new: no search and no fetch at all
+        searches = len(self.server.searches)
+        self.assertEqual(fetch_from_imap(self.config), (0, 0))
+        self.assertEqual(len(self.server.searches), searches)
+
+    def test_uidvalidity_change_resyncs_without_duplicates(self):
+        """Test a renumbered inbox is searched again but no lead is duplicated"""
+        fetch_from_imap(self.config)
+        self.server.uidvalidity = 2
+        self.server.add_message(10000, "Pricing for 20 seats")
+
+        created, _ = fetch_from_imap(self.config)
+
+        self.assertEqual(created, 1)
+        self.assertTrue(self.server.searches[-1].startswith("(SINCE"))
+        self.assertEqual(Lead.objects.count(), 1001)
+        self.config.refresh_from_db()
+        self.assertEqual(self.config.imap_uidvalidity, 2)
+
+    @staticmethod
+    def header_fields():
+        """Header fields the sync asks the server for"""
+        return "(MESSAGE-ID IN-REPLY-TO REFERENCES FROM)"
+
+
+class GraphStubHandler(BaseHTTPRequestHandler):
+    """Answer Microsoft Graph inbox delta queries from the stand-in mailbox"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.server.requests.append(query)
+
+        if self.headers.get("Authorization") != f"Bearer {self.server.token}":
+            return self.send_json(
+                401, {"error": {"code": "InvalidAuthenticationToken"}}
+            )
+        if url.path != "/v1.0/me/mailFolders/inbox/messages/delta":
+            return self.send_json(404, {"error": {"code": "ResourceNotFound"}})
+
+        if "$skiptoken" in query:
+            since, offset = map(int, query["$skiptoken"].split("."))
+        else:
+            since, offset = int(query.get("$deltatoken", 0)), 0
+        if "$deltatoken" in query and since < self.server.expired_before:
+            return self.send_json(410, {"error": {"code": "SyncStateNotFound"}})
+
+        page_size = int(self.headers.get("Prefer", "=100").split("=")[1])
+        changed = list(dict.fromkeys(self.server.changes[since:]))
+        page = changed[offset : offset + page_size]
+        base = f"http://{self.headers['Host']}{url.path}"
+        payload = {"value": [self.server.messages[id] for id in page]}
+        if offset + page_size < len(changed):
+            payload["@odata.nextLink"] = (
+                f"{base}?$skiptoken={since}.{offset + page_size}"
+            )
+        else:
+            payload["@odata.deltaLink"] = (
+                f"{base}?$deltatoken={len(self.server.changes)}"
+            )
+        self.send_json(200, payload)
+
+
+class GraphStubServer(ThreadingHTTPServer):
+    """Local Microsoft Graph stand-in keeping a change log of the inbox"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), GraphStubHandler)
+        self.token = "access-token"
+        self.messages = {}
+        self.changes = []
+        self.requests = []
+        self.expired_before = 0
+
+    def add_message(self, index, subject):
+        """Add or change a message, logging it as changed"""
+        message_id = f"AAMk{index}"
+        self.messages[message_id] = {
+            "id": message_id,
+            "subject": subject,
+            "from": {"emailAddress": {"address": f"customer{index}@example.com"}},
+            "body": {"content": f"Body of message {index}"},
+            "internetMessageId": f"<graph{index}@example.com>",
+        }
+        self.changes.append(message_id)
+
+    def remove_message(self, index):
+        """Delete a message, logging it as removed"""
+        message_id = f"AAMk{index}"
+        self.messages[message_id] = {
+            "id": message_id,
+            "@removed": {"reason": "deleted"},
+        }
+        self.changes.append(message_id)
+
+
+class EmailToLeadOutlookSyncTests(TestCase):
+    """Test that Outlook mail to lead follows Graph delta pages"""
+
+    def setUp(self):
+        """Set up a 250 message Outlook inbox and its mail to lead configuration"""
+        self.server = GraphStubServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        for index in range(250):
+            subject = "Pricing enquiry" if index % 10 == 0 else "Newsletter"
+            self.server.add_message(index, subject)
+
+        LeadStatus.objects.create(name="New", probability=Decimal("10"))
+        mail = HorillaMailConfiguration.objects.create(
+            type="outlook",
+            mail_channel="incoming",
+            username="inbox@example.com",
+            token={"access_token": self.server.token},
+            outlook_api_endpoint=(
+                f"http://127.0.0.1:{self.server.server_address[1]}/v1.0"
+            ),
+        )
+        owner = HorillaUser.objects.create_user(
+            username="owner", email="owner@example.com", password="password123"
+        )
+        self.config = EmailToLeadConfig.objects.create(
+            mail=mail, lead_owner=owner, keywords="pricing"
+        )
+
+    def test_initial_sync_follows_next_links(self):
+        """Test every page of the first round is read and the delta link kept"""
+        created, filtered = fetch_from_outlook(self.config)
+
+        self.assertEqual((created, filtered), (25, 225))
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertIn("receivedDateTime ge", self.server.requests[0]["$filter"])
+        self.config.refresh_from_db()
+        self.assertTrue(self.config.outlook_delta_link.endswith("$deltatoken=250"))
+
+    def test_delta_sync_processes_only_changes(self):
+        """Test a later sync reads only changed messages and skips known leads"""
+        fetch_from_outlook(self.config)
+        self.server.requests.clear()
+        self.server.add_message(0, "Pricing enquiry (read)")
+        self.server.add_message(250, "Pricing for 20 seats")
+        self.server.add_message(251, "Newsletter")
+        self.server.remove_message(3)
+
+        created, filtered = fetch_from_outlook(self.config)
+
+        self.assertEqual((created, filtered), (1, 1))
+        self.assertEqual(self.server.requests, [{"$deltatoken": "250"}])
+        self.assertEqual(Lead.objects.count(), 26)
+        self.assertEqual(fetch_from_outlook(self.config), (0, 0))
+
+    def test_expired_delta_link_restarts_sync(self):
+        """Test a dropped sync state restarts from today without duplicates"""
+        fetch_from_outlook(self.config)
+        self.server.expired_before = len(self.server.changes) + 1
+
+        created, _ = fetch_from_outlook(self.config)
+
+        self.assertEqual(created, 0)
+        self.assertEqual(Lead.objects.count(), 25)
+        self.config.refresh_from_db()
+        self.assertTrue(self.config.outlook_delta_link.endswith("$deltatoken=250"))
+
+
+class LeadApiPaginationTests(TestCase):
+    """Test the lead API pages by cursor and serializes sparse fieldsets"""
+
+    url = "/api/crm/leads/leads/"
+
+    def setUp(self):
+        """Set up a company member owning the leads"""
+        self.company = Company.objects.bulk_create(
+            [
+                Company(
+                    name="Acme",
+                    email="acme@example.com",
+                    contact_number="123",
+                    no_of_employees=10,
+                    city="Kochi",
+                    state="Kerala",
+                    country="IN",
+                    zip_code="682001",
+                )
+            ]
+        )[0]
+        self.user = HorillaUser.objects.create_user(
+            username="owner",
+            email="owner@example.com",
+            password="password123",
+            company=self.company,
+        )
+        self.status = LeadStatus.objects.create(name="New", probability=Decimal("10"))
+        self.now = timezone.now()
+
+        user_logged_in.disconnect(post_login)
+        self.addCleanup(user_logged_in.connect, post_login)
+        self.client.force_login(self.user)
+
+    def insert_leads(self, count):
+        """Insert leads created three per second, newest first"""
+        template = Lead(
+            company=self.company,
+            lead_owner=self.user,
+            lead_status=self.status,
+            first_name="Lead",
+            last_name="Test",
+            email="lead@example.com",
+            lead_company="Acme",
+            created_by=self.user,
+            updated_by=self.user,
+        )
+        fields = [
+            field for field in Lead._meta.concrete_fields if not field.primary_key
+        ]
+        values = [
+            field.get_db_prep_save(getattr(template, field.attname), connection)
+            for field in fields
+        ]
+        created = [field.name for field in fields].index("created_at")
+        columns = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+        placeholders = ", ".join(["%s"] * len(fields))
+
+        rows = []
+        for index in range(count):
+            row = list(values)
+            row[created] = connection.ops.adapt_datetimefield_value(
+                self.now - datetime.timedelta(seconds=index // 3)
+            )
+            rows.append(row)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {Lead._meta.db_table} ({columns}) VALUES ({placeholders})",
+                rows,
+            )
+
+    def get_page(self, url):
+        """Fetch a page and return its body and lead page queries"""
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # Leaving out the aggregate query behind the list ETag
+        queries = [
+            query["sql"]
+            for query in ctx.captured_queries
+            if f'FROM "{Lead._meta.db_table}"' in query["sql"]
+            and "MAX(" not in query["sql"]
+        ]
+        return response.json(), queries
+
+    def deep_cursor_url(self, lead):
+        """The URL of the page following a lead, as a next link would hold it"""
+        pagination = CreatedAtCursorPagination()
+        position = pagination._get_position_from_instance(lead, pagination.ordering)
+        cursor = b64encode(urlencode({"p": position}).encode()).decode()
+        return f"{self.url}?{urlencode({'cursor': cursor, 'page_size': 100})}"
+
+    def test_cursor_pages_walk_every_lead_once(self):
+        """Test next and previous links cover the leads in order despite ties"""
+        self.insert_leads(45)
+        expected = list(
+            Lead.objects.order_by("-created_at", "-id").values_list("id", flat=True)
+        )
+
+        pages = []
+        url = f"{self.url}?page_size=10"
+        while url:
+            body, queries = self.get_page(url)
+            self.assertEqual(len(queries), 1)
+            self.assertNotIn("COUNT(", queries[0])
+            self.assertNotIn("OFFSET", queries[0])
+            pages.append([lead["id"] for lead in body["results"]])
+            url = body["next"]
+        self.assertEqual([pk for page in pages for pk in page], expected)
+        self.assertEqual(len(pages), 5)
+
+        url = body["previous"]
+        for page in reversed(pages[:-1]):
+            body, _ = self.get_page(url)
+            self.assertEqual([lead["id"] for lead in body["results"]], page)
+            url = body["previous"]
+        self.assertIsNone(url)
+
+    def test_sparse_fieldset_reads_only_its_columns(self):
+        """Test ?fields= narrows the response and the selected columns"""
+        self.insert_leads(30)
+        body, queries = self.get_page(
+            f"{self.url}?fields=id,first_name,lead_owner_details&page_size=30"
+        )
+        self.assertEqual(len(body["results"]), 30)
+        self.assertEqual(
+            set(body["results"][0]), {"id", "first_name", "lead_owner_details"}
+        )
+        self.assertEqual(body["results"][0]["lead_owner_details"]["username"], "owner")
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"requirements"', queries[0])
+        self.assertIn(f'JOIN "{HorillaUser._meta.db_table}"', queries[0])
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(f"{self.url}?page_size=30")
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(f"{self.url}?page_size=5")
+        # Owners and statuses are joined, not fetched row by row
+        self.assertEqual(len(ctx.captured_queries), len(few.captured_queries))
+
+    def test_deep_pages_use_the_keyset(self):
+        """Test pages deep into the leads cost one keyset query to the end"""
+        self.insert_leads(600)
+        leads = Lead.objects.order_by("-created_at", "-id")
+        expected = list(leads.values_list("id", flat=True))
+        for position in [299, 499]:
+            url = self.deep_cursor_url(leads[position])
+            seen = []
+            while url:
+                body, queries = self.get_page(url)
+                self.assertEqual(len(queries), 1)
+                self.assertNotIn("OFFSET", queries[0])
+                self.assertNotIn("COUNT(", queries[0])
+                seen.extend(lead["id"] for lead in body["results"])
+                url = body["next"]
+            self.assertEqual(seen, expected[position + 1 :])
+
+    @tag("benchmark")
+    def test_paging_through_a_million_leads(self):
+        """Test pages deep into 1M leads cost one query as fast as the first"""
+        self.insert_leads(1000000)
+        leads = Lead.objects.order_by("-created_at", "-id")
+        timings = {}
+        for name, url in [
+            ("first", f"{self.url}?page_size=100"),
+            ("middle", self.deep_cursor_url(leads[499999])),
+            ("last", self.deep_cursor_url(leads[999899])),
+        ]:
+            start = time.perf_counter()
+            pages = 0
+            while url and pages < 10:
+                body, queries = self.get_page(url)
+                self.assertEqual(len(queries), 1)
+                self.assertNotIn("OFFSET", queries[0])
+                url = body["next"]
+                pages += 1
+            timings[name] = (time.perf_counter() - start) / pages
+
+        self.assertIsNone(url)
+        self.assertEqual(len(body["results"]), 100)
+        self.assertEqual(body["results"][-1]["id"], leads.last().id)
+        self.assertLess(max(timings.values()), 1)
+
+
+class LeadApiConditionalGetTests(TestCase):
+    """Test the lead API answers matching If-None-Match with 304"""
+
+    url = "/api/crm/leads/leads/"
+
+    def setUp(self):
+        """Set up a company member and three of their leads"""
+        self.user = HorillaUser.objects.create_user(
+            username="owner", email="owner@example.com", password="password123"
+        )
+        self.status = LeadStatus.objects.create(name="New", probability=Decimal("10"))
+        self.leads = [self.create_lead(index) for index in range(3)]
+
+        user_logged_in.disconnect(post_login)
+        self.addCleanup(user_logged_in.connect, post_login)
+        self.client.force_login(self.user)
+
+    def create_lead(self, index):
+        return Lead.objects.create(
+            lead_owner=self.user,
+            lead_status=self.status,
+            first_name=f"Lead {index}",
+            last_name="Test",
+            email=f"lead{index}@example.com",
+            lead_company="Acme",
+        )
+
+    def get(self, url, etag=None):
+        """Fetch the URL, conditionally when an ETag is given"""
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, **headers)
+        lead_queries = [
+            query["sql"]
+            for query in ctx.captured_queries
+            if f'FROM "{Lead._meta.db_table}"' in query["sql"]
+        ]
+        return response, lead_queries
+
+    def test_unchanged_list_and_detail_answer_304(self):
+        """Test a matching ETag gets 304 after one query and no body"""
+        detail_url = f"{self.url}{self.leads[0].pk}/"
+        for url in [self.url, detail_url, f"{self.url}?fields=id,first_name"]:
+            response, _ = self.get(url)
+            self.assertEqual(response.status_code, 200)
+            etag = response["ETag"]
+            self.assertTrue(etag.startswith('W/"'))
+
+            response, queries = self.get(url, etag)
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response["ETag"], etag)
+            self.assertEqual(response.content, b"")
+            self.assertEqual(len(queries), 1)
+
+            response, _ = self.get(url, 'W/"stale"')
+            self.assertEqual(response.status_code, 200)
+
+        list_etag = self.get(self.url)[0]["ETag"]
+        self.assertNotEqual(self.get(f"{self.url}?page_size=2")[0]["ETag"], list_etag)
+
+    def test_writes_invalidate_etags(self):
+        """Test updates, creates, deletes and bulk updates change the ETags"""
+        detail_url = f"{self.url}{self.leads[0].pk}/"
+        other_url = f"{self.url}{self.leads[1].pk}/"
+        list_etag = self.get(self.url)[0]["ETag"]
+        detail_etag = self.get(detail_url)[0]["ETag"]
+        other_etag = self.get(other_url)[0]["ETag"]
+
+        response = self.client.patch(
+            detail_url, {"title": "CTO"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        response, _ = self.get(detail_url, detail_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["title"], "CTO")
+        self.assertEqual(self.get(other_url, other_etag)[0].status_code, 304)
+        response, _ = self.get(self.url, list_etag)
+        self.assertEqual(response.status_code, 200)
+
+        for write in [
+            lambda: self.create_lead(3),
+            lambda: self.leads[2].delete(),
+            lambda: self.client.post(
+                f"{self.url}bulk_update/",
+                {"ids": [self.leads[1].pk], "data": {"title": "CEO"}},
+                content_type="application/json",
+            ),
+        ]:
+            list_etag = self.get(self.url)[0]["ETag"]
+            write()
+            response, _ = self.get(self.url, list_etag)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get(other_url, other_etag)[0].status_code, 200)
+
+    def test_bulk_writes_outside_the_api_invalidate_etags(self):
+        """Test list view bulk updates, scoring and conversions change ETags"""
+        self.user.is_superuser = True
+        self.user.save()
+        won = LeadStatus.objects.create(name="Won", probability=Decimal("100"))
+        detail_url = f"{self.url}{self.leads[0].pk}/"
+
+        for write in [
+            lambda: self.client.post(
+                reverse("leads:leads_list"),
+                {
+                    "record_ids": json.dumps([self.leads[0].pk]),
+                    "bulk_update_value_lead_status": str(won.pk),
+                },
+                HTTP_HX_REQUEST="true",
+            ),
+            lambda: update_all_scores_for_module("lead"),
+            lambda: convert_amounts(
+                Lead.objects.all(), ["annual_revenue"], Decimal("2")
+            ),
+        ]:
+            list_etag = self.get(self.url)[0]["ETag"]
+            detail_etag = self.get(detail_url)[0]["ETag"]
+            write()
+            self.assertEqual(self.get(self.url, list_etag)[0].status_code, 200)
+            self.assertEqual(self.get(detail_url, detail_etag)[0].status_code, 200)
+        self.assertEqual(Lead.objects.get(pk=self.leads[0].pk).lead_status, won)
+
+
+class LeadApiBulkTests(TestCase):
+    """Test bulk lead payloads are validated and written set-based"""
+
+    url = "/api/crm/leads/leads/"
+
+    def setUp(self):
+        """Set up owners, statuses and a rule scoring website leads"""
+        self.users = [
+            HorillaUser.objects.create_user(
+                username=f"owner{index}",
+                email=f"owner{index}@example.com",
+                password="password123",
+            )
+            for index in range(3)
+        ]
+        self.statuses = [
+            LeadStatus.objects.create(name=name, probability=Decimal("10"))
+            for name in ["New", "Working"]
+        ]
+        rule = ScoringRule.objects.create(name="Web", module="lead")
+        criterion = ScoringCriterion.objects.create(
+            rule=rule, points=15, operation_type="add", order=1
+        )
+        ScoringCondition.objects.create(
+            criterion=criterion,
+            field="lead_source",
+            operator="equals",
+            value="website",
+            order=1,
+        )
+
+        user_logged_in.disconnect(post_login)
+        self.addCleanup(user_logged_in.connect, post_login)
+        self.client.force_login(self.users[0])
+
+    def item(self, index):
+        return {
+            "first_name": f"Lead {index}",
+            "last_name": "Test",
+            "email": f"lead{index}@example.com",
+            "lead_company": "Acme",
+            "lead_source": ["website", "referral"][index % 2],
+            "industry": "finance",
+            "lead_owner": self.users[index % 3].pk,
+            "lead_status": self.statuses[index % 2].pk,
+        }
+
+    def post(self, action, payload):
+        """Post a bulk payload and return the response and its queries"""
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                f"{self.url}{action}/", payload, content_type="application/json"
+            )
+        return response, [query["sql"] for query in ctx.captured_queries]
+
+    def test_invalid_items_are_reported_by_index(self):
+        """Test valid items are written and each invalid one gets its errors"""
+        items = [self.item(index) for index in range(5)]
+        items[1]["lead_owner"] = 999999
+        del items[3]["first_name"]
+        items[4]["lead_status"] = "x"
+
+        response, _ = self.post("bulk_create", items)
+        self.assertEqual(response.status_code, 207)
+        body = response.json()
+        self.assertEqual(body["created_count"], 2)
+        self.assertEqual([error["index"] for error in body["errors"]], [1, 3, 4])
+        self.assertIn("lead_owner", body["errors"][0]["errors"])
+        self.assertIn("first_name", body["errors"][1]["errors"])
+        self.assertIn("lead_status", body["errors"][2]["errors"])
+
+        lead = Lead.objects.get(pk=body["ids"][0])
+        self.assertEqual(lead.lead_owner, self.users[0])
+        self.assertEqual(lead.lead_score, compute_score(lead))
+        self.assertEqual(lead.lead_score, 15)
+
+        response, _ = self.post("bulk_create", {"items": [items[3]]})
+        self.assertEqual(response.status_code, 400)
+
+        response, _ = self.post(
+            "bulk_update",
+            {"items": [{"id": body["ids"][0], "email": "bad"}, {"id": 0}]},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.json()["errors"]), 2)
+
+    def test_database_errors_are_reported_by_index(self):
+        """Test items breaking a unique constraint are reported, not a 500"""
+        items = [self.item(index) for index in range(4)]
+        for item, message_id in zip(items, ["a", "b", "a", "c"]):
+            item["email_message_id"] = message_id
+
+        response, _ = self.post("bulk_create", items)
+        self.assertEqual(response.status_code, 207)
+        body = response.json()
+        self.assertEqual(body["created_count"], 3)
+        self.assertEqual([error["index"] for error in body["errors"]], [2])
+        self.assertIn("non_field_errors", body["errors"][0]["errors"])
+        self.assertEqual(
+            sorted(Lead.objects.values_list("email_message_id", flat=True)),
+            ["a", "b", "c"],
+        )
+        self.assertEqual(
+            Lead.objects.get(email_message_id="b").lead_score,
+            compute_score(Lead.objects.get(email_message_id="b")),
+        )
+
+    def test_ten_thousand_item_payloads(self):
+        """Test 10k item creates and updates take a fixed number of queries"""
+        response, create_queries = self.post(
+            "bulk_create", [self.item(index) for index in range(10000)]
+        )
+        self.assertEqual(response.status_code, 201)
+        ids = response.json()["ids"]
+        self.assertEqual(len(ids), 10000)
+        self.assertEqual(Lead.objects.count(), 10000)
+
+        updates = [
+            {
+                "id": pk,
+                "title": f"Title {index}",
+                "lead_source": "website",
+                "lead_owner": self.users[(index + 1) % 3].pk,
+            }
+            for index, pk in enumerate(ids)
+        ]
+        response, update_queries = self.post("bulk_update", {"items": updates})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["updated_count"], 10000)
+
+        # Rows and their audit log entries are written in batches of at
+        # most 1000, as many as the backend takes in one statement; related
+        # ids are looked up once per model; rows to update, score UPDATEs
+        # and the days of the dashboard rollups to rebuild take a query per
+        # 1000 rows
+        def batch_size(model):
+            fields = [
+                field for field in model._meta.concrete_fields if not field.primary_key
+            ]
+            return min(1000, connection.ops.bulk_batch_size(fields, []))
+
+        update_batch = min(1000, connection.ops.bulk_batch_size(["pk", "pk"] * 5, []))
+        for queries, batch in [
+            (create_queries, batch_size(Lead)),
+            (update_queries, update_batch),
+        ]:
+            writes = [
+                sql
+                for sql in queries
+                if sql.startswith('INSERT INTO "leads_lead"')
+                or sql.startswith('UPDATE "leads_lead"')
+                and 'SET "lead_score"' not in sql
+            ]
+            logs = [
+                sql
+                for sql in queries
+                if sql.startswith(f'INSERT INTO "{LogEntry._meta.db_table}"')
+            ]
+            self.assertLessEqual(len(writes), -(-10000 // batch))
+            self.assertLessEqual(len(logs), -(-10000 // batch_size(LogEntry)))
+            self.assertLess(
+                len(queries) - len(writes) - len(logs), 30 + 3 * 10000 // 1000
+            )
+
+        history = LogEntry.objects.filter(
+            content_type=ContentType.objects.get_for_model(Lead)
+        )
+        self.assertEqual(history.filter(action=LogEntry.Action.CREATE).count(), 10000)
+        self.assertEqual(history.filter(action=LogEntry.Action.UPDATE).count(), 10000)
+        self.assertEqual(
+            history.filter(object_pk=str(ids[1]), action=LogEntry.Action.UPDATE)
+            .get()
+            .changes["title"][1],
+            "Title 1",
+        )
+
+        lead = Lead.objects.get(pk=ids[1])
+        self.assertEqual(lead.title, "Title 1")
+        self.assertEqual(lead.lead_owner, self.users[2])
+        self.assertEqual(lead.lead_status, self.statuses[1])
+        self.assertEqual(lead.lead_score, 15)
+        self.assertEqual(Lead.objects.filter(lead_score=15).count(), 10000)
+
+
+class LeadApiSearchTests(TestCase):
+    """Test the lead API search reads the trigram index like icontains"""
+
+    url = "/api/crm/leads/leads/"
+
+    def setUp(self):
+        """Set up an owner and the index column cache of the test database"""
+        get_indexed_columns.cache_clear()
+        self.addCleanup(get_indexed_columns.cache_clear)
+        self.user = HorillaUser.objects.create_user(
+            username="owner", email="owner@example.com", password="password123"
+        )
+        self.status = LeadStatus.objects.create(name="New", probability=Decimal("10"))
+
+        user_logged_in.disconnect(post_login)
+        self.addCleanup(user_logged_in.connect, post_login)
+        self.client.force_login(self.user)
+
+    def create_lead(self, first_name, lead_company, city="Kochi"):
+        return Lead.objects.create(
+            first_name=first_name,
+            last_name="Test",
+            email=f"{first_name.lower()}@example.com",
+            lead_company=lead_company,
+            city=city,
+            industry="finance",
+            lead_owner=self.user,
+            lead_status=self.status,
+        )
+
+    def insert_leads(self, count):
+        """Insert leads with distinct names and emails in one statement"""
+        template = Lead(
+            lead_owner=self.user,
+            lead_status=self.status,
+            last_name="Test",
+            lead_company="Acme",
+            city="Kochi",
+            industry="finance",
+        )
+        fields = [
+            field for field in Lead._meta.concrete_fields if not field.primary_key
+        ]
+        names = [field.name for field in fields]
+        values = [
+            field.get_db_prep_save(getattr(template, field.attname), connection)
+            for field in fields
+        ]
+        columns = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+        placeholders = ", ".join(["%s"] * len(fields))
+
+        rows = []
+        for index in range(count):
+            row = list(values)
+            row[names.index("first_name")] = f"Lead{index}"
+            row[names.index("email")] = f"lead{index}@example.com"
+            rows.append(row)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {Lead._meta.db_table} ({columns}) VALUES ({placeholders})",
+                rows,
+            )
+
+    def search(self, backend, term):
+        queryset = Lead.objects.order_by("pk")
+        return list(
+            get_search_backend(backend)
+            .filter_queryset(queryset, LeadViewSet.search_fields, term)
+            .values_list("pk", flat=True)
+        )
+
+    def test_indexed_search_matches_icontains(self):
+        """Test the index returns the icontains rows and stays in sync"""
+        for index, (name, company) in enumerate(
+            [
+                ("Anna", "Acme Corp"),
+                ("Brian", 'The "Quoted" Co'),
+                ("Chris", "ACME labs"),
+                ("Dana", "100% Natural"),
+                ("Eve", "Kochi Traders"),
+            ]
+        ):
+            self.create_lead(name, company, city=["Kochi", "Pune"][index % 2])
+        terms = ["acme", "ACME CO", '"quoted"', "100%", "kochi", "ch", "none here"]
+
+        def compare():
+            for term in terms:
+                self.assertEqual(
+                    self.search(IndexedSearchBackend, term),
+                    self.search(IContainsSearchBackend, term),
+                    term,
+                )
+
+        compare()
+        self.assertEqual(len(self.search(IndexedSearchBackend, "acme")), 2)
+
+        lead = Lead.objects.get(first_name="Eve")
+        lead.lead_company = "Acme Retail"
+        lead.save()
+        Lead.objects.filter(first_name="Anna").delete()
+        compare()
+        self.assertEqual(len(self.search(IndexedSearchBackend, "acme")), 2)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f"{self.url}?search=ACME")
+        self.assertEqual(len(response.json()["results"]), 2)
+        self.assertTrue(
+            any(" MATCH " in query["sql"] for query in ctx.captured_queries)
+        )
+
+    def test_missing_index_falls_back_to_icontains(self):
+        """Test a table without its sync triggers is searched with icontains"""
+        self.create_lead("Anna", "Acme Corp")
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER "{Lead._meta.db_table}_search_update"')
+        get_indexed_columns.cache_clear()
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(len(self.search(IndexedSearchBackend, "acme")), 1)
+        self.assertFalse(
+            any(" MATCH " in query["sql"] for query in ctx.captured_queries)
+        )
+
+    def test_indexed_columns_are_checked_again_after_the_ttl(self):
+        """Test a dropped index is noticed once the cached columns expire"""
+        table = Lead._meta.db_table
+        self.assertIn("lead_company", get_indexed_columns("default", table))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER "{table}_search_update"')
+        self.assertIn("lead_company", get_indexed_columns("default", table))
+
+        with mock.patch("genie_core.api.search.API_SEARCH_INDEX_TTL", 0):
+            self.assertEqual(get_indexed_columns("default", table), frozenset())
+
+    @tag("benchmark")
+    def test_search_benchmark_against_icontains(self):
+        """Test a search over 200k leads is faster from the index"""
+        self.insert_leads(200000)
+        self.create_lead("Needle", "Zyxwv Holdings")
+        timings = {}
+        for backend in [IContainsSearchBackend, IndexedSearchBackend]:
+            with mock.patch.object(LeadViewSet, "search_backend", backend):
+                start = time.perf_counter()
+                for _ in range(5):
+                    response = self.client.get(f"{self.url}?search=zyxwv")
+                timings[backend] = (time.perf_counter() - start) / 5
+            self.assertEqual(len(response.json()["results"]), 1)
+
+        self.assertLess(
+            timings[IndexedSearchBackend], timings[IContainsSearchBackend] / 5
+        )
@@ -11,7 +11,11 @@ from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from genie_core.api.mixins import BulkOperationsMixin, SearchFilterMixin
+from genie_core.api.mixins import (
+    BulkOperationsMixin,
+    ConditionalGetMixin,
+    SearchFilterMixin,
+)
 from genie_core.api.permissions import IsCompanyMember, IsOwnerOrAdmin
 from genie_crm.opportunities.api.serializers import (
     BigDealAlertSerializer,
@@ -51,7 +55,12 @@ class OpportunityStageViewSet(
     filterset_fields = ["stage_type", "is_final", "company"]
 
 
-class OpportunityViewSet(SearchFilterMixin, BulkOperationsMixin, viewsets.ModelViewSet):
+class OpportunityViewSet(
+    ConditionalGetMixin,
+    SearchFilterMixin,
+    BulkOperationsMixin,
+    viewsets.ModelViewSet,
+):
     """ViewSet for Opportunity model"""
 
     queryset = Opportunity.objects.all()
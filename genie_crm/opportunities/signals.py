@@ -11,6 +11,7 @@ from django.db import models
 from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
 
+from genie_core.currency import convert_currency_fields
 from genie_core.models import HorillaUser
 from genie_core.signals import company_currency_changed
 from genie_crm.opportunities.models import (
@@ -31,39 +32,13 @@ def update_crm_on_currency_change(sender, **kwargs):
     """
     Updates Opportunity amounts when a company's currency changes.
     """
-    company = kwargs.get("company")
-    conversion_rate = kwargs.get("conversion_rate")
-
-    opportunities_to_update = []
-    opportunities = (
-        Opportunity.objects.filter(company=company)
-        .select_related()
-        .only("id", "amount", "expected_revenue")
+    convert_currency_fields(
+        Opportunity,
+        {"company": kwargs.get("company")},
+        ["amount", "expected_revenue"],
+        kwargs.get("conversion_rate"),
     )
 
-    for opportunity in opportunities:
-        needs_update = False
-
-        if opportunity.amount is not None:
-            opportunity.amount = opportunity.amount * conversion_rate
-            needs_update = True
-
-        if opportunity.expected_revenue is not None:
-            opportunity.expected_revenue = (
-                opportunity.expected_revenue * conversion_rate
-            )
-            needs_update = True
-
-        if needs_update:
-            opportunities_to_update.append(opportunity)
-
-    if opportunities_to_update:
-        Opportunity.objects.bulk_update(
-            opportunities_to_update,
-            ["amount", "expected_revenue"],
-            batch_size=1000,
-        )
-
 
 @receiver(post_save, sender=HorillaUser)
 def create_opportunity_shortcuts(sender, instance, created, **kwargs):
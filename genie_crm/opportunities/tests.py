@@ -1,3 +1,363 @@
+"""
+Tests for opportunities
+"""
+
+import datetime
+import random
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.signals import user_logged_in
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from login_history.models import post_login
+
+from genie_core import currency
+from genie_core.models import (
+    Company,
+    DatedConversionRate,
+    FiscalYear,
+    FiscalYearInstance,
+    HorillaUser,
+    MultipleCurrency,
+    Period,
+    Quarter,
+)
+from genie_core.signals import company_currency_changed
+from genie_core.tasks import convert_currency_amounts
+from genie_crm.forecast.models import Forecast, ForecastType
+from genie_crm.opportunities.models import Opportunity, OpportunityStage
+
+# Old default rates; the amounts are multiplied by 1 / old rate
+OLD_RATES = ["0.85", "83.12", "1.25", "0.0123", "3.6725"]
+
+
+def legacy_convert(company, conversion_rate):
+    """The row by row conversion the set-based UPDATE replaced"""
+    opportunities = list(
+        Opportunity.objects.filter(company=company).only(
+            "id", "amount", "expected_revenue"
+        )
+    )
+    for opportunity in opportunities:
+        if opportunity.amount is not None:
+            opportunity.amount = opportunity.amount * conversion_rate
+        if opportunity.expected_revenue is not None:
+            opportunity.expected_revenue = (
+                opportunity.expected_revenue * conversion_rate
+            )
+    Opportunity.objects.bulk_update(
+        opportunities, ["amount", "expected_revenue"], batch_size=1000
+    )
+
+
+class CurrencyConversionTests(TestCase):
+    """Test opportunity amounts are converted in the database on currency change"""
+
+    def setUp(self):
+        """Set up two companies holding identical random opportunities"""
+        self.legacy_company, self.company = Company.objects.bulk_create(
+            [
+                Company(
+                    name=name,
+                    email=f"{name.lower()}@example.com",
+                    contact_number="123",
+                    no_of_employees=10,
+                    city="Kochi",
+                    state="Kerala",
+                    country="IN",
+                    zip_code="682001",
+                )
+                for name in ["Legacy", "Acme"]
+            ]
+        )
+        owner = HorillaUser.objects.create_user(
+            username="owner", email="owner@example.com", password="password123"
+        )
+        stage = OpportunityStage.objects.create(
+            name="Prospecting", order=1, probability=Decimal("20")
+        )
+
+        rng = random.Random(40)
+        amounts = [
+            (
+                (
+                    None
+                    if rng.random() < 0.05
+                    else Decimal(rng.randint(0, 10**10)) / 100
+                ),
+                Decimal(rng.randint(0, 10**8)) / 100,
+            )
+            for _ in range(2000)
+        ]
+        Opportunity.objects.bulk_create(
+            [
+                Opportunity(
+                    name=f"Deal {index}",
+                    company=company,
+                    owner=owner,
+                    stage=stage,
+                    amount=amount,
+                    expected_revenue=expected_revenue,
+                )
+                for company in [self.legacy_company, self.company]
+                for index, (amount, expected_revenue) in enumerate(amounts)
+            ],
+            batch_size=1000,
+        )
+
+    def get_amounts(self, company):
+        return list(
+            Opportunity.objects.filter(company=company)
+            .order_by("name")
+            .values_list("amount", "expected_revenue")
+        )
+
+    def test_results_match_row_by_row_conversion(self):
+        """Test the UPDATE stores the same decimals as the Python conversion"""
+        for old_rate in OLD_RATES:
+            conversion_rate = Decimal("1.0") / Decimal(old_rate)
+            legacy_convert(self.legacy_company, conversion_rate)
+
+            with CaptureQueriesContext(connection) as ctx:
+                company_currency_changed.send(
+                    sender=Company,
+                    company=self.company,
+                    conversion_rate=conversion_rate,
+                )
+            updates = [
+                query["sql"]
+                for query in ctx.captured_queries
+                if query["sql"].startswith(f'UPDATE "{Opportunity._meta.db_table}"')
+            ]
+
+            self.assertEqual(len(updates), 1, old_rate)
+            self.assertEqual(
+                self.get_amounts(self.company),
+                self.get_amounts(self.legacy_company),
+                old_rate,
+            )
+
+    def test_large_tables_are_converted_in_chunks_after_commit(self):
+        """Test a table over the threshold is converted by the chunked task"""
+        conversion_rate = Decimal("1.0") / Decimal("0.85")
+        legacy_convert(self.legacy_company, conversion_rate)
+
+        with mock.patch.object(
+            currency, "CURRENCY_CONVERSION_ASYNC_THRESHOLD", 1000
+        ), mock.patch.object(
+            currency, "CURRENCY_CONVERSION_CHUNK_SIZE", 300
+        ), mock.patch.object(
+            convert_currency_amounts,
+            "delay",
+            side_effect=lambda *args: convert_currency_amounts.apply(args=args),
+        ) as delay:
+            with self.captureOnCommitCallbacks() as callbacks:
+                company_currency_changed.send(
+                    sender=Company,
+                    company=self.company,
+                    conversion_rate=conversion_rate,
+                )
+            delay.assert_not_called()
+
+            with CaptureQueriesContext(connection) as ctx:
+                for callback in callbacks:
+                    callback()
+
+        self.assertEqual(delay.call_count, 1)
+        model_label, filters, fields, rate = delay.call_args.args
+        self.assertEqual(model_label, "opportunities.Opportunity")
+        self.assertEqual(filters, {"company": self.company.pk})
+        self.assertEqual(Decimal(rate), conversion_rate)
+        updates = [
+            query["sql"]
+            for query in ctx.captured_queries
+            if query["sql"].startswith("UPDATE")
+        ]
+        self.assertEqual(len(updates), 7)
+        self.assertEqual(
+            self.get_amounts(self.company), self.get_amounts(self.legacy_company)
+        )
+
+
+class OpportunityListCurrencyTests(TestCase):
+    """Test money columns of the list view share one currency lookup"""
+
+    def setUp(self):
+        """Set up a USD company and a user viewing amounts in EUR"""
+        cache.clear()
+        self.company = Company.objects.bulk_create(
+            [
+                Company(
+                    name="Acme",
+                    email="acme@example.com",
+                    contact_number="123",
+                    no_of_employees=10,
+                    city="Kochi",
+                    state="Kerala",
+                    country="IN",
+                    zip_code="682001",
+                    currency="USD",
+                )
+            ]
+        )[0]
+        eur = MultipleCurrency.objects.bulk_create(
+            [
+                MultipleCurrency(
+                    company=self.company,
+                    currency="USD",
+                    conversion_rate=Decimal("1"),
+                    is_default=True,
+                ),
+                MultipleCurrency(
+                    company=self.company,
+                    currency="EUR",
+                    conversion_rate=Decimal("0.5"),
+                ),
+            ]
+        )[1]
+        DatedConversionRate.objects.bulk_create(
+            [
+                DatedConversionRate(
+                    company=self.company,
+                    currency=eur,
+                    conversion_rate=Decimal("0.9"),
+                    start_date=datetime.date.today() - datetime.timedelta(days=10),
+                )
+            ]
+        )
+        self.user = HorillaUser.objects.create_superuser(
+            username="admin", email="admin@example.com", password="password123"
+        )
+        HorillaUser.objects.filter(pk=self.user.pk).update(
+            company=self.company, currency=eur
+        )
+        self.stage = OpportunityStage.objects.create(
+            name="Prospecting", order=1, probability=Decimal("20")
+        )
+
+        user_logged_in.disconnect(post_login)
+        self.addCleanup(user_logged_in.connect, post_login)
+        self.client.force_login(self.user)
+
+    def create_opportunities(self, count):
+        Opportunity.objects.bulk_create(
+            [
+                Opportunity(
+                    name=f"Deal {index}",
+                    company=self.company,
+                    owner=self.user,
+                    stage=self.stage,
+                    amount=Decimal("100.00") + index,
+                )
+                for index in range(Opportunity.objects.count(), count)
+            ]
+        )
+
+    def get_list(self):
+        """Render the list and return it with its currency table queries"""
+        currency_tables = [
+            MultipleCurrency._meta.db_table,
+            DatedConversionRate._meta.db_table,
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(
+                reverse("opportunities:opportunities_list"), HTTP_HX_REQUEST="true"
+            )
+        queries = [
+            query["sql"]
+            for query in ctx.captured_queries
+            if any(f'"{table}"' in query["sql"] for table in currency_tables)
+        ]
+        return response, queries
+
+    def test_currency_queries_do_not_grow_with_rows(self):
+        """Test a page of money cells costs the same few currency queries"""
+        self.create_opportunities(5)
+        response, few_queries = self.get_list()
+        self.assertContains(response, "USD 100.00 (EUR 90.00)")
+
+        self.create_opportunities(40)
+        response, many_queries = self.get_list()
+        self.assertContains(response, "USD 139.00 (EUR 125.10)")
+
+        self.assertLessEqual(len(many_queries), len(few_queries))
+        self.assertLessEqual(len(many_queries), 3)
+
+
+class OpportunityApiBulkTests(TestCase):
+    """Test bulk opportunity payloads keep the forecasts up to date"""
+
+    url = "/api/crm/opportunities/opportunities/"
+
+    def setUp(self):
+        """Set up a fiscal year period, a forecast type and an open stage"""
+        config = FiscalYear.objects.create(
+            fiscal_year_type="custom", start_date_month="january"
+        )
+        fiscal_year = FiscalYearInstance.objects.create(
+            fiscal_year_config=config,
+            start_date=datetime.date(2025, 1, 1),
+            end_date=datetime.date(2025, 12, 31),
+            name="FY 2025",
+            is_current=True,
+        )
+        quarter = Quarter.objects.create(
+            fiscal_year=fiscal_year,
+            name="Q1",
+            quarter_number=1,
+            start_date=datetime.date(2025, 1, 1),
+            end_date=datetime.date(2025, 3, 31),
+        )
+        self.period = Period.objects.create(
+            quarter=quarter,
+            name="January",
+            period_number=1,
+            start_date=datetime.date(2025, 1, 1),
+            end_date=datetime.date(2025, 1, 31),
+        )
+        self.forecast_type = ForecastType.objects.create(name="Revenue")
+        self.stage = OpportunityStage.objects.create(
+            name="Prospecting", order=1, probability=Decimal("20"), stage_type="open"
+        )
+        self.user = HorillaUser.objects.create_user(
+            username="rep", email="rep@example.com", password="password123"
+        )
+
+        user_logged_in.disconnect(post_login)
+        self.addCleanup(user_logged_in.connect, post_login)
+        self.client.force_login(self.user)
+
+    def test_bulk_writes_update_forecasts(self):
+        """Test bulk created and updated opportunities reach the forecast"""
+        items = [
+            {
+                "name": f"Deal {index}",
+                "owner": self.user.pk,
+                "stage": self.stage.pk,
+                "amount": "1000.00",
+                "close_date": f"2025-01-{10 + index}",
+            }
+            for index in range(3)
+        ]
+        response = self.client.post(
+            f"{self.url}bulk_create/", items, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        forecast = Forecast.objects.get(
+            owner=self.user, period=self.period, forecast_type=self.forecast_type
+        )
+        self.assertEqual(forecast.pipeline_amount, Decimal("3000"))
 
-# Create your opportunities tests here.
+        ids = response.json()["ids"]
+        response = self.client.post(
+            f"{self.url}bulk_update/",
+            [{"id": ids[0], "amount": "4000.00"}],
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        forecast.refresh_from_db()
+        self.assertEqual(forecast.pipeline_amount, Decimal("6000"))
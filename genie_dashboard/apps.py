@@ -45,6 +45,16 @@ class HorillaDashboardConfig(AppConfig):
 
         __import__("genie_dashboard.menu")
         __import__("genie_dashboard.signals")
+
+        from django.conf import settings
+
+        if getattr(settings, "DASHBOARD_COMPONENT_PREWARM", False):
+            from .celery_schedules import HORILLA_BEAT_SCHEDULE
+
+            if not hasattr(settings, "CELERY_BEAT_SCHEDULE"):
+                settings.CELERY_BEAT_SCHEDULE = {}
+
+            settings.CELERY_BEAT_SCHEDULE.update(HORILLA_BEAT_SCHEDULE)
         # except Exception as e:
         #     import logging
 
@@ -0,0 +1,133 @@
+"""
+Result cache for dashboard components.
+
+Computed KPI and chart payloads are cached per component, per user scope and
+per data version of the component's source model and of the related models
+its groups are labelled from, such as the ``LeadStatus`` of a chart grouped
+by ``lead_status``. The data version is a counter kept in the shared cache
+and bumped by the post_save/post_delete receivers in
+``genie_dashboard.signals``, so a cached payload is never served after a
+source row or a group label changes.
+"""
+
+import logging
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+
+from genie.registry.feature import FEATURE_REGISTRY
+
+logger = logging.getLogger(__name__)
+
+COMPONENT_CACHE_TIMEOUT = getattr(settings, "DASHBOARD_COMPONENT_CACHE_TIMEOUT", 300)
+
+
+def _data_version_key(model):
+    return f"dashboard_data_version_{model._meta.label_lower}"
+
+
+def is_dashboard_source_model(model):
+    """Return True if the model can back a dashboard component."""
+    return model in FEATURE_REGISTRY["dashboard_component_models"]
+
+
+@lru_cache(maxsize=None)
+def _label_models(source_models):
+    return frozenset(
+        field.related_model
+        for source_model in source_models
+        for field in source_model._meta.get_fields()
+        if field.is_relation and field.concrete and field.related_model
+    )
+
+
+def is_dashboard_label_model(model):
+    """Return True if a dashboard source model can group by the model."""
+    return model in _label_models(tuple(FEATURE_REGISTRY["dashboard_component_models"]))
+
+
+def get_label_models(component, model):
+    """Return the related models labelling the groups of a component."""
+    label_models = []
+    for name in [component.grouping_field, component.secondary_grouping]:
+        if not name:
+            continue
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if (
+            field.is_relation
+            and field.related_model
+            and field.related_model not in label_models
+        ):
+            label_models.append(field.related_model)
+    return label_models
+
+
+def get_model_data_version(model):
+    """Return the current data version of a dashboard source model."""
+    version = cache.get(_data_version_key(model))
+    if version is None:
+        version = 1
+        cache.add(_data_version_key(model), version, timeout=None)
+    return version
+
+
+def bump_model_data_version(model):
+    """Invalidate every cached component result built from the given model."""
+    key = _data_version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, get_model_data_version(model) + 1, timeout=None)
+
+
+def get_user_scope(user, model):
+    """
+    Describe the rows a user can see for a model, mirroring
+    ``get_queryset_for_module``: all rows, own rows or nothing.
+    """
+    app_label = model._meta.app_label
+    model_name = model._meta.model_name
+    if user.has_perm(f"{app_label}.view_{model_name}"):
+        return "all"
+    if user.has_perm(f"{app_label}.view_own_{model_name}"):
+        return f"own_{user.pk}"
+    return "none"
+
+
+def component_cache_key(component, user, model, company=None):
+    """Build the cache key for a component result as seen by a user."""
+    updated_at = component.updated_at.timestamp() if component.updated_at else ""
+    versions = [
+        get_model_data_version(data_model)
+        for data_model in [model, *get_label_models(component, model)]
+    ]
+    return (
+        f"dashboard_component_{component.pk}_{updated_at}"
+        f"_{company.pk if company else 'all'}"
+        f"_{get_user_scope(user, model)}"
+        f"_v{'.'.join(str(version) for version in versions)}"
+    )
+
+
+def get_or_build_component_data(component, user, model, builder, company=None):
+    """
+    Return the cached result for a component, calling ``builder`` to compute
+    and store it on a miss. Empty results are not cached.
+    """
+    key = component_cache_key(component, user, model, company)
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    data = builder()
+    if data:
+        try:
+            cache.set(key, data, COMPONENT_CACHE_TIMEOUT)
+        except Exception as e:
+            logger.warning("Could not cache component %s: %s", component.pk, e)
+    return data
@@ -0,0 +1,8 @@
+from datetime import timedelta
+
+HORILLA_BEAT_SCHEDULE = {
+    "prewarm-default-dashboards": {
+        "task": "genie_dashboard.tasks.prewarm_default_dashboards",
+        "schedule": timedelta(minutes=5),
+    },
+}
@@ -0,0 +1,43 @@
+"""
+Management command to rebuild the dashboard daily rollups from live rows.
+Run it after bulk updates or imports that bypass model signals.
+
+Usage:
+python manage.py rebuild_rollups
+
+Options:
+python manage.py rebuild_rollups --model=leads.lead  # Specific model
+"""
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from genie_dashboard.rollups import ROLLUP_SPECS, rebuild_model_rollups, rollup_models
+
+
+class Command(BaseCommand):
+    help = "Rebuild the dashboard daily rollup tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--model",
+            type=str,
+            help="Rebuild rollups for a specific model label only (app.model)",
+        )
+
+    def handle(self, *args, **options):
+        label = options.get("model")
+        if label:
+            if label.lower() not in ROLLUP_SPECS:
+                raise CommandError(f"No rollups are configured for {label}")
+            models = [apps.get_model(label)]
+        else:
+            models = rollup_models()
+
+        for model in models:
+            rows = rebuild_model_rollups(model)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Rebuilt {rows} rollup rows for {model._meta.label_lower}"
+                )
+            )
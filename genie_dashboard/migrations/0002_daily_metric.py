@@ -0,0 +1,97 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_rollups(apps, schema_editor):
+    from genie_dashboard.rollups import ROLLUP_SPECS, rebuild_model_rollups
+
+    metric_model = apps.get_model("horilla_dashboard", "DailyMetric")
+    for label in ROLLUP_SPECS:
+        rebuild_model_rollups(apps.get_model(label), metric_model)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("horilla_core", "0002_fieldpermission"),
+        ("horilla_dashboard", "0001_initial"),
+        ("leads", "0001_initial"),
+        ("opportunities", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyMetric",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model", models.CharField(max_length=100, verbose_name="Model")),
+                ("date", models.DateField(verbose_name="Date")),
+                (
+                    "dimension",
+                    models.CharField(max_length=100, verbose_name="Dimension"),
+                ),
+                (
+                    "dimension_value",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        max_length=255,
+                        verbose_name="Dimension Value",
+                    ),
+                ),
+                ("count", models.IntegerField(default=0, verbose_name="Count")),
+                (
+                    "sum_amount",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=20,
+                        verbose_name="Sum Amount",
+                    ),
+                ),
+                (
+                    "company",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="horilla_core.company",
+                        verbose_name="Company",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Daily Metric",
+                "verbose_name_plural": "Daily Metrics",
+                "indexes": [
+                    models.Index(
+                        fields=["model", "dimension", "date"],
+                        name="horilla_das_model_da3ab9_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=(
+                            "company",
+                            "model",
+                            "date",
+                            "dimension",
+                            "dimension_value",
+                        ),
+                        name="unique_daily_metric",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -485,3 +485,50 @@ class ComponentCriteria(HorillaCoreModel):
 
     def __str__(self):
         return f"{self.component.name} - {self.field} {self.operator} {self.value}"
+
+
+@permission_exempt_model
+class DailyMetric(models.Model):
+    """
+    Materialized daily rollup of a dashboard source model.
+
+    One row holds the record count and amount total of a model for a company,
+    a day and one value of a grouping dimension. The ``__all__`` dimension
+    holds the day totals. Rows are maintained by ``genie_dashboard.rollups``.
+    """
+
+    company = models.ForeignKey(
+        "horilla_core.Company",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        verbose_name=_("Company"),
+    )
+    model = models.CharField(max_length=100, verbose_name=_("Model"))
+    date = models.DateField(verbose_name=_("Date"))
+    dimension = models.CharField(max_length=100, verbose_name=_("Dimension"))
+    dimension_value = models.CharField(
+        max_length=255, blank=True, default="", verbose_name=_("Dimension Value")
+    )
+    count = models.IntegerField(default=0, verbose_name=_("Count"))
+    sum_amount = models.DecimalField(
+        max_digits=20, decimal_places=2, default=0, verbose_name=_("Sum Amount")
+    )
+
+    class Meta:
+        """Meta class for DailyMetric"""
+
+        verbose_name = _("Daily Metric")
+        verbose_name_plural = _("Daily Metrics")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["company", "model", "date", "dimension", "dimension_value"],
+                name="unique_daily_metric",
+            )
+        ]
+        indexes = [
+            models.Index(fields=["model", "dimension", "date"]),
+        ]
+
+    def __str__(self):
+        return f"{self.model} {self.date} {self.dimension}={self.dimension_value}"
@@ -0,0 +1,303 @@
+"""
+Daily rollup engine for dashboard source models.
+
+Rolled-up models are described in ``ROLLUP_SPECS``. For every saved or
+deleted row the receivers in ``genie_dashboard.signals`` apply the row's
+contribution as a delta to ``DailyMetric``: the old contribution is
+subtracted and the new one added, for the ``__all__`` totals and for each
+grouping dimension. Rows written in bulk announce themselves with
+``records_bulk_written`` and have their days recomputed by
+``refresh_written_rows``. ``rebuild_rollups`` recomputes the tables from
+scratch.
+"""
+
+import datetime
+import logging
+from decimal import Decimal
+
+from django.apps import apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+logger = logging.getLogger(__name__)
+
+TOTAL_DIMENSION = "__all__"
+
+# model label -> rollup configuration
+ROLLUP_SPECS = {
+    "leads.lead": {
+        "date_field": "created_at",
+        "amount_field": "annual_revenue",
+        "dimensions": ["lead_status", "lead_source", "industry", "lead_owner"],
+    },
+    "opportunities.opportunity": {
+        "date_field": "created_at",
+        "amount_field": "amount",
+        "dimensions": ["stage", "lead_source", "opportunity_type", "owner"],
+    },
+}
+
+
+def get_rollup_spec(model):
+    """Return the rollup configuration of a model, or None"""
+    return ROLLUP_SPECS.get(model._meta.label_lower)
+
+
+def has_rollup(model, dimension=TOTAL_DIMENSION):
+    """Return True if the model is rolled up by the given dimension"""
+    spec = get_rollup_spec(model)
+    if not spec:
+        return False
+    return dimension == TOTAL_DIMENSION or dimension in spec["dimensions"]
+
+
+def _get_metric_model():
+    return apps.get_model("horilla_dashboard", "DailyMetric")
+
+
+def _to_date(value):
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc)
+        return value.date()
+    return value
+
+
+def _dimension_value(value):
+    return "" if value is None else str(value)
+
+
+def _contribution_keys(model, spec, values):
+    """
+    Yield the (date, dimension, dimension_value) keys a row contributes to,
+    given a dict of its attribute values.
+    """
+    day = _to_date(values.get(spec["date_field"]))
+    if day is None:
+        return
+    yield day, TOTAL_DIMENSION, ""
+    for dimension in spec["dimensions"]:
+        attname = model._meta.get_field(dimension).attname
+        yield day, dimension, _dimension_value(values.get(attname))
+
+
+def get_rollup_values(model, instance):
+    """Return the attribute values of an instance that rollups depend on"""
+    values = {
+        attname: getattr(instance, attname, None) for attname in rollup_attnames(model)
+    }
+    values["company_id"] = getattr(instance, "company_id", None)
+    return values
+
+
+def rollup_attnames(model):
+    """Return the attribute names read to compute a row's contribution"""
+    spec = get_rollup_spec(model)
+    names = [spec["date_field"], spec["amount_field"]]
+    names += [model._meta.get_field(d).attname for d in spec["dimensions"]]
+    return names
+
+
+def fetch_stored_values(model, pk):
+    """Return the currently stored rollup values of a row, or None"""
+    return (
+        model._base_manager.filter(pk=pk)
+        .values("company_id", *rollup_attnames(model))
+        .first()
+    )
+
+
+def _apply_delta(metric_model, company_id, model_label, key, count, amount):
+    day, dimension, dimension_value = key
+    lookup = {
+        "company_id": company_id,
+        "model": model_label,
+        "date": day,
+        "dimension": dimension,
+        "dimension_value": dimension_value,
+    }
+    updated = metric_model.objects.filter(**lookup).update(
+        count=F("count") + count, sum_amount=F("sum_amount") + amount
+    )
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            metric_model.objects.create(**lookup, count=count, sum_amount=amount)
+    except IntegrityError:
+        metric_model.objects.filter(**lookup).update(
+            count=F("count") + count, sum_amount=F("sum_amount") + amount
+        )
+
+
+def apply_row_change(model, old_values=None, new_values=None):
+    """
+    Apply the change of one row to the rollups. ``old_values`` is the row as
+    stored before the change (None for inserts) and ``new_values`` the row
+    after it (None for deletes).
+    """
+    spec = get_rollup_spec(model)
+    if not spec:
+        return
+
+    deltas = {}
+    for values, sign in ((old_values, -1), (new_values, 1)):
+        if not values:
+            continue
+        amount = values.get(spec["amount_field"]) or Decimal("0")
+        for key in _contribution_keys(model, spec, values):
+            full_key = (values.get("company_id"),) + key
+            count_delta, amount_delta = deltas.get(full_key, (0, Decimal("0")))
+            deltas[full_key] = (count_delta + sign, amount_delta + sign * amount)
+
+    metric_model = _get_metric_model()
+    label = model._meta.label_lower
+    for (company_id, *key), (count, amount) in deltas.items():
+        if count or amount:
+            _apply_delta(metric_model, company_id, label, tuple(key), count, amount)
+
+
+def rebuild_model_rollups(model, metric_model=None, dates=None):
+    """
+    Recompute the rollup rows of a model from its live rows, only those of
+    the given dates if any. Returns the number of rollup rows written.
+    """
+    metric_model = metric_model or _get_metric_model()
+    spec = ROLLUP_SPECS[model._meta.label_lower]
+    label = model._meta.label_lower
+    amount_field = spec["amount_field"]
+
+    queryset = model._base_manager.annotate(
+        rollup_date=TruncDate(spec["date_field"], tzinfo=datetime.timezone.utc)
+    ).exclude(rollup_date__isnull=True)
+    stale = metric_model.objects.filter(model=label)
+    if dates is not None:
+        queryset = queryset.filter(rollup_date__in=dates)
+        stale = stale.filter(date__in=dates)
+
+    rows = []
+    groupings = [(TOTAL_DIMENSION, None)] + [
+        (d, model._meta.get_field(d).attname) for d in spec["dimensions"]
+    ]
+    for dimension, attname in groupings:
+        group_fields = ["company_id", "rollup_date"] + ([attname] if attname else [])
+        grouped = (
+            queryset.values(*group_fields)
+            .annotate(row_count=Count("pk"), row_amount=Sum(amount_field))
+            .order_by()
+        )
+        for item in grouped:
+            rows.append(
+                metric_model(
+                    company_id=item["company_id"],
+                    model=label,
+                    date=item["rollup_date"],
+                    dimension=dimension,
+                    dimension_value=(
+                        _dimension_value(item[attname]) if attname else ""
+                    ),
+                    count=item["row_count"],
+                    sum_amount=item["row_amount"] or Decimal("0"),
+                )
+            )
+
+    with transaction.atomic():
+        stale.delete()
+        metric_model.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def refresh_written_rows(model, pks=None, fields=None):
+    """
+    Bring the rollups of a model in line after rows were written in bulk,
+    which skips the per-row receivers. ``pks`` are the written rows and
+    ``fields`` the fields set on them, None for new rows. The days of the
+    rows are rebuilt, or every day when rows may have moved to another one.
+    Returns the number of rollup rows written.
+    """
+    spec = get_rollup_spec(model)
+    if not spec:
+        return 0
+    if fields is not None:
+        names = {spec["date_field"], spec["amount_field"], "company"}
+        names.update(spec["dimensions"])
+        names |= {model._meta.get_field(name).attname for name in names}
+        if not names & set(fields):
+            return 0
+    if pks is None or (fields is not None and spec["date_field"] in fields):
+        return rebuild_model_rollups(model)
+
+    dates = set()
+    pks = list(pks)
+    for start in range(0, len(pks), 1000):
+        dates.update(
+            model._base_manager.filter(pk__in=pks[start : start + 1000])
+            .annotate(
+                rollup_date=TruncDate(spec["date_field"], tzinfo=datetime.timezone.utc)
+            )
+            .exclude(rollup_date__isnull=True)
+            .values_list("rollup_date", flat=True)
+            .distinct()
+        )
+    if not dates:
+        return 0
+    return rebuild_model_rollups(model, dates=sorted(dates))
+
+
+def get_rollup_total(model, company=None):
+    """Return the total record count of a model from its rollups"""
+    queryset = _get_metric_model().objects.filter(
+        model=model._meta.label_lower, dimension=TOTAL_DIMENSION
+    )
+    if company:
+        queryset = queryset.filter(company=company)
+    return queryset.aggregate(total=Sum("count"))["total"] or 0
+
+
+def get_rollup_grouped_counts(model, dimension, company=None):
+    """
+    Return ``[{"dimension_value": ..., "value": ...}]`` record counts of a
+    model grouped by one rolled-up dimension, largest first. Values are
+    converted back to the python type of the grouping field.
+    """
+    queryset = _get_metric_model().objects.filter(
+        model=model._meta.label_lower, dimension=dimension
+    )
+    if company:
+        queryset = queryset.filter(company=company)
+    grouped = (
+        queryset.values("dimension_value")
+        .annotate(value=Sum("count"))
+        .filter(value__gt=0)
+        .order_by("-value")
+    )
+
+    field = model._meta.get_field(dimension)
+    target = field.target_field if field.is_relation else field
+    results = []
+    for item in grouped:
+        raw = item["dimension_value"]
+        if raw == "" and (field.is_relation or field.null):
+            value = None
+        else:
+            value = target.to_python(raw)
+        results.append({"dimension_value": value, "value": item["value"]})
+    return results
+
+
+def rollup_models():
+    """Return the model classes that have rollups"""
+    result = []
+    for label in ROLLUP_SPECS:
+        try:
+            result.append(apps.get_model(label))
+        except LookupError:
+            continue
+    return result
+
+
+def is_rollup_model(model):
+    """Return True if the model has rollups"""
+    meta = getattr(model, "_meta", None)
+    return meta is not None and meta.label_lower in ROLLUP_SPECS
@@ -1,9 +1,27 @@
-from django.db.models.signals import post_save, pre_save
+import logging
+
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
 from genie_core.models import HorillaUser
+from genie_core.signals import currency_amounts_converted, records_bulk_written
+from genie_dashboard.cache import (
+    bump_model_data_version,
+    is_dashboard_label_model,
+    is_dashboard_source_model,
+)
+from genie_dashboard.rollups import (
+    apply_row_change,
+    fetch_stored_values,
+    get_rollup_values,
+    is_rollup_model,
+    rebuild_model_rollups,
+    refresh_written_rows,
+)
 from genie_keys.models import ShortcutKey
 
+logger = logging.getLogger(__name__)
+
 
 # Define your horilla_dashboard signals here
 @receiver(post_save, sender=HorillaUser)
@@ -25,3 +43,84 @@ def create_dashboard_shortcuts(sender, instance, created, **kwargs):
                 command=item["command"],
                 company=instance.company,
             )
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_dashboard_component_cache(sender, **kwargs):
+    """
+    Bump the data version of dashboard source models, and of the related
+    models labelling their groups, on every write so cached KPI and chart
+    results built from them are no longer served.
+    """
+    if is_dashboard_source_model(sender) or is_dashboard_label_model(sender):
+        bump_model_data_version(sender)
+
+
+@receiver(pre_save)
+def capture_rollup_previous_values(sender, instance, raw=False, **kwargs):
+    """Remember the stored values of a rolled-up row before it is updated."""
+    if raw or not is_rollup_model(sender):
+        return
+    instance._rollup_previous = (
+        fetch_stored_values(sender, instance.pk) if instance.pk else None
+    )
+
+
+@receiver(post_save)
+def update_rollups_on_save(sender, instance, raw=False, **kwargs):
+    """Apply the change of a saved row to the daily rollups."""
+    if raw or not is_rollup_model(sender):
+        return
+    try:
+        apply_row_change(
+            sender,
+            old_values=getattr(instance, "_rollup_previous", None),
+            new_values=get_rollup_values(sender, instance),
+        )
+    except Exception as e:
+        logger.error(f"Failed to update rollups for {sender.__name__}: {e}")
+    instance._rollup_previous = None
+
+
+@receiver(post_delete)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    """Remove a deleted row from the daily rollups."""
+    if not is_rollup_model(sender):
+        return
+    try:
+        apply_row_change(sender, old_values=get_rollup_values(sender, instance))
+    except Exception as e:
+        logger.error(f"Failed to update rollups for {sender.__name__}: {e}")
+
+
+@receiver(currency_amounts_converted)
+def resync_dashboards_on_currency_conversion(sender, **kwargs):
+    """
+    Rebuild the rollups and cached results of a model whose amounts were
+    converted in bulk, which bypasses the per-row save receivers.
+    """
+    if is_dashboard_source_model(sender):
+        bump_model_data_version(sender)
+    if not is_rollup_model(sender):
+        return
+    try:
+        rebuild_model_rollups(sender)
+    except Exception as e:
+        logger.error(f"Failed to rebuild rollups for {sender.__name__}: {e}")
+
+
+@receiver(records_bulk_written)
+def resync_dashboards_on_bulk_write(sender, pks=None, fields=None, **kwargs):
+    """
+    Invalidate cached results of a model written in bulk and recompute the
+    rollups of the days its written rows fall on.
+    """
+    if is_dashboard_source_model(sender) or is_dashboard_label_model(sender):
+        bump_model_data_version(sender)
+    if not is_rollup_model(sender):
+        return
+    try:
+        refresh_written_rows(sender, pks=pks, fields=fields)
+    except Exception as e:
+        logger.error(f"Failed to refresh rollups for {sender.__name__}: {e}")
@@ -0,0 +1,80 @@
+import logging
+
+from celery import shared_task
+
+from genie_utils.middlewares import _thread_local
+
+logger = logging.getLogger(__name__)
+
+
+class PrewarmRequest:
+    """Minimal request object used to build component results outside a request"""
+
+    def __init__(self, user, company):
+        self.user = user
+        self.active_company = company
+        self.GET = {}
+        self.META = {}
+
+
+def prewarm_dashboard(dashboard):
+    """
+    Compute and cache the KPI and chart results of a dashboard as seen by its
+    owner. Returns the number of components that were cached.
+    """
+    from genie_dashboard.cache import get_or_build_component_data
+    from genie_dashboard.models import DashboardComponent
+    from genie_dashboard.views import DashboardComponentChartView, get_component_model
+
+    owner = dashboard.dashboard_owner
+    company = dashboard.company or owner.company
+    request = PrewarmRequest(owner, company)
+    view = DashboardComponentChartView()
+    view.request = request
+
+    components = DashboardComponent.all_objects.filter(
+        dashboard=dashboard,
+        is_active=True,
+        component_type__in=["kpi", "chart"],
+    ).select_related("module", "reports")
+
+    warmed = 0
+    setattr(_thread_local, "request", request)
+    try:
+        for component in components:
+            model = get_component_model(component)
+            if not model:
+                continue
+            if component.component_type == "kpi":
+                builder = lambda c=component: view.get_kpi_data(c)
+            elif component.reports:
+                builder = lambda c=component: view.get_report_chart_data(c)
+            else:
+                builder = lambda c=component: view.get_chart_data(c)
+            if get_or_build_component_data(component, owner, model, builder, company):
+                warmed += 1
+    finally:
+        if hasattr(_thread_local, "request"):
+            delattr(_thread_local, "request")
+    return warmed
+
+
+@shared_task
+def prewarm_default_dashboards():
+    """
+    Warm the component result cache for every user's default dashboard.
+    Enabled through the DASHBOARD_COMPONENT_PREWARM setting.
+    """
+    from genie_dashboard.models import Dashboard
+
+    dashboards = Dashboard.all_objects.filter(
+        is_default=True, is_active=True
+    ).select_related("dashboard_owner", "company")
+
+    warmed = 0
+    for dashboard in dashboards:
+        try:
+            warmed += prewarm_dashboard(dashboard)
+        except Exception as e:
+            logger.error(f"Error prewarming dashboard {dashboard.id}: {str(e)}")
+    return f"Prewarmed {warmed} components"
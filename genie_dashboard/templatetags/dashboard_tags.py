@@ -2,6 +2,7 @@
 # Create this directory structure: horilla_dashboard/templatetags/__init__.py and dashboard_filters.py
 
 from django import template
+from django.db.models import QuerySet
 
 register = template.Library()
 
@@ -9,10 +10,14 @@ register = template.Library()
 @register.filter
 def filter_by_type(queryset, component_type):
     """Filter queryset by component type"""
-    return queryset.filter(component_type=component_type)
+    if isinstance(queryset, QuerySet):
+        return queryset.filter(component_type=component_type)
+    return [c for c in queryset if c.component_type == component_type]
 
 
 @register.filter
 def filter_by_type_exclude(queryset, component_type):
     """Exclude components of specified type from queryset"""
-    return queryset.exclude(component_type=component_type)
+    if isinstance(queryset, QuerySet):
+        return queryset.exclude(component_type=component_type)
+    return [c for c in queryset if c.component_type != component_type]
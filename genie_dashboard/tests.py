@@ -1,3 +1,409 @@
+"""
+Tests for horilla_dashboard
+"""
+
+import json
+import random
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.signals import user_logged_in
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Sum
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from login_history.models import post_login
+
+from genie_core.models import HorillaContentType, HorillaUser
+from genie_crm.leads.models import Lead, LeadStatus
+from genie_dashboard.cache import component_cache_key, get_model_data_version
+from genie_dashboard.models import DailyMetric, Dashboard, DashboardComponent
+from genie_dashboard.rollups import (
+    TOTAL_DIMENSION,
+    get_rollup_grouped_counts,
+    get_rollup_total,
+    rebuild_model_rollups,
+)
+from genie_dashboard.tasks import prewarm_dashboard
+from genie_dashboard.utils import DefaultDashboardGenerator
+
+
+class DashboardTestMixin:
+    """Shared fixtures for dashboard tests"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        self.user = HorillaUser.objects.create_superuser(
+            username="admin", email="admin@example.com", password="password123"
+        )
+        self.company = None
+        self.status = LeadStatus.objects.create(name="New", order=1, probability=10)
+        self.lead_content_type = HorillaContentType.objects.get_for_model(Lead)
+
+        # login_history expects a user agent that the test client login lacks
+        user_logged_in.disconnect(post_login)
+        self.addCleanup(user_logged_in.connect, post_login)
+        self.client.force_login(self.user)
+
+    def create_lead(self, index, **kwargs):
+        """Create a lead owned by the test user"""
+        values = {
+            "lead_owner": self.user,
+            "first_name": f"First {index}",
+            "last_name": f"Last {index}",
+            "email": f"lead{index}@example.com",
+            "lead_source": "website",
+            "lead_status": self.status,
+            "lead_company": "Acme",
+            "industry": "finance",
+            "company": self.company,
+        }
+        values.update(kwargs)
+        return Lead.objects.create(**values)
+
+    def create_dashboard(self, **kwargs):
+        """Create a dashboard owned by the test user"""
+        return Dashboard.objects.create(
+            name="Sales",
+            dashboard_owner=self.user,
+            company=self.company,
+            **kwargs,
+        )
+
+    def create_component(self, dashboard, component_type, **kwargs):
+        """Create a component on the given dashboard"""
+        return DashboardComponent.objects.create(
+            dashboard=dashboard,
+            name=f"{component_type} component",
+            component_type=component_type,
+            module=self.lead_content_type,
+            component_owner=self.user,
+            company=self.company,
+            **kwargs,
+        )
+
+
+class DashboardLazyLoadingTests(DashboardTestMixin, TestCase):
+    """Test that dashboard components are loaded lazily and cached"""
+
+    def setUp(self):
+        super().setUp()
+        for index in range(20):
+            self.create_lead(index, industry="finance" if index % 2 else "banking")
+        self.dashboard = self.create_dashboard()
+
+    def get_detail(self):
+        """Fetch the dashboard detail page and return it with its queries"""
+        url = reverse(
+            "horilla_dashboard:dashboard_detail_view", kwargs={"pk": self.dashboard.pk}
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        return response, [query["sql"] for query in ctx.captured_queries]
+
+    def test_detail_view_renders_placeholders(self):
+        """Test the detail page returns skeletons instead of component data"""
+        table = self.create_component(self.dashboard, "table_data", columns="email")
+        kpi = self.create_component(self.dashboard, "kpi")
+
+        response, _ = self.get_detail()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("table_contexts", response.context)
+        self.assertContains(
+            response,
+            reverse("horilla_dashboard:component_table", args=[table.pk]),
+        )
+        self.assertContains(
+            response,
+            reverse("horilla_dashboard:component_chart", args=[kpi.pk]),
+        )
+        self.assertNotContains(response, "lead0@example.com")
+
+    def test_time_to_first_byte_independent_of_components(self):
+        """Test the detail page renders placeholders without component queries"""
+        self.create_component(self.dashboard, "kpi")
+        self.get_detail()
+        _, single_queries = self.get_detail()
+
+        components = []
+        for _ in range(10):
+            components += [
+                self.create_component(self.dashboard, "kpi"),
+                self.create_component(
+                    self.dashboard, "chart", chart_type="pie", grouping_field="industry"
+                ),
+                self.create_component(self.dashboard, "table_data", columns="email"),
+            ]
+        response, many_queries = self.get_detail()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(single_queries), len(many_queries))
+        # No component data is read while rendering the page
+        self.assertFalse(any(f'"{Lead._meta.db_table}"' in sql for sql in many_queries))
+        for component in components:
+            name = (
+                "component_table"
+                if component.component_type == "table_data"
+                else "component_chart"
+            )
+            self.assertContains(
+                response, reverse(f"horilla_dashboard:{name}", args=[component.pk])
+            )
+
+    def test_table_component_endpoint(self):
+        """Test the table endpoint renders the rows of a table component"""
+        table = self.create_component(self.dashboard, "table_data", columns="email")
+
+        response = self.client.get(
+            reverse("horilla_dashboard:component_table", args=[table.pk]),
+            HTTP_HX_REQUEST="true",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "lead1@example.com")
+
+    def test_component_result_is_cached(self):
+        """Test a second load of a chart reuses the cached result"""
+        chart = self.create_component(
+            self.dashboard, "chart", chart_type="pie", grouping_field="industry"
+        )
+        url = reverse("horilla_dashboard:component_chart", args=[chart.pk])
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+
+        self.assertContains(response, "banking")
+        self.assertFalse(
+            any(
+                Lead._meta.db_table in query["sql"] and "COUNT" in query["sql"]
+                for query in ctx.captured_queries
+            )
+        )
+
+    def test_cache_invalidated_when_source_row_changes(self):
+        """Test that writing a source row invalidates cached component results"""
+        kpi = self.create_component(self.dashboard, "kpi")
+        url = reverse("horilla_dashboard:component_chart", args=[kpi.pk])
+        self.assertContains(self.client.get(url), "20")
+        version = get_model_data_version(Lead)
+
+        lead = self.create_lead(100)
+        self.assertEqual(get_model_data_version(Lead), version + 1)
+        self.assertContains(self.client.get(url), "21")
+
+        lead.delete()
+        self.assertContains(self.client.get(url), "20")
+
+    def test_cache_invalidated_when_group_label_changes(self):
+        """Test that renaming a related row relabels cached chart groups"""
+        kpi = self.create_component(self.dashboard, "kpi")
+        chart = self.create_component(
+            self.dashboard, "chart", chart_type="pie", grouping_field="lead_status"
+        )
+        url = reverse("horilla_dashboard:component_chart", args=[chart.pk])
+        self.assertContains(self.client.get(url), "New")
+        kpi_key = component_cache_key(kpi, self.user, Lead)
+
+        self.status.name = "Fresh"
+        self.status.save()
+        self.assertContains(self.client.get(url), "Fresh")
+        # Components not grouped by the status keep their cached results
+        self.assertEqual(component_cache_key(kpi, self.user, Lead), kpi_key)
+
+    def test_prewarm_default_dashboard(self):
+        """Test prewarming fills the cache for the owner's default dashboard"""
+        self.dashboard.is_default = True
+        self.dashboard.save()
+        kpi = self.create_component(self.dashboard, "kpi")
+
+        self.assertEqual(prewarm_dashboard(self.dashboard), 1)
+        self.assertIsNotNone(
+            cache.get(component_cache_key(kpi, self.user, Lead, self.company))
+        )
+
+
+class DefaultDashboardGeneratorTests(DashboardTestMixin, TestCase):
+    """Test the aggregated home dashboard generator"""
+
+    def setUp(self):
+        super().setUp()
+        for index in range(12):
+            self.create_lead(index, lead_source="website" if index % 3 else "event")
+
+    def test_kpis_and_charts_query_count(self):
+        """Test each model costs at most one count and one grouped query"""
+        generator = DefaultDashboardGenerator(self.user)
+
+        # Lead: count + grouped source; Contact, Opportunity, Account: count
+        # (empty, so no chart); Campaign: count for the chart check.
+        with self.assertNumQueries(6):
+            kpis = generator.generate_kpi_data()
+            charts = generator.generate_chart_data()
+
+        lead_kpi = next(kpi for kpi in kpis if kpi["title"] == "Total Leads")
+        self.assertEqual(lead_kpi["value"], 12)
+        self.assertEqual(len(charts), 1)
+        self.assertEqual(charts[0]["title"], "Leads by Source")
+        self.assertEqual(charts[0]["data"]["labels"], ["website", "event"])
+        self.assertEqual(charts[0]["data"]["data"], [8, 4])
+
+    def test_permissions_checked_once_per_model(self):
+        """Test permission decisions are reused across KPIs, charts and tables"""
+        generator = DefaultDashboardGenerator(self.user)
+        with mock.patch.object(
+            self.user, "has_perm", wraps=self.user.has_perm
+        ) as has_perm:
+            generator.generate_kpi_data()
+            generator.generate_chart_data()
+            generator.generate_table_data()
+
+        checked = [call.args[0] for call in has_perm.call_args_list]
+        self.assertEqual(len(checked), len(set(checked)))
+        self.assertEqual(len(checked), 2 * len(generator.models))
+
+
+class DailyRollupTests(DashboardTestMixin, TestCase):
+    """Test that the daily rollups stay consistent with the live rows"""
+
+    def rollup_state(self):
+        """Return the non-empty rollup rows as comparable tuples"""
+        return sorted(
+            DailyMetric.objects.filter(model="leads.lead")
+            .exclude(count=0, sum_amount=0)
+            .values_list("date", "dimension", "dimension_value", "count", "sum_amount")
+        )
+
+    def assert_rollups_match_live(self):
+        """Compare rollup counts and sums with live aggregates per dimension"""
+        self.assertEqual(get_rollup_total(Lead), Lead.objects.count())
+        for dimension in ["lead_source", "industry", "lead_status"]:
+            live = {
+                item[dimension]: item["value"]
+                for item in Lead.objects.values(dimension).annotate(value=Count("id"))
+            }
+            rolled = {
+                item["dimension_value"]: item["value"]
+                for item in get_rollup_grouped_counts(Lead, dimension)
+            }
+            self.assertEqual(rolled, live, dimension)
+
+            live_amounts = {
+                str(item[dimension] or ""): item["amount"] or Decimal("0")
+                for item in Lead.objects.values(dimension).annotate(
+                    amount=Sum("annual_revenue")
+                )
+            }
+            rolled_amounts = {
+                item["dimension_value"]: item["amount"]
+                for item in DailyMetric.objects.filter(
+                    model="leads.lead", dimension=dimension
+                )
+                .values("dimension_value")
+                .annotate(amount=Sum("sum_amount"))
+                .exclude(amount=0)
+            }
+            self.assertEqual(
+                rolled_amounts,
+                {k: v for k, v in live_amounts.items() if v},
+                dimension,
+            )
+
+    def test_random_mutations_keep_rollups_consistent(self):
+        """Test create/update/delete sequences against live aggregates"""
+        rng = random.Random(28)
+        statuses = [self.status] + [
+            LeadStatus.objects.create(name=f"Status {i}", order=i + 2, probability=50)
+            for i in range(2)
+        ]
+        leads = []
+        for step in range(60):
+            action = rng.choice(["create", "create", "update", "delete"])
+            if action == "create" or not leads:
+                leads.append(
+                    self.create_lead(
+                        step,
+                        lead_source=rng.choice(["website", "event", "referral"]),
+                        lead_status=rng.choice(statuses),
+                        industry=rng.choice(["finance", "banking", "retail"]),
+                        annual_revenue=Decimal(rng.randint(0, 5000)),
+                    )
+                )
+            elif action == "update":
+                lead = rng.choice(leads)
+                lead.lead_source = rng.choice(["website", "event", "referral"])
+                lead.lead_status = rng.choice(statuses)
+                lead.annual_revenue = rng.choice([None, Decimal(rng.randint(0, 5000))])
+                lead.save()
+            else:
+                leads.pop(rng.randrange(len(leads))).delete()
+
+        self.assert_rollups_match_live()
+
+        incremental = self.rollup_state()
+        rebuild_model_rollups(Lead)
+        self.assertEqual(self.rollup_state(), incremental)
+
+    def test_bulk_updates_keep_rollups_consistent(self):
+        """Test a list view bulk update of a dimension reaches the rollups"""
+        leads = [self.create_lead(index) for index in range(6)]
+        won = LeadStatus.objects.create(name="Won", order=2, probability=100)
+        dashboard = self.create_dashboard()
+        chart = self.create_component(
+            dashboard, "chart", chart_type="pie", grouping_field="lead_status"
+        )
+        url = reverse("horilla_dashboard:component_chart", args=[chart.pk])
+        self.assertNotContains(self.client.get(url), "Won")
+
+        response = self.client.post(
+            reverse("leads:leads_list"),
+            {
+                "record_ids": json.dumps([lead.pk for lead in leads[:4]]),
+                "bulk_update_value_lead_status": str(won.pk),
+            },
+            HTTP_HX_REQUEST="true",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Lead.objects.filter(lead_status=won).count(), 4)
+        self.assert_rollups_match_live()
+        self.assertEqual(
+            {
+                item["dimension_value"]: item["value"]
+                for item in get_rollup_grouped_counts(Lead, "lead_status")
+            },
+            {self.status.pk: 2, won.pk: 4},
+        )
+        self.assertContains(self.client.get(url), "Won")
+
+    def test_chart_component_reads_rollups(self):
+        """Test an unconditioned chart is served from the rollup table"""
+        for index in range(6):
+            self.create_lead(index, industry="finance" if index % 3 else "banking")
+        dashboard = self.create_dashboard()
+        chart = self.create_component(
+            dashboard, "chart", chart_type="pie", grouping_field="lead_status"
+        )
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(
+                reverse("horilla_dashboard:component_chart", args=[chart.pk])
+            )
 
-# Create your horilla_dashboard tests here.
+        self.assertContains(response, "New")
+        self.assertFalse(
+            any(
+                f'FROM "{Lead._meta.db_table}"' in query["sql"]
+                and "GROUP BY" in query["sql"]
+                for query in ctx.captured_queries
+            )
+        )
+        self.assertTrue(
+            DailyMetric.objects.filter(
+                dimension=TOTAL_DIMENSION, model="leads.lead", count=6
+            ).exists()
+        )
@@ -60,6 +60,11 @@ urlpatterns = [
         views.ColumnFieldChoicesView.as_view(),
         name="get_columns_field_choices",
     ),
+    path(
+        "component-table/<int:component_id>/",
+        views.DashboardComponentTableView.as_view(),
+        name="component_table",
+    ),
     path(
         "component-table-data/<int:component_id>/",
         views.DashboardComponentTableDataView.as_view(),
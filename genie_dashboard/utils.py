@@ -29,6 +29,11 @@ class DefaultDashboardGenerator:
     def __init__(self, user, company=None):
         self.user = user
         self.company = company
+        # Permission decisions and record counts are resolved once per
+        # generator (one generator is built per request) and reused by the
+        # KPI, chart and table builders.
+        self._permissions = {}
+        self._counts = {}
 
         try:
 
@@ -72,11 +77,7 @@ class DefaultDashboardGenerator:
         """Get filtered queryset for a model"""
         queryset = model_class.objects.all()
 
-        app_label = model_class._meta.app_label
-        model_name = model_class._meta.model_name
-
-        has_view_all = self.user.has_perm(f"{app_label}.view_{model_name}")
-        has_view_own = self.user.has_perm(f"{app_label}.view_own_{model_name}")
+        has_view_all, has_view_own = self.get_model_permissions(model_class)
 
         if has_view_all:
             return queryset
@@ -102,15 +103,37 @@ class DefaultDashboardGenerator:
 
         return queryset.none()
 
+    def get_model_permissions(self, model_class):
+        """Return (has_view_all, has_view_own) for a model, checked once"""
+        if model_class not in self._permissions:
+            app_label = model_class._meta.app_label
+            model_name = model_class._meta.model_name
+            self._permissions[model_class] = (
+                self.user.has_perm(f"{app_label}.view_{model_name}"),
+                self.user.has_perm(f"{app_label}.view_own_{model_name}"),
+            )
+        return self._permissions[model_class]
+
     def has_model_permission(self, model_class):
         """Check if user has either view or view_own permission for a model"""
-        app_label = model_class._meta.app_label
-        model_name = model_class._meta.model_name
+        has_view_all, has_view_own = self.get_model_permissions(model_class)
+        return has_view_all or has_view_own
 
-        has_view_all = self.user.has_perm(f"{app_label}.view_{model_name}")
-        has_view_own = self.user.has_perm(f"{app_label}.view_own_{model_name}")
+    def get_model_count(self, model_class):
+        """Return the number of visible records for a model, counted once"""
+        if model_class not in self._counts:
+            self._counts[model_class] = self.get_queryset(model_class).count()
+        return self._counts[model_class]
 
-        return has_view_all or has_view_own
+    def get_grouped_counts(self, queryset, field_name, ordered=True):
+        """
+        Return per-value record counts for a field as a list, so the grouped
+        query is evaluated exactly once.
+        """
+        grouped = queryset.values(field_name).annotate(count=Count("id"))
+        if ordered:
+            grouped = grouped.order_by("-count")
+        return list(grouped)
 
     def generate_kpi_data(self):
         """Generate simple count KPIs"""
@@ -121,7 +144,7 @@ class DefaultDashboardGenerator:
                 model_class = model_info["model"]
 
                 if self.has_model_permission(model_class):
-                    count = self.get_queryset(model_info["model"]).count()
+                    count = self.get_model_count(model_class)
 
                     section_info = get_section_info_for_model(model_class)
 
@@ -153,12 +176,11 @@ class DefaultDashboardGenerator:
                 if not self.has_model_permission(model_class):
                     continue
 
-                queryset = self.get_queryset(model_class)
-                count = queryset.count()
-
-                if count == 0:
+                if self.get_model_count(model_class) == 0:
                     continue
 
+                queryset = self.get_queryset(model_class)
+
                 model_name = model_class.__name__.lower()
 
                 if model_name == "lead":
@@ -199,13 +221,9 @@ class DefaultDashboardGenerator:
                     if hasattr(queryset.model, "lead_source")
                     else "source"
                 )
-                source_data = (
-                    queryset.values(source_field)
-                    .annotate(count=Count("id"))
-                    .order_by("-count")
-                )
+                source_data = self.get_grouped_counts(queryset, source_field)
 
-                if source_data.exists():
+                if source_data:
                     labels = [item[source_field] or "Unknown" for item in source_data]
                     data = [item["count"] for item in source_data]
 
@@ -243,11 +261,11 @@ class DefaultDashboardGenerator:
                     if hasattr(queryset.model, "is_converted")
                     else "converted"
                 )
-                convert_data = queryset.values(convert_field).annotate(
-                    count=Count("id")
+                convert_data = self.get_grouped_counts(
+                    queryset, convert_field, ordered=False
                 )
 
-                if convert_data.exists():
+                if convert_data:
                     labels = []
                     data = []
                     for item in convert_data:
@@ -266,13 +284,9 @@ class DefaultDashboardGenerator:
                     }
 
             if hasattr(queryset.model, "status"):
-                status_data = (
-                    queryset.values("status")
-                    .annotate(count=Count("id"))
-                    .order_by("-count")
-                )
+                status_data = self.get_grouped_counts(queryset, "status")
 
-                if status_data.exists():
+                if status_data:
                     labels = [item["status"] or "No Status" for item in status_data]
                     data = [item["count"] for item in status_data]
 
@@ -302,13 +316,9 @@ class DefaultDashboardGenerator:
                     if hasattr(queryset.model, "lead_source")
                     else "source"
                 )
-                source_data = (
-                    queryset.values(source_field)
-                    .annotate(count=Count("id"))
-                    .order_by("-count")
-                )
+                source_data = self.get_grouped_counts(queryset, source_field)
 
-                if source_data.exists():
+                if source_data:
                     labels = [item[source_field] or "Unknown" for item in source_data]
                     data = [item["count"] for item in source_data]
 
@@ -347,13 +357,9 @@ class DefaultDashboardGenerator:
                 stage_field = "opportunity_stage"
 
             if stage_field:
-                stage_data = (
-                    queryset.values(stage_field)
-                    .annotate(count=Count("id"))
-                    .order_by("-count")
-                )
+                stage_data = self.get_grouped_counts(queryset, stage_field)
 
-                if stage_data.exists():
+                if stage_data:
                     labels = [item[stage_field] or "Unknown" for item in stage_data]
                     data = [item["count"] for item in stage_data]
 
@@ -364,9 +370,9 @@ class DefaultDashboardGenerator:
                     }
 
             if hasattr(queryset.model, "is_won"):
-                won_data = queryset.values("is_won").annotate(count=Count("id"))
+                won_data = self.get_grouped_counts(queryset, "is_won", ordered=False)
 
-                if won_data.exists():
+                if won_data:
                     labels = []
                     data = []
                     for item in won_data:
@@ -435,13 +441,9 @@ class DefaultDashboardGenerator:
                     if hasattr(queryset.model, "campaign_type")
                     else "type"
                 )
-                type_data = (
-                    queryset.values(type_field)
-                    .annotate(count=Count("id"))
-                    .order_by("-count")
-                )
+                type_data = self.get_grouped_counts(queryset, type_field)
 
-                if type_data.exists():
+                if type_data:
                     labels = [item[type_field] or "Unknown" for item in type_data]
                     data = [item["count"] for item in type_data]
 
@@ -472,13 +474,9 @@ class DefaultDashboardGenerator:
                     }
 
             if hasattr(queryset.model, "status"):
-                status_data = (
-                    queryset.values("status")
-                    .annotate(count=Count("id"))
-                    .order_by("-count")
-                )
+                status_data = self.get_grouped_counts(queryset, "status")
 
-                if status_data.exists():
+                if status_data:
                     labels = [item["status"] or "No Status" for item in status_data]
                     data = [item["count"] for item in status_data]
 
@@ -493,9 +491,11 @@ class DefaultDashboardGenerator:
                     }
 
             if hasattr(queryset.model, "is_active"):
-                active_data = queryset.values("is_active").annotate(count=Count("id"))
+                active_data = self.get_grouped_counts(
+                    queryset, "is_active", ordered=False
+                )
 
-                if active_data.exists():
+                if active_data:
                     labels = []
                     data = []
                     for item in active_data:
@@ -529,13 +529,9 @@ class DefaultDashboardGenerator:
                     if hasattr(queryset.model, "lead_source")
                     else "source"
                 )
-                source_data = (
-                    queryset.values(source_field)
-                    .annotate(count=Count("id"))
-                    .order_by("-count")
-                )
+                source_data = self.get_grouped_counts(queryset, source_field)
 
-                if source_data.exists():
+                if source_data:
                     labels = [item[source_field] or "Unknown" for item in source_data]
                     data = [item["count"] for item in source_data]
 
@@ -574,13 +570,9 @@ class DefaultDashboardGenerator:
                 category_field = "type"
 
             if category_field:
-                cat_data = (
-                    queryset.values(category_field)
-                    .annotate(count=Count("id"))
-                    .order_by("-count")
-                )
+                cat_data = self.get_grouped_counts(queryset, category_field)
 
-                if cat_data.exists():
+                if cat_data:
                     labels = [
                         item[category_field] or "Uncategorized" for item in cat_data
                     ]
@@ -606,13 +598,9 @@ class DefaultDashboardGenerator:
         try:
             for field in queryset.model._meta.fields:
                 if hasattr(field, "choices") and field.choices:
-                    choice_data = (
-                        queryset.values(field.name)
-                        .annotate(count=Count("id"))
-                        .order_by("-count")
-                    )
+                    choice_data = self.get_grouped_counts(queryset, field.name)
 
-                    if choice_data.exists():
+                    if choice_data:
                         labels = []
                         data = []
 
@@ -48,6 +48,13 @@ from genie_generics.views import (
 from genie_utils.methods import get_section_info_for_model
 from genie_utils.middlewares import _thread_local
 
+from .cache import get_or_build_component_data, get_user_scope
+from .rollups import (
+    TOTAL_DIMENSION,
+    get_rollup_grouped_counts,
+    get_rollup_total,
+    has_rollup,
+)
 from .utils import DefaultDashboardGenerator
 
 logger = logging.getLogger(__name__)
@@ -137,6 +144,21 @@ class HomePageView(LoginRequiredMixin, TemplateView):
         return super().render_to_response(context, **response_kwargs)
 
 
+def get_component_model(component):
+    """Return the model class a dashboard component is built on, if any."""
+    module_name = component.module.model if component.module else None
+    if not module_name:
+        return None
+    for app_config in apps.get_app_configs():
+        try:
+            return apps.get_model(
+                app_label=app_config.label, model_name=module_name.lower()
+            )
+        except LookupError:
+            continue
+    return None
+
+
 def get_queryset_for_module(user, model):
     """
     Returns queryset for a given model based on user permissions.
@@ -1113,30 +1135,13 @@ class DashboardDetailView(RecentlyViewedMixin, LoginRequiredMixin, TemplateView)
         is_home_view = section == "home" and is_home and is_default
 
         dashboard = self.get_object()
-        components = DashboardComponent.objects.filter(
-            dashboard=dashboard, is_active=True
-        ).order_by("sequence")
-
-        # Process KPI components
-        kpi_data = []
-        for component in components.filter(component_type="kpi"):
-            kpi = self.get_kpi_data(component, self.request)
-            if kpi:
-                kpi_data.append(kpi)
-
-        # Process chart components
-        chart_data = []
-        for component in components.filter(component_type="chart"):
-            chart = self.get_chart_data(component, self.request)
-            if chart:
-                chart_data.append(chart)
-
-        # Process table components
-        table_contexts = {}
-        for component in components.filter(component_type="table_data"):
-            model, table_context = self.get_table_data(component, self.request)
-            if model:
-                table_contexts[component.id] = table_context
+        # Components render as skeleton placeholders here; each one is loaded
+        # through its own HTMX endpoint so the page shell is returned at once.
+        components = list(
+            DashboardComponent.objects.filter(dashboard=dashboard, is_active=True)
+            .select_related("module", "reports")
+            .order_by("sequence")
+        )
 
         session_referer_key = f"dashboard_detail_referer_{dashboard.pk}"
         current_referer = self.request.META.get("HTTP_REFERER")
@@ -1165,10 +1170,7 @@ class DashboardDetailView(RecentlyViewedMixin, LoginRequiredMixin, TemplateView)
                 "current_obj": dashboard,
                 "dashboard": dashboard,
                 "components": components,
-                "has_components": components.exists(),
-                "kpi_data": kpi_data,
-                "chart_data": chart_data,
-                "table_contexts": table_contexts,
+                "has_components": bool(components),
                 "view_id": "dashboard_components",
                 "is_home_view": is_home_view,
                 "section": section,
@@ -1179,6 +1181,46 @@ class DashboardDetailView(RecentlyViewedMixin, LoginRequiredMixin, TemplateView)
         return context
 
 
+@method_decorator(htmx_required, name="dispatch")
+@method_decorator(
+    permission_required_or_denied(
+        ["horilla_dashboard.view_dashboard", "horilla_dashboard.view_own_dashboard"]
+    ),
+    name="dispatch",
+)
+class DashboardComponentTableView(LoginRequiredMixin, View):
+    """
+    Lazily render a table component of a dashboard into its placeholder.
+    """
+
+    def get(self, request, *args, **kwargs):
+        """Handle GET request to render the initial table of a component."""
+        try:
+            component = DashboardComponent.objects.get(
+                id=kwargs.get("component_id"),
+                component_type="table_data",
+                is_active=True,
+            )
+        except DashboardComponent.DoesNotExist:
+            return HttpResponse(
+                '<div class="text-gray-500 text-sm flex items-center justify-center h-full">Component not found</div>'
+            )
+
+        detail_view = DashboardDetailView()
+        detail_view.request = request
+        model, table_context = detail_view.get_table_data(component, request)
+        if not model:
+            return HttpResponse(
+                '<div class="text-gray-500 text-sm flex items-center justify-center h-full">No data available</div>'
+            )
+
+        return render(
+            request,
+            "dashboard_component_table.html",
+            {"table_context": table_context},
+        )
+
+
 @method_decorator(
     permission_required_or_denied(
         ["horilla_dashboard.view_dashboard", "horilla_dashboard.view_own_dashboard"]
@@ -2364,6 +2406,63 @@ class DashboardComponentChartView(View):
 
         return queryset
 
+    def can_use_rollup(self, model, grouping_field=TOTAL_DIMENSION):
+        """
+        Return True if a component can read the daily rollups instead of the
+        live rows: the user sees all rows and the grouping is rolled up.
+        """
+        return has_rollup(model, grouping_field) and (
+            get_user_scope(self.request.user, model) == "all"
+        )
+
+    def get_chart_rows(self, queryset, field):
+        """Group a queryset by the chart field, counting records"""
+        grouping_field = field.name
+        if field.is_relation and hasattr(field.remote_field.model, "name"):
+            return queryset.values(
+                f"{grouping_field}__name", f"{grouping_field}_id"
+            ).annotate(value=Count("id"))
+        if field.is_relation:
+            return queryset.values(grouping_field, f"{grouping_field}_id").annotate(
+                value=Count("id")
+            )
+        return queryset.values(grouping_field).annotate(value=Count("id"))
+
+    def get_rollup_chart_rows(self, model, field):
+        """
+        Read the grouped counts of a chart from the daily rollups, shaped like
+        the rows of ``get_chart_rows``.
+        """
+        grouping_field = field.name
+        grouped = get_rollup_grouped_counts(
+            model, grouping_field, getattr(self.request, "active_company", None)
+        )
+        if not field.is_relation:
+            return [
+                {grouping_field: item["dimension_value"], "value": item["value"]}
+                for item in grouped
+            ]
+
+        related_model = field.remote_field.model
+        has_name = hasattr(related_model, "name")
+        names = {}
+        if has_name:
+            names = dict(
+                related_model._base_manager.filter(
+                    pk__in=[item["dimension_value"] for item in grouped]
+                ).values_list("pk", "name")
+            )
+        rows = []
+        for item in grouped:
+            pk = item["dimension_value"]
+            row = {f"{grouping_field}_id": pk, "value": item["value"]}
+            if has_name:
+                row[f"{grouping_field}__name"] = names.get(pk)
+            else:
+                row[grouping_field] = pk
+            rows.append(row)
+        return rows
+
     def get_kpi_data(self, component):
         """
         Calculate KPI data - always returns count of records.
@@ -2412,7 +2511,12 @@ class DashboardComponentChartView(View):
             #             **{f"{condition.field}__lt": condition.value}
             #         )
 
-            value = queryset.count()
+            if not conditions and self.can_use_rollup(model):
+                value = get_rollup_total(
+                    model, getattr(self.request, "active_company", None)
+                )
+            else:
+                value = queryset.count()
 
             section_info = get_section_info_for_model(model)
 
@@ -2471,23 +2575,14 @@ class DashboardComponentChartView(View):
                         queryset, component, conditions, field, x_axis_label, model
                     )
 
-                queryset = self.apply_conditions(queryset, conditions)
-
-                # Always use Count for charts
-                if field.is_relation and hasattr(field.remote_field.model, "name"):
-                    queryset = queryset.values(
-                        f"{component.grouping_field}__name",
-                        f"{component.grouping_field}_id",
-                    ).annotate(value=Count("id"))
+                if not conditions.exists() and self.can_use_rollup(
+                    model, component.grouping_field
+                ):
+                    queryset = self.get_rollup_chart_rows(model, field)
                 else:
-                    if field.is_relation:
-                        queryset = queryset.values(
-                            component.grouping_field, f"{component.grouping_field}_id"
-                        ).annotate(value=Count("id"))
-                    else:
-                        queryset = queryset.values(component.grouping_field).annotate(
-                            value=Count("id")
-                        )
+                    queryset = self.get_chart_rows(
+                        self.apply_conditions(queryset, conditions), field
+                    )
 
                 labels = []
                 data = []
@@ -2903,8 +2998,20 @@ class DashboardComponentChartView(View):
         component_id = kwargs.get("component_id")
         try:
             component = DashboardComponent.objects.get(id=component_id)
+            model = get_component_model(component)
+            company = getattr(request, "active_company", None)
             if component.component_type == "kpi":
-                kpi_data = self.get_kpi_data(component)
+                kpi_data = (
+                    get_or_build_component_data(
+                        component,
+                        request.user,
+                        model,
+                        lambda: self.get_kpi_data(component),
+                        company,
+                    )
+                    if model
+                    else None
+                )
                 if not kpi_data:
                     return HttpResponse(
                         '<div class="text-gray-500 text-sm flex items-center justify-center h-full">No KPI data available</div>'
@@ -2953,10 +3060,18 @@ class DashboardComponentChartView(View):
                 return render(request, "kpi_components.html", context)
 
             if component.component_type == "chart":
-                if component.reports:
-                    chart_data = self.get_report_chart_data(component)
-                else:
-                    chart_data = self.get_chart_data(component)
+                builder = (
+                    (lambda: self.get_report_chart_data(component))
+                    if component.reports
+                    else (lambda: self.get_chart_data(component))
+                )
+                chart_data = (
+                    get_or_build_component_data(
+                        component, request.user, model, builder, company
+                    )
+                    if model
+                    else None
+                )
 
                 if not chart_data:
                     return HttpResponse(
@@ -0,0 +1,154 @@
+"""
+Compiled accessor plans for list view columns.
+
+A column path such as ``primary_campaign_source__campaign_owner`` is compiled
+once per model into the steps that resolve it on a row: a plain attribute
+for fields and forward relations, the first related object for to-many
+relations, and a dynamic lookup for methods and properties. Compiling the
+columns of a list view also gives the ``select_related`` and
+``prefetch_related`` lookups its queryset needs, so rendering a page costs
+the same queries whatever the number of rows or the depth of the columns.
+"""
+
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Manager, QuerySet
+
+ATTRIBUTE = "attribute"
+RELATED_FIRST = "related_first"
+DYNAMIC = "dynamic"
+
+
+def first_related(manager):
+    """
+    The first object of a to-many relation like ``manager.first()``, taken
+    from the prefetched rows when there are any.
+    """
+    queryset = manager.all()
+    if queryset._result_cache is None:
+        return queryset.first()
+    objects = list(queryset)
+    if not objects:
+        return None
+    if queryset.ordered:
+        return objects[0]
+    return min(objects, key=lambda obj: obj.pk)
+
+
+class ColumnPlan:
+    """Steps resolving one column path on a row of a model"""
+
+    def __init__(self, model, field_path):
+        self.field_path = field_path
+        self.parts = field_path.split("__")
+        self.steps = []
+        self.select_related = None
+        self.prefetch_related = None
+
+        # Relations walked so far, while they can still be joined or prefetched
+        lookup = []
+        many = False
+        for part in self.parts:
+            field = self.get_field(model, part)
+            if field is None:
+                model = None
+                self.steps.append((DYNAMIC, part))
+                continue
+            if not field.is_relation or part != self.relation_name(field):
+                # A plain value, or the id of a foreign key
+                self.steps.append((ATTRIBUTE, part))
+                model = None
+                continue
+            if field.one_to_many or field.many_to_many:
+                many = True
+                self.steps.append((RELATED_FIRST, part))
+            else:
+                self.steps.append((ATTRIBUTE, part))
+            lookup.append(part)
+            model = field.related_model
+
+        if lookup:
+            if many:
+                self.prefetch_related = "__".join(lookup)
+            else:
+                self.select_related = "__".join(lookup)
+
+    @staticmethod
+    def get_field(model, name):
+        """The field a path part reads, or None when it is not a plain field"""
+        if model is None or not hasattr(model, "_meta"):
+            return None
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if field.is_relation and field.related_model is None:
+            # Generic foreign keys resolve their own target
+            return None
+        if field.auto_created and not field.concrete:
+            # Reverse relations are only read through their accessor name
+            if field.get_accessor_name() != name:
+                return None
+        return field
+
+    @staticmethod
+    def relation_name(field):
+        """The attribute holding the related object(s) of a relation"""
+        if field.auto_created and not field.concrete:
+            return field.get_accessor_name()
+        return field.name
+
+    def resolve(self, obj):
+        """
+        Return ``(parent, value)`` for the path on the object, or
+        ``(None, None)`` when a to-many relation on the way is empty.
+        """
+        current = obj
+        parent = None
+        for kind, part in self.steps:
+            parent = current
+            current = getattr(current, part)
+            if kind == RELATED_FIRST or isinstance(current, (Manager, QuerySet)):
+                current = first_related(current)
+                if not current:
+                    return None, None
+            elif kind == DYNAMIC and callable(current):
+                current = current()
+        return parent, current
+
+
+@lru_cache(maxsize=4096)
+def get_column_plan(model, field_path):
+    """The compiled plan of a column path on a model, built once per process"""
+    return ColumnPlan(model, field_path)
+
+
+def get_related_lookups(model, field_paths):
+    """
+    Return the ``(select_related, prefetch_related)`` lookups needed to
+    render the given column paths without a query per row.
+    """
+    select_related = []
+    prefetch_related = []
+    for field_path in field_paths:
+        if not field_path:
+            continue
+        plan = get_column_plan(model, field_path)
+        if plan.select_related and plan.select_related not in select_related:
+            select_related.append(plan.select_related)
+        if plan.prefetch_related and plan.prefetch_related not in prefetch_related:
+            prefetch_related.append(plan.prefetch_related)
+    return select_related, prefetch_related
+
+
+def apply_column_plans(queryset, field_paths):
+    """Join or prefetch the relations the column paths read"""
+    if not isinstance(queryset, QuerySet):
+        return queryset
+    select_related, prefetch_related = get_related_lookups(queryset.model, field_paths)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    return queryset
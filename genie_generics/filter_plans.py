@@ -0,0 +1,184 @@
+"""
+Compiled filter plans for ``HorillaFilterSet`` and saved filter lists.
+
+The filter bar sends parallel ``field``, ``operator``, ``value``,
+``start_value`` and ``end_value`` lists. They are normalised into a spec,
+a tuple of conditions, which is compiled once per model into the ``Q``
+objects to apply:
+
+* conditions are validated against the model when compiled, and the ones
+  the ORM rejects (unknown fields or lookups, values of the wrong type) are
+  dropped, as the filter set used to skip them on every request;
+* conditions on single-valued paths are combined into one ``Q`` applied
+  with a single ``filter()``, while conditions across to-many relations
+  keep a ``filter()`` each, so they still match through separate joins;
+* conditions on names that are not model fields, such as annotations, are
+  applied as they come and skipped if the queryset rejects them.
+
+Plans are cached by spec, so saved filter lists and the filter bar share
+them. A plan also lists the fields its comparisons would want an index on,
+which ``manage.py suggest_filter_indexes`` reports for saved filters.
+"""
+
+import logging
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q, QuerySet
+
+logger = logging.getLogger(__name__)
+
+FILTER_KEYS = ["field", "operator", "value", "start_value", "end_value"]
+
+# Operators a B-tree index can serve
+INDEXABLE_OPERATORS = {"exact", "gt", "gte", "lt", "lte", "between"}
+
+
+def get_filter_spec(data):
+    """
+    Return the conditions of filter bar parameters as a hashable tuple of
+    ``(field, operator, value, start_value, end_value)``, leaving out the
+    ones the filter set ignores. ``data`` maps each key to a list, like a
+    ``QueryDict`` or the ``filter_params`` of a saved filter list.
+    """
+    if hasattr(data, "getlist"):
+        lists = [data.getlist(key, []) for key in FILTER_KEYS]
+    else:
+        lists = [data.get(key) or [] for key in FILTER_KEYS]
+    fields, operators, values, start_values, end_values = lists
+
+    def item(items, i):
+        return items[i] if i < len(items) else None
+
+    spec = []
+    for i, (field, operator) in enumerate(zip(fields, operators)):
+        if not field or not operator:
+            continue
+        if operator == "between":
+            start_value, end_value = item(start_values, i), item(end_values, i)
+            if start_value or end_value:
+                spec.append((field, operator, None, start_value, end_value))
+        elif operator in ("isnull", "isnotnull"):
+            spec.append((field, operator, None, None, None))
+        else:
+            value = item(values, i)
+            if value is not None:
+                spec.append((field, operator, value, None, None))
+    return tuple(spec)
+
+
+def build_condition(field, operator, value, start_value, end_value):
+    """The ``Q`` object of one condition"""
+    if operator == "ne":
+        return ~Q(**{field: value})
+    if operator == "between":
+        lookups = {}
+        if start_value:
+            lookups[f"{field}__gte"] = start_value
+        if end_value:
+            lookups[f"{field}__lte"] = end_value
+        return Q(**lookups)
+    if operator == "isnull":
+        return Q(**{f"{field}__isnull": True})
+    if operator == "isnotnull":
+        return Q(**{f"{field}__isnull": False})
+    return Q(**{f"{field}__{operator}": value})
+
+
+def resolve_path(model, field):
+    """
+    Return ``(fields, many)``: the model fields a filter path walks, and
+    whether it crosses a to-many relation. ``fields`` is empty when the
+    path does not start with a model field.
+    """
+    fields = []
+    many = False
+    for part in field.split("__"):
+        if model is None:
+            break
+        try:
+            model_field = (
+                model._meta.pk if part == "pk" else model._meta.get_field(part)
+            )
+        except FieldDoesNotExist:
+            # A lookup or transform such as __year ends the path
+            break
+        fields.append(model_field)
+        if model_field.many_to_many or model_field.one_to_many:
+            many = True
+        model = model_field.related_model if model_field.is_relation else None
+    return fields, many
+
+
+def is_indexed(field):
+    """Whether a field leads an index of its model"""
+    if field.primary_key or field.unique or field.db_index:
+        return True
+    meta = field.model._meta
+    for index in meta.indexes:
+        if index.fields and index.fields[0].lstrip("-") == field.name:
+            return True
+    for constraint_fields in meta.unique_together:
+        if constraint_fields and constraint_fields[0] == field.name:
+            return True
+    return False
+
+
+class FilterPlan:
+    """The compiled ``Q`` objects of a filter spec on a model"""
+
+    def __init__(self, model, spec):
+        self.model = model
+        self.spec = spec
+        # Q objects of every condition on single-valued paths, and ones to
+        # apply by themselves: to-many paths, then unchecked names
+        self.combined = Q()
+        self.separate = []
+        self.unchecked = []
+        self.index_suggestions = []
+
+        for condition in spec:
+            field, operator = condition[:2]
+            q = build_condition(*condition)
+            path, many = resolve_path(model, field)
+            if not path:
+                self.unchecked.append((condition, q))
+                continue
+            try:
+                QuerySet(model=model).filter(q)
+            except Exception as e:
+                logger.error(f"Filter error for {field} {operator}: {e}")
+                continue
+
+            if many:
+                self.separate.append(q)
+            else:
+                self.combined &= q
+            target = path[-1]
+            if (
+                operator in INDEXABLE_OPERATORS
+                and target.concrete
+                and not target.is_relation
+                and not is_indexed(target)
+                and target not in self.index_suggestions
+            ):
+                self.index_suggestions.append(target)
+
+    def apply(self, queryset):
+        """Filter a queryset of the plan's model"""
+        if self.combined:
+            queryset = queryset.filter(self.combined)
+        for q in self.separate:
+            queryset = queryset.filter(q)
+        for (field, operator, *_), q in self.unchecked:
+            try:
+                queryset = queryset.filter(q)
+            except Exception as e:
+                logger.error(f"Filter error for {field} {operator}: {e}")
+        return queryset
+
+
+@lru_cache(maxsize=1024)
+def get_filter_plan(model, spec):
+    """The compiled plan of a filter spec on a model, built once per process"""
+    return FilterPlan(model, spec)
@@ -3,6 +3,8 @@ import logging
 import django_filters
 from django.db.models import Q
 
+from genie_generics.filter_plans import FILTER_KEYS, get_filter_plan, get_filter_spec
+
 logger = logging.getLogger(__name__)
 # Define operator choices by field type
 OPERATOR_CHOICES = {
@@ -87,7 +89,7 @@ class HorillaFilterSet(django_filters.FilterSet):
     def filter_queryset(self, queryset):
         """
         Override the default filter_queryset to handle our custom filtering approach.
-        Process arrays of fields, operators, and values.
+        Process arrays of fields, operators, and values through a compiled filter plan.
         """
         if hasattr(self, "form") and hasattr(self.form, "cleaned_data"):
             queryset = super().filter_queryset(queryset)
@@ -99,54 +101,13 @@ class HorillaFilterSet(django_filters.FilterSet):
         if not request:
             return queryset
 
-        fields = self.data.getlist("field", []) or request.GET.getlist("field", [])
-        operators = self.data.getlist("operator", []) or request.GET.getlist(
-            "operator", []
-        )
-        values = self.data.getlist("value", []) or request.GET.getlist("value", [])
-        start_values = self.data.getlist("start_value", []) or request.GET.getlist(
-            "start_value", []
-        )
-        end_values = self.data.getlist("end_value", []) or request.GET.getlist(
-            "end_value", []
-        )
-
-        for i, (field, operator) in enumerate(zip(fields, operators)):
-            if not field or not operator:
-                continue
-
-            try:
-                if operator == "ne":
-                    value = values[i] if i < len(values) else None
-                    if value is not None:
-                        queryset = queryset.exclude(**{field: value})
-
-                elif operator == "between":
-                    start_value = start_values[i] if i < len(start_values) else None
-                    end_value = end_values[i] if i < len(end_values) else None
-
-                    if start_value and end_value:
-                        queryset = queryset.filter(
-                            **{f"{field}__gte": start_value, f"{field}__lte": end_value}
-                        )
-                    elif start_value:
-                        queryset = queryset.filter(**{f"{field}__gte": start_value})
-                    elif end_value:
-                        queryset = queryset.filter(**{f"{field}__lte": end_value})
-
-                elif operator == "isnull":
-                    queryset = queryset.filter(**{f"{field}__isnull": True})
-
-                elif operator == "isnotnull":
-                    queryset = queryset.filter(**{f"{field}__isnull": False})
-
-                else:
-                    value = values[i] if i < len(values) else None
-                    if value is not None:
-                        queryset = queryset.filter(**{f"{field}__{operator}": value})
-
-            except Exception as e:
-                logger.error(f"Filter error for {field} {operator}: {e}")
+        params = {
+            key: self.data.getlist(key, []) or request.GET.getlist(key, [])
+            for key in FILTER_KEYS
+        }
+        spec = get_filter_spec(params)
+        if spec:
+            queryset = get_filter_plan(queryset.model, spec).apply(queryset)
 
         search_query = self.data.get("search", "") or request.GET.get("search", "")
         if search_query:
@@ -6,7 +6,6 @@ from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
 from django import template
 from django.apps import apps
 from django.db import models
-from django.db.models import Manager, QuerySet
 from django.forms import BaseForm
 from django.template.loader import render_to_string
 from django.templatetags.static import static
@@ -17,8 +16,8 @@ from django.utils.safestring import mark_safe
 
 from genie.menu.sub_section_menu import get_sub_section_menu
 from genie.registry.js_registry import get_registered_js
-from genie_core.models import MultipleCurrency
-from genie_core.utils import get_currency_display_value
+from genie_core.utils import get_currency_context, get_currency_display_value
+from genie_generics.column_plans import get_column_plan
 from genie_utils.middlewares import _thread_local
 
 register = template.Library()
@@ -31,21 +30,14 @@ def get_field(obj, field_path):
     supports callables and Manager/QuerySet (takes first related object).
     If the final field is a declared currency field on its model (CURRENCY_FIELDS),
     uses get_currency_display_value(parent_obj, final_field_name, user).
+    The path is resolved with the model's compiled column plan.
     """
     try:
-        current = obj
-        parent = None
-        parts = field_path.split("__")
-
-        for part in parts:
-            parent = current  # keep track of the parent object before resolving part
-            current = getattr(current, part)
-            if isinstance(current, (Manager, QuerySet)):
-                current = current.first()
-                if not current:
-                    return ""
-            elif callable(current):
-                current = current()
+        plan = get_column_plan(type(obj), field_path)
+        parts = plan.parts
+        parent, current = plan.resolve(obj)
+        if parent is None:
+            return ""
 
         # Obtain the request/user from thread-local (same as you used elsewhere)
         request = getattr(_thread_local, "request", None)
@@ -871,7 +863,7 @@ def format_currency(value, user):
     if not value:
         return ""
 
-    user_currency = MultipleCurrency.get_user_currency(user)
+    user_currency = get_currency_context(user).user_currency
     if user_currency:
         return user_currency.display_with_symbol(value)
 
@@ -1,3 +1,422 @@
-from django.test import TestCase
+"""
+Tests for horilla_generics
+"""
 
-# Create your horilla_generics tests here.
+import datetime
+import time
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.signals import user_logged_in
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Manager, QuerySet
+from django.http import QueryDict
+from django.test import RequestFactory, TestCase, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from login_history.models import post_login
+
+from genie_core.models import HorillaUser, SavedFilterList
+from genie_crm.campaigns.filters import CampaignFilter
+from genie_crm.campaigns.models import Campaign
+from genie_crm.opportunities.models import Opportunity, OpportunityStage
+from genie_generics.column_plans import apply_column_plans, get_column_plan
+from genie_generics.filter_plans import FILTER_KEYS, get_filter_plan, get_filter_spec
+from genie_generics.templatetags.horilla_tags import get_field
+
+COLUMNS_BY_DEPTH = [
+    ["campaign_name", "get_campaign_type_display"],
+    ["campaign_owner", "parent_campaign__campaign_name"],
+    ["parent_campaign__campaign_owner__email", "opportunities__stage__name"],
+    ["parent_campaign__parent_campaign__campaign_owner__username"],
+]
+
+
+def walk_path(obj, field_path):
+    """Resolve a column path with getattr and first(), as rendered before plans"""
+    current = obj
+    for part in field_path.split("__"):
+        current = getattr(current, part)
+        if isinstance(current, (Manager, QuerySet)):
+            current = current.first()
+            if not current:
+                return ""
+        elif callable(current):
+            current = current()
+    return str(current) if current is not None else ""
+
+
+class ColumnPlanTests(TestCase):
+    """Test list columns render from compiled plans in a fixed number of queries"""
+
+    def setUp(self):
+        """Set up nested campaigns with owners and opportunities"""
+        self.users = [
+            HorillaUser.objects.create_user(
+                username=f"owner{index}",
+                email=f"owner{index}@example.com",
+                password="password123",
+            )
+            for index in range(3)
+        ]
+        self.stage = OpportunityStage.objects.create(
+            name="Prospecting", order=1, probability=Decimal("20")
+        )
+        self.root = Campaign.objects.create(
+            campaign_name="Root",
+            campaign_type="email",
+            campaign_owner=self.users[0],
+        )
+        self.parent = Campaign.objects.create(
+            campaign_name="Parent",
+            campaign_type="email",
+            campaign_owner=self.users[1],
+            parent_campaign=self.root,
+        )
+
+    def create_campaigns(self, count):
+        for index in range(count):
+            campaign = Campaign.objects.create(
+                campaign_name=f"Campaign {index}",
+                campaign_type="webinar",
+                campaign_owner=self.users[index % 3],
+                parent_campaign=self.parent,
+            )
+            for number in range(index % 3):
+                Opportunity.objects.create(
+                    name=f"Deal {index} {number}",
+                    owner=self.users[0],
+                    stage=self.stage,
+                    primary_campaign_source=campaign,
+                )
+
+    def render(self, columns):
+        """Render every column of every campaign and count the queries"""
+        queryset = Campaign.objects.filter(parent_campaign=self.parent).order_by("pk")
+        with CaptureQueriesContext(connection) as ctx:
+            cells = [
+                get_field(campaign, column)
+                for campaign in apply_column_plans(queryset, columns)
+                for column in columns
+            ]
+        return cells, len(ctx.captured_queries)
+
+    def test_plan_lookups(self):
+        """Test plans join to-one relations and prefetch to-many ones"""
+        plan = get_column_plan(Campaign, "parent_campaign__campaign_owner__email")
+        self.assertEqual(plan.select_related, "parent_campaign__campaign_owner")
+        self.assertIsNone(plan.prefetch_related)
+
+        plan = get_column_plan(Campaign, "opportunities__stage__name")
+        self.assertEqual(plan.prefetch_related, "opportunities__stage")
+
+        plan = get_column_plan(Campaign, "get_campaign_type_display")
+        self.assertIsNone(plan.select_related)
+        self.assertIsNone(plan.prefetch_related)
+
+        plan = get_column_plan(Campaign, "campaign_owner_id")
+        self.assertIsNone(plan.select_related)
+
+    def test_cells_match_attribute_walk(self):
+        """Test compiled plans render the values the getattr walk did"""
+        self.create_campaigns(6)
+        columns = [column for group in COLUMNS_BY_DEPTH for column in group]
+        cells, _ = self.render(columns)
+
+        queryset = Campaign.objects.filter(parent_campaign=self.parent).order_by("pk")
+        expected = [
+            walk_path(campaign, column) for campaign in queryset for column in columns
+        ]
+        self.assertEqual(cells, expected)
+        self.assertIn("owner0", cells)
+
+    def test_queries_independent_of_rows_and_depth(self):
+        """Test a page costs the same queries for any row count and column depth"""
+        self.create_campaigns(3)
+        shallow = COLUMNS_BY_DEPTH[0]
+        deep = [column for group in COLUMNS_BY_DEPTH for column in group]
+        _, shallow_few = self.render(shallow)
+        _, deep_few = self.render(deep)
+
+        self.create_campaigns(30)
+        _, shallow_many = self.render(shallow)
+        _, deep_many = self.render(deep)
+
+        self.assertEqual(shallow_few, shallow_many)
+        self.assertEqual(deep_few, deep_many)
+        # The rows, then one query per prefetched relation
+        self.assertEqual(shallow_many, 1)
+        self.assertEqual(deep_many, 3)
+
+
+class ListViewColumnPlanTests(TestCase):
+    """Test the list view fetches the relations its columns read up front"""
+
+    def setUp(self):
+        """Set up a superuser and opportunities linked to campaigns"""
+        cache.clear()
+        self.user = HorillaUser.objects.create_superuser(
+            username="admin", email="admin@example.com", password="password123"
+        )
+        self.stages = [
+            OpportunityStage.objects.create(
+                name=name, order=order, probability=Decimal("20")
+            )
+            for order, name in enumerate(["Prospecting", "Proposal"], start=1)
+        ]
+        user_logged_in.disconnect(post_login)
+        self.addCleanup(user_logged_in.connect, post_login)
+        self.client.force_login(self.user)
+
+    def create_opportunities(self, count):
+        for index in range(count):
+            campaign = Campaign.objects.create(
+                campaign_name=f"Campaign {index}",
+                campaign_type="email",
+                campaign_owner=self.user,
+            )
+            Opportunity.objects.create(
+                name=f"Deal {index}",
+                owner=self.user,
+                stage=self.stages[index % 2],
+                primary_campaign_source=campaign,
+            )
+
+    def get_list(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(
+                reverse("opportunities:opportunities_list"), HTTP_HX_REQUEST="true"
+            )
+        return response, len(ctx.captured_queries)
+
+    def test_queries_do_not_grow_with_rows(self):
+        """Test the stage and campaign columns add no query per row"""
+        self.create_opportunities(3)
+        self.get_list()
+        response, few = self.get_list()
+        self.assertContains(response, "Campaign 2")
+
+        self.create_opportunities(30)
+        response, many = self.get_list()
+        self.assertContains(response, "Proposal")
+
+        self.assertEqual(few, many)
+
+
+def legacy_filter(queryset, params):
+    """Apply filter bar parameters condition by condition, as before plans"""
+    fields, operators, values, start_values, end_values = (
+        params.getlist(key) for key in FILTER_KEYS
+    )
+    for i, (field, operator) in enumerate(zip(fields, operators)):
+        if not field or not operator:
+            continue
+        try:
+            if operator == "ne":
+                value = values[i] if i < len(values) else None
+                if value is not None:
+                    queryset = queryset.exclude(**{field: value})
+            elif operator == "between":
+                start_value = start_values[i] if i < len(start_values) else None
+                end_value = end_values[i] if i < len(end_values) else None
+                if start_value and end_value:
+                    queryset = queryset.filter(
+                        **{f"{field}__gte": start_value, f"{field}__lte": end_value}
+                    )
+                elif start_value:
+                    queryset = queryset.filter(**{f"{field}__gte": start_value})
+                elif end_value:
+                    queryset = queryset.filter(**{f"{field}__lte": end_value})
+            elif operator == "isnull":
+                queryset = queryset.filter(**{f"{field}__isnull": True})
+            elif operator == "isnotnull":
+                queryset = queryset.filter(**{f"{field}__isnull": False})
+            else:
+                value = values[i] if i < len(values) else None
+                if value is not None:
+                    queryset = queryset.filter(**{f"{field}__{operator}": value})
+        except Exception:
+            pass
+    return queryset
+
+
+def filter_params(*conditions):
+    """Filter bar parameters of (field, operator, value, start, end) tuples"""
+    params = QueryDict(mutable=True)
+    for condition in conditions:
+        for key, value in zip(FILTER_KEYS, condition):
+            params.appendlist(key, "" if value is None else value)
+    return params
+
+
+FILTER_SPECS = [
+    [("campaign_name", "icontains", "CAMPAIGN 1")],
+    [
+        ("campaign_type", "exact", "webinar"),
+        ("campaign_owner__username", "ne", "owner0"),
+    ],
+    [("budget_cost", "between", None, "100", None)],
+    [("budget_cost", "between", None, "100", "400"), ("end_date", "isnull")],
+    [("start_date", "between", None, None, "2026-01-03")],
+    [("parent_campaign", "isnotnull"), ("number_sent", "gte", "2")],
+    # Rejected conditions are skipped, the others still apply
+    [("nope", "exact", "1"), ("budget_cost", "gt", "abc")],
+    [("budget_cost", "regexx", "1"), ("campaign_type", "exact", "email")],
+    # Through a to-many relation, each condition may match another row
+    [
+        ("opportunities__name", "icontains", "Deal 1"),
+        ("opportunities__name", "icontains", "Deal 2"),
+    ],
+    [("opportunities__stage__name", "ne", "Prospecting")],
+    [("opportunity_count", "gte", "2"), ("campaign_type", "exact", "email")],
+]
+
+
+class FilterPlanTests(TestCase):
+    """Test compiled filter plans return what condition-by-condition filters did"""
+
+    def setUp(self):
+        """Set up campaigns with owners, dates, costs and opportunities"""
+        self.users = [
+            HorillaUser.objects.create_user(
+                username=f"owner{index}",
+                email=f"owner{index}@example.com",
+                password="password123",
+            )
+            for index in range(3)
+        ]
+        self.stages = [
+            OpportunityStage.objects.create(
+                name=name, order=order, probability=Decimal("20")
+            )
+            for order, name in enumerate(["Prospecting", "Proposal"], start=1)
+        ]
+        parent = None
+        for index in range(12):
+            campaign = Campaign.objects.create(
+                campaign_name=f"Campaign {index}",
+                campaign_type=["email", "webinar"][index % 2],
+                campaign_owner=self.users[index % 3],
+                parent_campaign=parent,
+                budget_cost=Decimal(index * 50),
+                number_sent=index % 4,
+                start_date=datetime.date(2026, 1, 1 + index),
+                end_date=datetime.date(2026, 2, 1) if index % 3 else None,
+            )
+            parent = parent or campaign
+            for number in range(index % 3):
+                Opportunity.objects.create(
+                    name=f"Deal {number + 1}",
+                    owner=self.users[0],
+                    stage=self.stages[(index + number) % 2],
+                    primary_campaign_source=campaign,
+                )
+        self.factory = RequestFactory()
+
+    def queryset(self):
+        return Campaign.objects.annotate(
+            opportunity_count=Count("opportunities")
+        ).order_by("pk")
+
+    def compiled_filter(self, params):
+        request = self.factory.get("/", params)
+        return CampaignFilter(
+            request.GET, queryset=self.queryset(), request=request
+        ).filter_queryset(self.queryset())
+
+    def test_plans_match_condition_by_condition_filters(self):
+        """Test every spec returns the rows of the former filtering loop"""
+        for conditions in FILTER_SPECS:
+            params = filter_params(*conditions)
+            expected = list(legacy_filter(self.queryset(), params))
+            self.assertEqual(list(self.compiled_filter(params)), expected, conditions)
+        self.assertTrue(list(self.compiled_filter(filter_params(*FILTER_SPECS[8]))))
+
+        # All of them at once, as the benchmark filters
+        params = filter_params(*[c for spec in FILTER_SPECS[:6] for c in spec])
+        expected = list(legacy_filter(self.queryset(), params))
+        self.assertEqual(list(self.compiled_filter(params)), expected)
+
+    def test_plans_are_cached_by_spec(self):
+        """Test the same conditions compile once, from any source"""
+        spec = get_filter_spec(filter_params(*FILTER_SPECS[3]))
+        plan = get_filter_plan(Campaign, spec)
+        saved_params = {
+            key: values for key, values in filter_params(*FILTER_SPECS[3]).lists()
+        }
+        self.assertIs(get_filter_plan(Campaign, get_filter_spec(saved_params)), plan)
+
+        plan = get_filter_plan(
+            Campaign, get_filter_spec(filter_params(*FILTER_SPECS[6]))
+        )
+        # The rejected value is dropped; the unknown name is tried per query,
+        # as it may be an annotation
+        self.assertFalse(plan.combined)
+        self.assertEqual(plan.separate, [])
+        self.assertEqual(
+            [condition for condition, _ in plan.unchecked],
+            [("nope", "exact", "1", None, None)],
+        )
+
+    def test_index_suggestions(self):
+        """Test comparisons on unindexed columns are suggested an index"""
+        spec = get_filter_spec(
+            filter_params(
+                ("budget_cost", "gt", "10"),
+                ("campaign_owner", "exact", str(self.users[0].pk)),
+                ("campaign_name", "icontains", "x"),
+                ("opportunities__name", "exact", "Deal 1"),
+            )
+        )
+        suggestions = get_filter_plan(Campaign, spec).index_suggestions
+        self.assertEqual(
+            suggestions,
+            [
+                Campaign._meta.get_field("budget_cost"),
+                Opportunity._meta.get_field("name"),
+            ],
+        )
+
+        SavedFilterList.all_objects.create(
+            user=self.users[0],
+            name="Big budgets",
+            model_name="Campaign",
+            filter_params={
+                "field": ["budget_cost"],
+                "operator": ["gte"],
+                "value": ["100"],
+            },
+        )
+        out = StringIO()
+        call_command("suggest_filter_indexes", stdout=out)
+        self.assertIn(
+            "campaigns.Campaign.budget_cost: used by 1 saved filter", out.getvalue()
+        )
+
+
+@tag("benchmark")
+class FilterPlanBenchmarkTests(TestCase):
+    """Benchmark filtering from cached plans against the former loop"""
+
+    def test_filter_benchmark_against_condition_by_condition(self):
+        """Test filtering a queryset from a cached plan is faster"""
+        params = filter_params(*[c for spec in FILTER_SPECS[:6] for c in spec])
+        queryset = Campaign.objects.all()
+
+        def compiled():
+            spec = get_filter_spec(params)
+            return get_filter_plan(Campaign, spec).apply(queryset)
+
+        timings = {}
+        for name, apply in [
+            ("legacy", lambda: legacy_filter(queryset, params)),
+            ("compiled", compiled),
+        ]:
+            start = time.perf_counter()
+            for _ in range(1000):
+                apply()
+            timings[name] = time.perf_counter() - start
+
+        self.assertLess(timings["compiled"], timings["legacy"])
@@ -69,7 +69,9 @@ from genie_core.models import (
     RecentlyViewed,
     RecycleBin,
 )
-from genie_core.utils import get_field_permissions_for_model
+from genie_core.signals import records_bulk_written
+from genie_core.utils import get_field_permissions_for_model, get_updated_at_stamp
+from genie_generics.column_plans import apply_column_plans
 from genie_generics.forms import (
     HorillaAttachmentForm,
     HorillaHistoryForm,
@@ -540,6 +542,13 @@ class HorillaListView(ListView):
                 )
         return auto_columns
 
+    def apply_column_plans(self, queryset):
+        """Join or prefetch the relations read by the visible columns."""
+        field_paths = [col[1] for col in self._get_columns() if len(col) > 1]
+        if self.action_method:
+            field_paths.append(self.action_method)
+        return apply_column_plans(queryset, field_paths)
+
     def _apply_sorting(self, queryset, field, direction):
         """Fast sorting: uses DB fields or mapped aliases only."""
 
@@ -1910,9 +1919,16 @@ class HorillaListView(ListView):
             content_type = ContentType.objects.get_for_model(self.model)
             user = self.request.user if self.request.user.is_authenticated else None
 
-            updated_count = queryset.update(**update_dict)
+            updated_count = queryset.update(
+                **update_dict, **get_updated_at_stamp(self.model)
+            )
 
             if updated_count > 0:
+                records_bulk_written.send(
+                    sender=self.model,
+                    pks=list(records_before),
+                    fields=list(update_dict),
+                )
                 for record_id in record_ids:
                     if record_id not in records_before:
                         continue
@@ -2138,6 +2154,8 @@ class HorillaListView(ListView):
 
     def get_context_data(self, **kwargs):
         """Enhance context with column and filtering information."""
+        if "object_list" not in kwargs and hasattr(self, "object_list"):
+            kwargs["object_list"] = self.apply_column_plans(self.object_list)
         context = super().get_context_data(**kwargs)
         if self.store_ordered_ids:
             context["ordered_ids_key"] = self.ordered_ids_key
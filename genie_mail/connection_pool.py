@@ -0,0 +1,148 @@
+"""
+Per-worker pool of open SMTP connections.
+
+Connections are kept per thread and keyed by the mail server configuration
+(its id and connection settings, so edited credentials never reuse a stale
+session). A pooled connection is reused while it has been idle for less
+than MAIL_CONNECTION_IDLE_TIMEOUT seconds and answers a NOOP; otherwise it
+is closed and reopened. Outlook configurations send through the Graph API
+and are not pooled.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from smtplib import SMTPException
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+logger = logging.getLogger(__name__)
+
+MAIL_CONNECTION_IDLE_TIMEOUT = getattr(settings, "MAIL_CONNECTION_IDLE_TIMEOUT", 60)
+
+# Configuration fields that a pooled SMTP session was opened with
+CONNECTION_FIELDS = [
+    "host",
+    "port",
+    "username",
+    "password",
+    "use_tls",
+    "use_ssl",
+    "timeout",
+    "fail_silently",
+]
+
+
+class MailConnectionPool:
+    """Reuse open SMTP backend connections across messages"""
+
+    def __init__(self, idle_timeout=None):
+        self.idle_timeout = (
+            MAIL_CONNECTION_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        )
+        self._local = threading.local()
+
+    @property
+    def connections(self):
+        """Open connections of the current worker thread, by pool key"""
+        if not hasattr(self._local, "connections"):
+            self._local.connections = {}
+        return self._local.connections
+
+    @staticmethod
+    def get_key(configuration):
+        """
+        Return the pool key of a mail server configuration, covering every
+        setting the SMTP session depends on
+        """
+        settings_hash = hashlib.sha256(
+            repr(
+                [getattr(configuration, field, None) for field in CONNECTION_FIELDS]
+            ).encode()
+        ).hexdigest()[:16]
+        return f"{configuration.pk}_{settings_hash}"
+
+    @staticmethod
+    def is_healthy(backend):
+        """Return True if the backend's SMTP session still answers"""
+        connection = getattr(backend, "connection", None)
+        if connection is None:
+            return False
+        try:
+            return connection.noop()[0] == 250
+        except (SMTPException, OSError):
+            return False
+
+    @staticmethod
+    def close_backend(backend):
+        """Close a backend, ignoring errors from an already dropped session"""
+        try:
+            backend.close()
+        except Exception as e:
+            logger.warning("Error closing mail connection: %s", e)
+
+    def sweep(self, now=None):
+        """Close connections that have been idle longer than the timeout"""
+        now = time.monotonic() if now is None else now
+        for key, (backend, last_used) in list(self.connections.items()):
+            if now - last_used > self.idle_timeout:
+                self.close_backend(backend)
+                del self.connections[key]
+
+    def get_connection(self, configuration):
+        """
+        Return an open backend for the configuration, reusing the pooled
+        connection when it is still fresh and healthy.
+        """
+        from genie_mail.horilla_backends import HorillaDefaultMailBackend
+
+        if configuration is None:
+            return get_connection(
+                "genie_mail.horilla_backends.HorillaDefaultMailBackend"
+            )
+        if configuration.type != "mail":
+            return HorillaDefaultMailBackend(configuration=configuration)
+
+        now = time.monotonic()
+        self.sweep(now)
+
+        key = self.get_key(configuration)
+        for stale_key in [
+            k for k in self.connections if k.split("_")[0] == str(configuration.pk)
+        ]:
+            if stale_key != key:
+                self.close_backend(self.connections.pop(stale_key)[0])
+
+        entry = self.connections.get(key)
+        if entry:
+            backend = entry[0]
+            if self.is_healthy(backend):
+                self.connections[key] = (backend, now)
+                return backend
+            self.close_backend(backend)
+            del self.connections[key]
+
+        backend = HorillaDefaultMailBackend(configuration=configuration)
+        backend.open()
+        if backend.connection is not None:
+            self.connections[key] = (backend, now)
+        return backend
+
+    def discard(self, configuration):
+        """Close and forget the pooled connection of a configuration"""
+        if configuration is None:
+            return
+        entry = self.connections.pop(self.get_key(configuration), None)
+        if entry:
+            self.close_backend(entry[0])
+
+    def close_all(self):
+        """Close every pooled connection of the current worker thread"""
+        for backend, _ in self.connections.values():
+            self.close_backend(backend)
+        self.connections.clear()
+
+
+connection_pool = MailConnectionPool()
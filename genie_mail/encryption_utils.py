@@ -4,6 +4,27 @@ from cryptography.fernet import Fernet
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 
+# Key file contents by path, with the mtime they were read at
+_key_files = {}
+
+# The (key, Fernet) pair built for the current key
+_cipher = (None, None)
+
+
+def read_key_file(key_file):
+    """
+    Read the encryption key from a key file, reusing the last read while
+    the file's mtime is unchanged, so a rotated key is picked up.
+    """
+    mtime = os.stat(key_file).st_mtime_ns
+    cached = _key_files.get(key_file)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(key_file, "r") as f:
+        key = f.read().strip()
+    _key_files[key_file] = (mtime, key)
+    return key
+
 
 def get_or_create_encryption_key():
     """
@@ -22,8 +43,7 @@ def get_or_create_encryption_key():
         key_file = os.path.join(settings.BASE_DIR, ".encryption_key")
 
         if os.path.exists(key_file):
-            with open(key_file, "r") as f:
-                key = f.read().strip()
+            key = read_key_file(key_file)
         else:
             # Generate new key and save it
             key = Fernet.generate_key().decode()
@@ -36,11 +56,17 @@ def get_or_create_encryption_key():
 
 
 def get_cipher():
-    """Get Fernet cipher instance"""
+    """Get Fernet cipher instance, built once per encryption key"""
+    global _cipher
+
     key = get_or_create_encryption_key()
     if not key:
         raise ImproperlyConfigured("Could not get or create encryption key")
-    return Fernet(key.encode())
+    cached_key, cipher = _cipher
+    if cached_key != key:
+        cipher = Fernet(key.encode())
+        _cipher = (key, cipher)
+    return cipher
 
 
 def encrypt_password(plain_password):
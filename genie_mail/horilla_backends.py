@@ -1,4 +1,5 @@
 import logging
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 
 import requests
@@ -30,9 +31,10 @@ class HorillaDefaultMailBackend(EmailBackend):
         timeout=None,
         ssl_keyfile=None,
         ssl_certfile=None,
+        configuration=None,
         **kwargs,
     ):
-        self.configuration = self.get_dynamic_email_config()
+        self.configuration = configuration or self.get_dynamic_email_config()
         ssl_keyfile = (
             getattr(self.configuration, "ssl_keyfile", None)
             if self.configuration
@@ -87,9 +89,10 @@ class HorillaDefaultMailBackend(EmailBackend):
         if request and not request.user.is_anonymous:
             company = request.user.company
 
-        configuration = None
+        # Set by use_mail_configuration while a resolved configuration is in use
+        configuration = getattr(_thread_local, "mail_configuration", None)
 
-        if from_mail_id:
+        if not configuration and from_mail_id:
             try:
                 configuration = HorillaMailConfiguration.objects.filter(
                     pk=from_mail_id
@@ -355,7 +358,7 @@ class HorillaDefaultMailBackend(EmailBackend):
 
             message_data = self._prepare_outlook_message_data(message)
 
-            api = self.get_dynamic_email_config()
+            api = self.configuration
 
             oauth = OAuth2Session(
                 api.outlook_client_id,
@@ -481,6 +484,24 @@ class HorillaDefaultMailBackend(EmailBackend):
         )
 
 
+@contextmanager
+def use_mail_configuration(configuration):
+    """
+    Reuse an already resolved mail configuration for the messages built in
+    this block instead of looking it up again for every message.
+    """
+    previous = getattr(_thread_local, "mail_configuration", None)
+    setattr(_thread_local, "mail_configuration", configuration)
+    try:
+        yield configuration
+    finally:
+        if previous is None:
+            if hasattr(_thread_local, "mail_configuration"):
+                delattr(_thread_local, "mail_configuration")
+        else:
+            setattr(_thread_local, "mail_configuration", previous)
+
+
 message_init = EmailMessage.__init__
 
 
@@ -501,7 +522,7 @@ def new_init(
     custom __init_method to override
     """
     request = getattr(_thread_local, "request", None)
-    HorillaDefaultMailBackend()
+    HorillaDefaultMailBackend.get_dynamic_email_config()
     user_id = ""
     if request and request.user and request.user.is_authenticated:
         user_id = request.user.pk
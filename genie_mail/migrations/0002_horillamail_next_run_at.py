@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:44
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def populate_next_run_at(apps, schema_editor):
+    HorillaMail = apps.get_model("horilla_mail", "HorillaMail")
+    HorillaMail.objects.filter(mail_status="scheduled").update(
+        next_run_at=F("scheduled_at")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("horilla_mail", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="horillamail",
+            name="next_run_at",
+            field=models.DateTimeField(
+                blank=True,
+                db_index=True,
+                editable=False,
+                help_text="When the scheduler should next pick up this mail.",
+                null=True,
+            ),
+        ),
+        migrations.RunPython(populate_next_run_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("horilla_mail", "0002_horillamail_next_run_at"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="horillamail",
+            name="mail_status",
+            field=models.CharField(
+                choices=[
+                    ("draft", "Draft"),
+                    ("scheduled", "Scheduled"),
+                    ("sending", "Sending"),
+                    ("sent", "Sent"),
+                    ("failed", "Failed"),
+                ],
+                default="draft",
+                max_length=20,
+            ),
+        ),
+    ]
@@ -1,10 +1,15 @@
+import hashlib
 import mimetypes
 import re
+import threading
+from collections import OrderedDict
 
+from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.template import engines
 from django.urls import reverse_lazy
 from django.utils.translation import gettext_lazy as _
 
@@ -15,6 +20,48 @@ from genie_mail.methods import limit_content_types
 from genie_utils.methods import render_template
 from genie_utils.middlewares import _thread_local
 
+MAIL_TEMPLATE_CACHE_SIZE = getattr(settings, "MAIL_TEMPLATE_CACHE_SIZE", 256)
+
+XSS_PATTERNS = [
+    # <script> ... </script> with any attributes
+    r"<\s*script[^>]*>.*?<\s*/\s*script\s*>",
+    # Opening <script> tag (for incomplete scripts)
+    r"<\s*script[^>]*>",
+    r"javascript\s*:",  # javascript: pseudo-protocol
+    r"on\w+\s*=",  # inline event handlers (onclick, onload, etc.)
+    # dangerous active content
+    r"<\s*(embed|object|iframe|svg|math|link|meta).*?>",
+    # JS API abuse
+    r"on\w+\s*=\s*['\"]?\s*(eval|setTimeout|setInterval|new\s+Function|XMLHttpRequest|fetch|\$\s*\()[^>]*",
+]
+
+XSS_REGEX = re.compile("|".join(XSS_PATTERNS), re.IGNORECASE | re.DOTALL)
+
+_template_cache = OrderedDict()
+_template_cache_lock = threading.Lock()
+
+
+def get_compiled_template(source):
+    """
+    Return the compiled django template for a template source, keeping the
+    most recently used MAIL_TEMPLATE_CACHE_SIZE templates compiled so bulk
+    sends render one template for many recipients without recompiling it.
+    """
+    key = hashlib.sha256(source.encode()).hexdigest()
+    with _template_cache_lock:
+        template = _template_cache.get(key)
+        if template is not None:
+            _template_cache.move_to_end(key)
+            return template
+
+    template = engines["django"].from_string(source)
+    with _template_cache_lock:
+        _template_cache[key] = template
+        _template_cache.move_to_end(key)
+        while len(_template_cache) > MAIL_TEMPLATE_CACHE_SIZE:
+            _template_cache.popitem(last=False)
+    return template
+
 
 class HorillaMailConfiguration(HorillaCoreModel):
     """
@@ -179,6 +226,7 @@ class HorillaMail(HorillaCoreModel):
     MAIL_STATUS_CHOICES = [
         ("draft", _("Draft")),
         ("scheduled", _("Scheduled")),
+        ("sending", _("Sending")),
         ("sent", _("Sent")),
         ("failed", _("Failed")),
     ]
@@ -213,60 +261,58 @@ class HorillaMail(HorillaCoreModel):
         null=True,
         help_text=_("When the mail should be sent (for scheduled mails)."),
     )
+    next_run_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        db_index=True,
+        editable=False,
+        help_text=_("When the scheduler should next pick up this mail."),
+    )
 
     def __str__(self):
         return f"[{self.mail_status}] {self.subject }"
 
-    def render_subject(self, context=None):
-        from django.template import engines
+    def save(self, *args, **kwargs):
+        """
+        Keep next_run_at on the send time of scheduled mails, and clear it
+        once a mail leaves the scheduled status.
+        """
+        self.next_run_at = (
+            self.scheduled_at if self.mail_status == "scheduled" else None
+        )
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"mail_status", "scheduled_at"} & set(
+            update_fields
+        ):
+            kwargs["update_fields"] = {*update_fields, "next_run_at"}
+        super().save(*args, **kwargs)
+
+    def get_render_context(self):
+        """Default template context when none is passed to the renderers"""
+        request = getattr(_thread_local, "request", None)
+        return {
+            "instance": self.related_to,
+            "user": getattr(request, "user", None),
+            "active_company": request.active_company,
+            "request": request,
+        }
 
+    def render_subject(self, context=None):
         if not context:
-            request = getattr(_thread_local, "request", None)
-            context = {
-                "instance": self.related_to,
-                "user": getattr(request, "user", None),
-                "active_company": request.active_company,
-                "request": request,
-            }
-        django_engine = engines["django"]
-        return django_engine.from_string(self.subject or "").render(context)
+            context = self.get_render_context()
+        return get_compiled_template(self.subject or "").render(context)
 
     def render_body(self, context=None):
-        from django.template import engines
-
         if not context:
-            request = getattr(_thread_local, "request", None)
-            context = {
-                "instance": self.related_to,
-                "user": getattr(request, "user", None),
-                "active_company": request.active_company,
-                "request": request,
-            }
-        django_engine = engines["django"]
-        return django_engine.from_string(self.body or "").render(context)
+            context = self.get_render_context()
+        return get_compiled_template(self.body or "").render(context)
 
     def has_xss(value: str) -> bool:
         """Detect common XSS attempts (scripts, event handlers, js URLs, active content)."""
         if not isinstance(value, str):
             return False
 
-        xss_patterns = [
-            # <script> ... </script> with any attributes
-            r"<\s*script[^>]*>.*?<\s*/\s*script\s*>",
-            # Opening <script> tag (for incomplete scripts)
-            r"<\s*script[^>]*>",
-            r"javascript\s*:",  # javascript: pseudo-protocol
-            r"javascript\s*:",  # javascript: pseudo-protocol
-            r"on\w+\s*=",  # inline event handlers (onclick, onload, etc.)
-            # dangerous active content
-            r"<\s*(embed|object|iframe|svg|math|link|meta).*?>",
-            # JS API abuse
-            r"on\w+\s*=\s*['\"]?\s*(eval|setTimeout|setInterval|new\s+Function|XMLHttpRequest|fetch|\$\s*\()[^>]*",
-        ]
-
-        combined = re.compile("|".join(xss_patterns), re.IGNORECASE | re.DOTALL)
-        result = bool(combined.search(value))
-        return result
+        return bool(XSS_REGEX.search(value))
 
     def get_edit_url(self):
         return reverse_lazy("horilla_mail:send_mail_draft_view", kwargs={"pk": self.pk})
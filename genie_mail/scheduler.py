@@ -1,7 +1,6 @@
 import logging
-import sys
 
-from apscheduler.schedulers.background import BackgroundScheduler
+from genie_core.scheduler import register_job
 
 logger = logging.getLogger(__name__)
 
@@ -23,15 +22,9 @@ def refresh_outlook_auth_token():
             logger.error("Error in refresh_outlook_auth_token: %s", e)
 
 
-if not any(
-    cmd in sys.argv
-    for cmd in ["makemigrations", "migrate", "compilemessages", "flush", "shell"]
-):
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(
-        refresh_outlook_auth_token,
-        "interval",
-        minutes=50,
-        id="refresh_outlook_auth_token",
-    )
-    scheduler.start()
+register_job(
+    refresh_outlook_auth_token,
+    "interval",
+    minutes=50,
+    id="refresh_outlook_auth_token",
+)
@@ -1,90 +1,166 @@
 from django.core.mail import EmailMessage
 from django.utils import timezone
 
+from genie_mail.connection_pool import connection_pool
+from genie_mail.horilla_backends import (
+    HorillaDefaultMailBackend,
+    use_mail_configuration,
+)
 from genie_mail.models import HorillaMail
+from genie_utils.middlewares import _thread_local
 
 
 class HorillaMailManager:
     MAX_RETRIES = 3  # Optional retry limit
 
     @staticmethod
-    def send_mail(mail: HorillaMail, context=None):
+    def build_email(mail: HorillaMail, context=None):
+        """Render a mail and build the message with its attachments"""
         context = context or {}
-        try:
-            subject = mail.render_subject(context)
-            body = mail.render_body(context)
-
-            to = [
-                email.strip() for email in (mail.to or "").split(",") if email.strip()
-            ]
-            cc = [
-                email.strip() for email in (mail.cc or "").split(",") if email.strip()
-            ]
-            bcc = [
-                email.strip() for email in (mail.bcc or "").split(",") if email.strip()
-            ]
-
-            if not to:
-                raise ValueError("No recipient found in 'to' field")
-
-            from django.core.mail import EmailMultiAlternatives, get_connection
-
-            connection = get_connection(
-                "genie_mail.horilla_backends.HorillaDefaultMailBackend"
+        subject = mail.render_subject(context)
+        body = mail.render_body(context)
+
+        to = [email.strip() for email in (mail.to or "").split(",") if email.strip()]
+        cc = [email.strip() for email in (mail.cc or "").split(",") if email.strip()]
+        bcc = [email.strip() for email in (mail.bcc or "").split(",") if email.strip()]
+
+        if not to:
+            raise ValueError("No recipient found in 'to' field")
+
+        from django.core.mail import EmailMultiAlternatives
+
+        email = EmailMultiAlternatives(
+            subject=subject,
+            body=body,
+            from_email=mail.sender.from_email if mail.sender else None,
+            to=to,
+            cc=cc,
+            bcc=bcc,
+        )
+
+        # Attach the HTML version
+        email.attach_alternative(body, "text/html")
+
+        # Add file attachments
+        # for attachment in mail.attachments.all():
+        #     email.attach(
+        #         attachment.file.name,
+        #         attachment.file.read(),
+        #         attachment.mime_type or "application/octet-stream",
+        #     )
+        for attachment in mail.attachments.filter(is_inline=True):
+            from email.mime.image import MIMEImage
+
+            with attachment.file.open("rb") as f:
+                img_data = f.read()
+
+            # Determine subtype from mime_type
+            mime_type = attachment.mime_type or "image/jpeg"
+            subtype = mime_type.split("/")[-1] if "/" in mime_type else "jpeg"
+
+            img = MIMEImage(img_data, _subtype=subtype)
+            img.add_header("Content-ID", f"<{attachment.content_id}>")
+            img.add_header(
+                "Content-Disposition", "inline", filename=attachment.file_name()
             )
-            email = EmailMultiAlternatives(
-                subject=subject,
-                body=body,
-                from_email=mail.sender.from_email if mail.sender else None,
-                to=to,
-                cc=cc,
-                bcc=bcc,
-                connection=connection,
+            email.attach(img)
+
+        # Add regular file attachments
+        for attachment in mail.attachments.filter(is_inline=False):
+            email.attach(
+                attachment.file_name(),
+                attachment.file.read(),
+                attachment.mime_type or "application/octet-stream",
             )
 
-            # Attach the HTML version
-            email.attach_alternative(body, "text/html")
-
-            # Add file attachments
-            # for attachment in mail.attachments.all():
-            #     email.attach(
-            #         attachment.file.name,
-            #         attachment.file.read(),
-            #         attachment.mime_type or "application/octet-stream",
-            #     )
-            for attachment in mail.attachments.filter(is_inline=True):
-                from email.mime.image import MIMEImage
-
-                with attachment.file.open("rb") as f:
-                    img_data = f.read()
-
-                # Determine subtype from mime_type
-                mime_type = attachment.mime_type or "image/jpeg"
-                subtype = mime_type.split("/")[-1] if "/" in mime_type else "jpeg"
-
-                img = MIMEImage(img_data, _subtype=subtype)
-                img.add_header("Content-ID", f"<{attachment.content_id}>")
-                img.add_header(
-                    "Content-Disposition", "inline", filename=attachment.file_name()
-                )
-                email.attach(img)
-
-            # Add regular file attachments
-            for attachment in mail.attachments.filter(is_inline=False):
-                email.attach(
-                    attachment.file_name(),
-                    attachment.file.read(),
-                    attachment.mime_type or "application/octet-stream",
-                )
+        return email
 
+    @staticmethod
+    def deliver(mail: HorillaMail, context, connection):
+        """
+        Send one mail over an open connection and record the outcome on it.
+        Returns True if the mail was sent.
+        """
+        try:
+            email = HorillaMailManager.build_email(mail, context)
+            email.connection = connection
             email.send()
 
             mail.mail_status = "sent"
             mail.sent_at = timezone.now()
             mail.mail_status_message = ""
             mail.save()
+            return True
 
         except Exception as e:
             mail.mail_status = "failed"
             mail.mail_status_message = str(e)
             mail.save()
+            return False
+
+    @staticmethod
+    def send_mail(mail: HorillaMail, context=None):
+        context = context or {}
+        configuration = None
+        try:
+            configuration = HorillaDefaultMailBackend.get_dynamic_email_config()
+            with use_mail_configuration(configuration):
+                connection = connection_pool.get_connection(configuration)
+                delivered = HorillaMailManager.deliver(mail, context, connection)
+                if not delivered and not connection_pool.is_healthy(connection):
+                    connection_pool.discard(configuration)
+
+        except Exception as e:
+            connection_pool.discard(configuration)
+            mail.mail_status = "failed"
+            mail.mail_status_message = str(e)
+            mail.save()
+
+    @staticmethod
+    def send_many(mails, context=None):
+        """
+        Send a batch of mails, reusing one open connection per mail server
+        configuration. Each mail is sent from its own sender configuration
+        and gets its own sent/failed status; ``context`` is shared by every
+        mail of the batch. Returns the number of mails sent.
+        """
+        batches = {}
+        for mail in mails:
+            batches.setdefault(mail.sender_id, []).append(mail)
+
+        previous_from_mail_id = getattr(_thread_local, "from_mail_id", None)
+        sent = 0
+        try:
+            for sender_id, batch in batches.items():
+                from_mail_id = sender_id or previous_from_mail_id
+                if from_mail_id:
+                    setattr(_thread_local, "from_mail_id", from_mail_id)
+                elif hasattr(_thread_local, "from_mail_id"):
+                    delattr(_thread_local, "from_mail_id")
+
+                configuration = None
+                try:
+                    configuration = HorillaDefaultMailBackend.get_dynamic_email_config()
+                    with use_mail_configuration(configuration):
+                        connection = connection_pool.get_connection(configuration)
+                        for mail in batch:
+                            if HorillaMailManager.deliver(mail, context, connection):
+                                sent += 1
+                            elif not connection_pool.is_healthy(connection):
+                                connection_pool.discard(configuration)
+                                connection = connection_pool.get_connection(
+                                    configuration
+                                )
+                except Exception as e:
+                    connection_pool.discard(configuration)
+                    for mail in batch:
+                        if mail.mail_status != "sent":
+                            mail.mail_status = "failed"
+                            mail.mail_status_message = str(e)
+                            mail.save()
+        finally:
+            if previous_from_mail_id:
+                setattr(_thread_local, "from_mail_id", previous_from_mail_id)
+            elif hasattr(_thread_local, "from_mail_id"):
+                delattr(_thread_local, "from_mail_id")
+        return sent
@@ -1,12 +1,27 @@
 import logging
+from datetime import timedelta
 
 from celery import shared_task
+from django.conf import settings
+from django.db import connection, transaction
 from django.utils import timezone
 
 from genie_utils.middlewares import _thread_local
 
 logger = logging.getLogger(__name__)
 
+SCHEDULED_MAIL_BATCH_SIZE = getattr(settings, "SCHEDULED_MAIL_BATCH_SIZE", 500)
+
+# How long a queued mail is hidden from other ticks before it is queued
+# again, e.g. after its task was lost before it ran. The task itself claims
+# the mail by moving it to "sending", so a mail queued twice is sent once.
+SCHEDULED_MAIL_CLAIM_LEASE = timedelta(minutes=10)
+
+# How long a mail may stay "sending" before the task sending it is taken as
+# lost, e.g. its worker was killed mid-send. The tick then marks it failed
+# rather than queue it again, as the server may have accepted it already.
+SCHEDULED_MAIL_SEND_LEASE = timedelta(minutes=30)
+
 
 class MockRequest:
     """Mock request object for Celery tasks"""
@@ -56,6 +71,17 @@ def send_scheduled_mail_task(self, mail_id):
             logger.info(f"Mail {mail_id} scheduled time not yet reached")
             return f"Mail {mail_id} not yet time to send"
 
+        # Claim the mail, so only one of the tasks queued for it sends it;
+        # next_run_at holds the send lease until the outcome is saved
+        send_lease_until = timezone.now() + SCHEDULED_MAIL_SEND_LEASE
+        if not HorillaMail.objects.filter(pk=mail_id, mail_status="scheduled").update(
+            mail_status="sending", next_run_at=send_lease_until
+        ):
+            logger.info(f"Mail {mail_id} was claimed by another task, skipping send")
+            return f"Mail {mail_id} is not in scheduled status"
+        mail.mail_status = "sending"
+        mail.next_run_at = send_lease_until
+
         # Set thread local for from_mail_id to use correct configuration
         if mail.sender:
             setattr(_thread_local, "from_mail_id", mail.sender.pk)
@@ -136,8 +162,8 @@ def send_scheduled_mail_task(self, mail_id):
         try:
             mail = HorillaMail.objects.get(pk=mail_id)
             # HorillaMailManager already set status to failed
-            # Only update if status is still scheduled
-            if mail.mail_status == "scheduled":
+            # Only update if status is still sending
+            if mail.mail_status == "sending":
                 mail.mail_status = "failed"
                 mail.mail_status_message = str(e)
                 mail.save(update_fields=["mail_status", "mail_status_message"])
@@ -155,29 +181,78 @@ def send_scheduled_mail_task(self, mail_id):
             delattr(_thread_local, "request")
 
 
-@shared_task
-def process_scheduled_mails():
+def claim_due_mails(now=None, limit=SCHEDULED_MAIL_BATCH_SIZE):
+    """
+    Claim up to ``limit`` scheduled mails whose send time has arrived and
+    return their ids. Claiming moves next_run_at past the claim lease, so a
+    mail is handed to exactly one worker until the lease runs out; the send
+    task then claims it for good. PostgreSQL claims the batch with
+    SELECT ... FOR UPDATE SKIP LOCKED; other databases flip each row with a
+    conditional update that only one worker can win.
+    """
+    from genie_mail.models import HorillaMail
+
+    now = now or timezone.now()
+    lease_until = now + SCHEDULED_MAIL_CLAIM_LEASE
+    due_mails = HorillaMail.objects.filter(
+        mail_status="scheduled", next_run_at__lte=now
+    ).order_by("next_run_at")
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            mail_ids = list(
+                due_mails.select_for_update(skip_locked=True).values_list(
+                    "pk", flat=True
+                )[:limit]
+            )
+            HorillaMail.objects.filter(pk__in=mail_ids).update(next_run_at=lease_until)
+        return mail_ids
+
+    claimed = []
+    with transaction.atomic():
+        for mail_id, next_run_at in due_mails.values_list("pk", "next_run_at")[:limit]:
+            if HorillaMail.objects.filter(
+                pk=mail_id, mail_status="scheduled", next_run_at=next_run_at
+            ).update(next_run_at=lease_until):
+                claimed.append(mail_id)
+    return claimed
+
+
+def fail_stale_sending_mails(now=None):
     """
-    Periodic task to check and queue scheduled mails for sending
+    Mark failed the mails left "sending" past their send lease and return
+    how many there were. Their task died before saving the outcome, so
+    whether the server accepted them is unknown; they are not sent again.
     """
     from genie_mail.models import HorillaMail
 
-    # Get all scheduled mails whose time has arrived
-    scheduled_mails = HorillaMail.objects.filter(
-        mail_status="scheduled", scheduled_at__lte=timezone.now()
+    now = now or timezone.now()
+    return HorillaMail.objects.filter(
+        mail_status="sending", next_run_at__lte=now
+    ).update(
+        mail_status="failed",
+        mail_status_message="Sending was interrupted before it completed",
+        next_run_at=None,
     )
 
-    logger.info(f"Found {scheduled_mails.count()} scheduled mails to process")
-    logger.info(f"Current time: {timezone.now()}")
 
-    count = 0
-    for mail in scheduled_mails:
-        # Queue each mail for sending
-        send_scheduled_mail_task.delay(mail.pk)
-        count += 1
+@shared_task
+def process_scheduled_mails():
+    """
+    Periodic task to claim due scheduled mails and queue them for sending
+    """
+    failed = fail_stale_sending_mails()
+    if failed:
+        logger.warning(f"Marked {failed} interrupted scheduled mails as failed")
+
+    mail_ids = claim_due_mails()
+
+    for mail_id in mail_ids:
+        send_scheduled_mail_task.delay(mail_id)
 
-    logger.info(f"Queued {count} scheduled mails for sending")
-    return f"Queued {count} mails"
+    if mail_ids:
+        logger.info(f"Queued {len(mail_ids)} scheduled mails for sending")
+    return f"Queued {len(mail_ids)} mails"
 
 
 @shared_task
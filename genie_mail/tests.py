@@ -1,3 +1,519 @@
-from django.test import TestCase
+"""
+Tests for horilla_mail
+"""
 
-# Create your horilla_mail tests here.
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from cryptography.fernet import Fernet
+from django.contrib.contenttypes.models import ContentType
+from django.db import OperationalError, connection
+from django.template import engines
+from django.test import TestCase, TransactionTestCase, override_settings, tag
+from django.utils import timezone
+
+from genie_core.models import HorillaUser
+from genie_mail import encryption_utils
+from genie_mail import models as mail_models
+from genie_mail.connection_pool import MailConnectionPool, connection_pool
+from genie_mail.horilla_backends import HorillaDefaultMailBackend
+from genie_mail.models import (
+    HorillaMail,
+    HorillaMailConfiguration,
+    get_compiled_template,
+)
+from genie_mail.services import HorillaMailManager
+from genie_mail.tasks import (
+    SCHEDULED_MAIL_CLAIM_LEASE,
+    SCHEDULED_MAIL_SEND_LEASE,
+    claim_due_mails,
+    fail_stale_sending_mails,
+    process_scheduled_mails,
+    send_scheduled_mail_task,
+)
+
+
+class SMTPStubHandler(socketserver.StreamRequestHandler):
+    """Minimal SMTP dialogue that accepts every message"""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 localhost stub")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 localhost")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                self.server.messages += 1
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+class SMTPStubServer(socketserver.ThreadingTCPServer):
+    """Local SMTP stand-in counting connections and accepted messages"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPStubHandler)
+        self.connections = 0
+        self.messages = 0
+
+
+class MailServerTestMixin:
+    """Shared fixtures for tests sending through the local SMTP server"""
+
+    def setUp(self):
+        """Set up a local SMTP server and a mail configuration for it"""
+        self.server = SMTPStubServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.addCleanup(connection_pool.close_all)
+
+        self.user = HorillaUser.objects.create_user(
+            username="sender", email="sender@example.com", password="password123"
+        )
+        self.configuration = HorillaMailConfiguration.objects.create(
+            type="mail",
+            mail_channel="outgoing",
+            host="127.0.0.1",
+            port=self.server.server_address[1],
+            from_email="crm@example.com",
+            display_name="CRM",
+            use_tls=False,
+            use_ssl=False,
+            timeout=5,
+            is_primary=True,
+        )
+        self.content_type = ContentType.objects.get_for_model(HorillaUser)
+
+    def create_mails(self, count):
+        """Create draft mails sent from the test configuration"""
+        return [
+            HorillaMail.objects.create(
+                sender=self.configuration,
+                to=f"customer{index}@example.com",
+                subject="Hello {{ user.username }}",
+                body="<p>Welcome {{ user.username }}</p>",
+                content_type=self.content_type,
+                object_id=self.user.pk,
+            )
+            for index in range(count)
+        ]
+
+
+class MailConnectionPoolTests(MailServerTestMixin, TestCase):
+    """Test that outgoing mails reuse pooled SMTP connections"""
+
+    def test_send_many_reuses_one_connection(self):
+        """Test a batch is delivered over a single SMTP connection"""
+        mails = self.create_mails(25)
+
+        sent = HorillaMailManager.send_many(mails, {"user": self.user})
+
+        self.assertEqual(sent, 25)
+        self.assertEqual(self.server.messages, 25)
+        self.assertEqual(self.server.connections, 1)
+        self.assertTrue(all(mail.mail_status == "sent" for mail in mails))
+
+    def test_send_mail_reuses_pooled_connection(self):
+        """Test consecutive sends share the pooled connection"""
+        for mail in self.create_mails(3):
+            HorillaMailManager.send_mail(mail, {"user": self.user})
+            self.assertEqual(mail.mail_status, "sent", mail.mail_status_message)
+
+        self.assertEqual(self.server.messages, 3)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_idle_connection_is_reopened(self):
+        """Test connections idle past the timeout are closed and reopened"""
+        pool = MailConnectionPool(idle_timeout=0)
+        self.addCleanup(pool.close_all)
+
+        first = pool.get_connection(self.configuration)
+        time.sleep(0.01)
+        second = pool.get_connection(self.configuration)
+
+        self.assertIsNot(first, second)
+        self.assertIsNone(first.connection)
+        self.assertEqual(self.server.connections, 2)
+
+    def test_edited_configuration_drops_pooled_connection(self):
+        """Test a changed configuration does not reuse the old session"""
+        first = connection_pool.get_connection(self.configuration)
+        self.configuration.username = "sales@example.com"
+        self.configuration.save()
+
+        second = connection_pool.get_connection(self.configuration)
+
+        self.assertIsNot(first, second)
+        self.assertEqual(len(connection_pool.connections), 1)
+
+
+@tag("benchmark")
+class MailConnectionPoolBenchmarkTests(MailServerTestMixin, TestCase):
+    """Benchmark the messages per second of pooled and unpooled sends"""
+
+    def unpooled_send(self, mails, context):
+        """Send each mail over its own connection, as send_mail did before"""
+        for mail in mails:
+            backend = HorillaDefaultMailBackend(configuration=self.configuration)
+            backend.open()
+            HorillaMailManager.deliver(mail, context, backend)
+            backend.close()
+
+    def test_send_many_benchmark(self):
+        """Test send_many delivers more messages per second than unpooled sends"""
+        context = {"user": self.user}
+        rates = {}
+        for name, send in [
+            ("unpooled", self.unpooled_send),
+            ("pooled", HorillaMailManager.send_many),
+        ]:
+            mails = self.create_mails(1000)
+            start = time.perf_counter()
+            send(mails, context)
+            rates[name] = len(mails) / (time.perf_counter() - start)
+            self.assertTrue(all(mail.mail_status == "sent" for mail in mails))
+        print(
+            f"\nSMTP send rate: {rates['pooled']:.0f} messages/s pooled, "
+            f"{rates['unpooled']:.0f} messages/s unpooled",
+            file=sys.stderr,
+        )
+
+        self.assertEqual(self.server.messages, 2000)
+        self.assertEqual(self.server.connections, 1001)
+        self.assertGreater(rates["pooled"], rates["unpooled"])
+
+
+class MailTemplateCacheTests(TestCase):
+    """Test that mail templates are compiled once and reused"""
+
+    def setUp(self):
+        """Set up a mail with a templated subject and body"""
+        mail_models._template_cache.clear()
+        self.addCleanup(mail_models._template_cache.clear)
+        self.user = HorillaUser.objects.create_user(
+            username="sender", email="sender@example.com", password="password123"
+        )
+        self.mail = HorillaMail(
+            to="customer@example.com",
+            subject="Hello {{ user.username }}",
+            body="<p>Dear {{ user.first_name|default:user.username }}</p>",
+            content_type=ContentType.objects.get_for_model(HorillaUser),
+            object_id=self.user.pk,
+        )
+
+    def test_rendering_many_recipients_compiles_once(self):
+        """Test rendering one template to 10k recipients compiles it once"""
+        engine = engines["django"]
+        recipients = [
+            HorillaUser(username=f"customer{index}") for index in range(10000)
+        ]
+
+        with mock.patch.object(
+            engine, "from_string", wraps=engine.from_string
+        ) as from_string:
+            start = time.perf_counter()
+            bodies = [self.mail.render_body({"user": user}) for user in recipients]
+            elapsed = time.perf_counter() - start
+
+        self.assertEqual(from_string.call_count, 1)
+        self.assertEqual(bodies[42], "<p>Dear customer42</p>")
+        self.assertLess(elapsed, 10)
+
+    def test_cache_is_bounded(self):
+        """Test the least recently used template is evicted past the bound"""
+        with mock.patch.object(mail_models, "MAIL_TEMPLATE_CACHE_SIZE", 2):
+            first = get_compiled_template("one {{ value }}")
+            get_compiled_template("two {{ value }}")
+            self.assertIs(get_compiled_template("one {{ value }}"), first)
+            get_compiled_template("three {{ value }}")
+
+            self.assertEqual(len(mail_models._template_cache), 2)
+            self.assertIs(get_compiled_template("one {{ value }}"), first)
+
+    def test_has_xss(self):
+        """Test the module level XSS pattern still flags active content"""
+        self.assertTrue(HorillaMail.has_xss("<script>alert(1)</script>"))
+        self.assertTrue(HorillaMail.has_xss('<img src=x onerror="fetch(1)">'))
+        self.assertTrue(HorillaMail.has_xss("<a href='javascript:void(0)'>"))
+        self.assertFalse(HorillaMail.has_xss("<p>Hello {{ user.username }}</p>"))
+        self.assertFalse(HorillaMail.has_xss(None))
+
+
+class ScheduledMailDispatchTests(TransactionTestCase):
+    """Test that due scheduled mails are claimed once across workers"""
+
+    def setUp(self):
+        """Set up scheduled mails, most of them due"""
+        self.user = HorillaUser.objects.create_user(
+            username="sender", email="sender@example.com", password="password123"
+        )
+        self.content_type = ContentType.objects.get_for_model(HorillaUser)
+        self.now = timezone.now()
+
+    def create_scheduled_mails(self, count, scheduled_at):
+        """Bulk create scheduled mails, setting next_run_at like save() does"""
+        HorillaMail.objects.bulk_create(
+            [
+                HorillaMail(
+                    to=f"customer{index}@example.com",
+                    subject="Reminder",
+                    content_type=self.content_type,
+                    object_id=self.user.pk,
+                    mail_status="scheduled",
+                    scheduled_at=scheduled_at,
+                    next_run_at=scheduled_at,
+                )
+                for index in range(count)
+            ],
+            batch_size=5000,
+        )
+
+    def test_save_tracks_next_run_at(self):
+        """Test next_run_at follows the scheduled status and time"""
+        mail = HorillaMail.objects.create(
+            to="customer@example.com",
+            content_type=self.content_type,
+            object_id=self.user.pk,
+            mail_status="scheduled",
+            scheduled_at=self.now,
+        )
+        self.assertEqual(mail.next_run_at, self.now)
+
+        mail.mail_status = "sent"
+        mail.save(update_fields=["mail_status"])
+        mail.refresh_from_db()
+        self.assertIsNone(mail.next_run_at)
+
+    def test_tick_queues_only_due_mails(self):
+        """Test a tick claims due mails and leaves future ones alone"""
+        self.create_scheduled_mails(5, self.now - timezone.timedelta(minutes=1))
+        self.create_scheduled_mails(3, self.now + timezone.timedelta(hours=1))
+
+        with mock.patch("genie_mail.tasks.send_scheduled_mail_task.delay") as delay:
+            process_scheduled_mails()
+            process_scheduled_mails()
+
+        self.assertEqual(delay.call_count, 5)
+
+    def test_mail_queued_again_after_lease_is_sent_once(self):
+        """Test a mail queued again once its lease expired is sent once"""
+        self.create_scheduled_mails(1, self.now - timezone.timedelta(minutes=1))
+        mail_id = HorillaMail.objects.get().pk
+
+        # The first task has not run when the lease expires
+        self.assertEqual(claim_due_mails(now=self.now), [mail_id])
+        later = self.now + SCHEDULED_MAIL_CLAIM_LEASE + timezone.timedelta(seconds=1)
+        self.assertEqual(claim_due_mails(now=later), [mail_id])
+
+        def send_mail(mail, context=None):
+            # The second task runs while the first one is sending
+            if send.call_count == 1:
+                send_scheduled_mail_task(mail_id)
+            mail.mail_status = "sent"
+            mail.save()
+
+        with mock.patch.object(
+            HorillaMailManager, "send_mail", side_effect=send_mail
+        ) as send:
+            send_scheduled_mail_task(mail_id)
+
+        self.assertEqual(send.call_count, 1)
+        self.assertEqual(HorillaMail.objects.get().mail_status, "sent")
+        self.assertEqual(claim_due_mails(now=later), [])
+
+    def test_interrupted_send_is_marked_failed(self):
+        """Test a mail left sending by a killed worker fails once its lease ends"""
+        self.create_scheduled_mails(1, self.now - timezone.timedelta(minutes=1))
+        mail_id = HorillaMail.objects.get().pk
+
+        # The worker dies inside send_mail, before the outcome is saved
+        with mock.patch.object(HorillaMailManager, "send_mail"):
+            send_scheduled_mail_task(mail_id)
+        self.assertEqual(HorillaMail.objects.get().mail_status, "sending")
+
+        self.assertEqual(fail_stale_sending_mails(), 0)
+        later = (
+            timezone.now() + SCHEDULED_MAIL_SEND_LEASE + timezone.timedelta(seconds=1)
+        )
+        self.assertEqual(fail_stale_sending_mails(now=later), 1)
+        mail = HorillaMail.objects.get()
+        self.assertEqual(mail.mail_status, "failed")
+        self.assertIsNone(mail.next_run_at)
+        self.assertEqual(claim_due_mails(now=later), [])
+
+    def test_concurrent_workers_never_claim_twice(self):
+        """Test several worker threads claim 500 due mails exactly once"""
+        self.assert_workers_claim_once(500, limit=25)
+
+    @tag("benchmark")
+    def test_concurrent_workers_never_claim_twice_at_scale(self):
+        """Test several worker threads claim 50k due mails exactly once"""
+        self.assert_workers_claim_once(50000, limit=2500)
+
+    def assert_workers_claim_once(self, count, limit):
+        """Claim due mails from 4 threads and check each is claimed once"""
+        self.create_scheduled_mails(count, self.now - timezone.timedelta(minutes=1))
+        claims = []
+        errors = []
+
+        def worker():
+            try:
+                while True:
+                    try:
+                        mail_ids = claim_due_mails(limit=limit)
+                    except OperationalError:
+                        # SQLite refuses concurrent writers; the tick is
+                        # simply retried, as beat would do
+                        time.sleep(0.01)
+                        continue
+                    if not mail_ids:
+                        return
+                    claims.extend(mail_ids)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(claims), count)
+        self.assertEqual(len(set(claims)), count)
+        self.assertEqual(claim_due_mails(), [])
+
+
+class CipherCacheTestMixin:
+    """Shared fixtures for cipher cache tests"""
+
+    def setUp(self):
+        """Set up a key file as the only source of the encryption key"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.key_file = os.path.join(directory.name, ".encryption_key")
+        self.write_key(Fernet.generate_key().decode())
+
+        key_settings = override_settings(
+            BASE_DIR=directory.name, FIELD_ENCRYPTION_KEY=None
+        )
+        key_settings.enable()
+        self.addCleanup(key_settings.disable)
+        for patcher in [
+            mock.patch.dict(os.environ),
+            mock.patch.object(encryption_utils, "_key_files", {}),
+            mock.patch.object(encryption_utils, "_cipher", (None, None)),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        os.environ.pop("FIELD_ENCRYPTION_KEY", None)
+
+    def write_key(self, key, mtime_offset=0):
+        """Write a key to the key file, optionally moving its mtime"""
+        with open(self.key_file, "w") as f:
+            f.write(key)
+        if mtime_offset:
+            stat = os.stat(self.key_file)
+            os.utime(self.key_file, (stat.st_atime, stat.st_mtime + mtime_offset))
+
+
+class CipherCacheTests(CipherCacheTestMixin, TestCase):
+    """Test that the encryption cipher is built once per key"""
+
+    def test_decrypt_reuses_cipher_and_key_file(self):
+        """Test repeated decrypts build no cipher and read no key file"""
+        encrypted = encryption_utils.encrypt_password("app-password")
+
+        with mock.patch.object(
+            encryption_utils, "Fernet", wraps=Fernet
+        ) as fernet, mock.patch("builtins.open", wraps=open) as opened:
+            for _ in range(100):
+                self.assertEqual(
+                    encryption_utils.decrypt_password(encrypted), "app-password"
+                )
+            self.assertEqual(fernet.call_count, 0)
+            self.assertEqual(opened.call_count, 0)
+
+            self.write_key(Fernet.generate_key().decode(), mtime_offset=10)
+            for _ in range(100):
+                encryption_utils.encrypt_password("new-password")
+        self.assertEqual(fernet.call_count, 1)
+        # Writing the rotated key and reading it back open the file once each
+        self.assertEqual(opened.call_count, 2)
+
+    def test_cipher_is_reused(self):
+        """Test consecutive calls share one cipher and one key file read"""
+        with mock.patch("builtins.open", wraps=open) as opened:
+            first = encryption_utils.get_cipher()
+            second = encryption_utils.get_cipher()
+
+        self.assertIs(first, second)
+        self.assertEqual(opened.call_count, 1)
+
+    def test_rotated_key_file_is_picked_up(self):
+        """Test a rewritten key file replaces the cached cipher"""
+        first = encryption_utils.get_cipher()
+        old_password = encryption_utils.encrypt_password("old-password")
+
+        self.write_key(Fernet.generate_key().decode(), mtime_offset=10)
+
+        self.assertIsNot(encryption_utils.get_cipher(), first)
+        with self.assertRaises(ValueError):
+            encryption_utils.decrypt_password(old_password)
+        new_password = encryption_utils.encrypt_password("new-password")
+        self.assertEqual(
+            encryption_utils.decrypt_password(new_password), "new-password"
+        )
+
+
+@tag("benchmark")
+class CipherCacheBenchmarkTests(CipherCacheTestMixin, TestCase):
+    """Benchmark decrypts with the cached cipher"""
+
+    def uncached_decrypt(self, encrypted_password):
+        """Decrypt like get_cipher did before it was cached"""
+        with open(self.key_file, "r") as f:
+            key = f.read().strip()
+        return Fernet(key.encode()).decrypt(encrypted_password.encode()).decode()
+
+    def test_decrypt_benchmark(self):
+        """Test 100k decrypt calls are faster with the cached cipher"""
+        encrypted = encryption_utils.encrypt_password("app-password")
+
+        start = time.perf_counter()
+        for _ in range(100000):
+            self.uncached_decrypt(encrypted)
+        before = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(100000):
+            encryption_utils.decrypt_password(encrypted)
+        after = time.perf_counter() - start
+
+        self.assertEqual(encryption_utils.decrypt_password(encrypted), "app-password")
+        self.assertLess(after, before)